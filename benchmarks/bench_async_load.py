@@ -0,0 +1,82 @@
+"""
+Concurrency benchmark: sync `invoke` vs async `ainvoke` inside an event loop.
+
+Both modes fire the same burst of concurrent "requests" at a local mock LLM server. The sync
+client blocks the loop for the whole model call, so the burst is served one call at a time;
+the async client keeps every call in flight on a single loop (one uvicorn worker).
+
+Usage (from the repo root):
+    python -m benchmarks.bench_async_load --requests 100 --latency-ms 500
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+from benchmarks.mock_llm_server import start_mock_server
+from config import PAGES_GATEWAY
+
+
+def _configure_env(port: int) -> None:
+    os.environ["APP_ENV"] = "BENCH"
+    os.environ["AZURE_OPENAI_API_KEY_BENCH"] = "bench-key"
+    os.environ["AZURE_OPENAI_ENDPOINT_BENCH"] = f"http://127.0.0.1:{port}"
+    os.environ["AZURE_OPENAI_RETRIES_BENCH"] = "0"
+    os.environ["AZURE_OPENAI_VERSION_BENCH"] = "2024-10-21"
+    # the client path alone - the gateway's cap and budget are measured by bench_llm_gateway
+    PAGES_GATEWAY["ENABLED"] = False
+
+
+def _report(name: str, wall: float, latencies: list) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<8} requests={len(latencies):<5} wall={wall:7.2f}s "
+          f"throughput={len(latencies) / wall:8.1f} req/s "
+          f"p50={statistics.median(latencies) * 1000:8.1f}ms p95={p95 * 1000:8.1f}ms")
+
+
+async def _burst(handler, n: int) -> tuple:
+    # latency is measured from the moment the burst arrives, as a client would see it
+    latencies = []
+    start = time.perf_counter()
+
+    async def one(i: int):
+        await handler(f"אני רוצה טופס 17 {i}")
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return time.perf_counter() - start, latencies
+
+
+async def main(n: int) -> None:
+    from service_page_agent import AzureOpenAiClient
+    agent = AzureOpenAiClient()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    async def blocking_handler(query):
+        return agent.invoke(query, [])
+
+    async def async_handler(query):
+        return await agent.ainvoke(query, [])
+
+    # warm up connections for both clients
+    await blocking_handler("warmup")
+    await async_handler("warmup")
+
+    _report("sync", *await _burst(blocking_handler, n))
+    _report("async", *await _burst(async_handler, n))
+    await agent.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", "-n", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--port", type=int, default=8011)
+    args = parser.parse_args()
+
+    _configure_env(args.port)
+    start_mock_server(args.port, latency_ms=args.latency_ms)
+    asyncio.run(main(args.requests))
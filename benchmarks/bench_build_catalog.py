@@ -0,0 +1,64 @@
+"""
+Catalog build time as the workbook grows: the previous iterrows + f-string loop vs utils/build_catalog.py.
+
+The real services sheet is replicated (with fresh codes) into a synthetic workbook of --rows rows spread
+over --sheets sheets. Reading the workbook is the same openpyxl parse for both, so it is timed separately
+from the transform + write.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_build_catalog --rows 100 1000 5000 --sheets 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from utils.build_catalog import build_catalog, read_workbook
+
+
+def synthetic_workbook(source: str, rows: int, sheets: int, path: str) -> None:
+    base = read_workbook(source).drop(columns=["sheet"])
+    base = base[base["code"].notna() & base["code"].str.strip().ne("")]
+    repeats = -(-rows // len(base))
+    frame = pd.concat([base] * repeats, ignore_index=True).iloc[:rows]
+    frame["code"] = [str(10000 + i) for i in range(len(frame))]
+    frame.columns = ["actionKey", "Desc", "מילות מפתח", "תיאור מסך", "נוסחים שלפיהם נפתח את המסך"]
+    frame.insert(2, "url", "")
+    with pd.ExcelWriter(path) as writer:
+        for sheet, part in enumerate(range(0, len(frame), -(-len(frame) // sheets))):
+            frame.iloc[part:part + -(-len(frame) // sheets)].to_excel(
+                writer, sheet_name=f"products-{sheet}", index=False, startrow=2)
+
+
+def legacy_build(path: str, output: str) -> tuple:
+    """The previous parse_xlsx_to_md loop (first sheet only), writing a fresh file instead of appending."""
+    started = time.perf_counter()
+    xl_df = pd.read_excel(path, header=2)
+    read_seconds = time.perf_counter() - started
+    with open(output, "w", encoding="utf-8") as file:
+        for _, row in xl_df.iterrows():
+            content = f"# **Service page:** **code:** {row.iloc[0]}, **name:** {row.iloc[1]}\n## The service description:\n{row.iloc[4] if row.iloc[4]!=None else '' }\n## Key words:\n {row.iloc[3] if row.iloc[3]!=None else ''}\n## Examples of questions that can relate to this service:\n{row.iloc[5] if row.iloc[5]!=None else ''}"
+            file.write(content + "\n")
+    return read_seconds, time.perf_counter() - started - read_seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", type=str, default="utils/services.xlsx")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--sheets", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            workbook = os.path.join(tmp, f"services-{rows}.xlsx")
+            synthetic_workbook(args.source, rows, args.sheets, workbook)
+
+            legacy_read, legacy_transform = legacy_build(workbook, os.path.join(tmp, "legacy.md"))
+            report = build_catalog(workbook, markdown=os.path.join(tmp, "output.md"),
+                                   json_path=os.path.join(tmp, "catalog.json"))
+            print(f"rows={rows:<6} legacy: read {legacy_read:6.2f}s transform {legacy_transform * 1000:8.1f}ms "
+                  f"(first sheet only)  |  build_catalog: read {report['read_seconds']:6.2f}s "
+                  f"transform {report['build_seconds'] * 1000:8.1f}ms services={report['services']}")
@@ -0,0 +1,99 @@
+"""
+Offline coverage and latency of the precomputed clarifications over the catalog's own phrases.
+
+Reported:
+* ambiguous phrases (listed under several services) answered with a cluster's options, and how many of
+  those options cover every service of the phrase,
+* phrases of a single service that a cluster catches anyway (a query containing a shared multi-word phrase),
+  which would otherwise reach the fast path / embedding tiers or the model,
+* picks resolved from the session after each cluster's options: the option's code, its whole name, and
+  a fragment of it (the name without its last word), with the share resolved to the picked service,
+* new queries that mention an option's name ("<name> please" style), with the share left to the other tiers,
+* match and resolution latency.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_clarification
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from config import PAGES_CATALOG, PAGES_CLARIFICATION
+from utils.catalog import load_catalog
+from utils.clarification import ClarificationIndex, build_clusters, resolve_selection
+from utils.hebrew_text import normalize_text
+
+
+def evaluate(pages: list, max_options: int, max_extra_tokens: int) -> dict:
+    pages_by_code = {page.code: page for page in pages}
+    index = ClarificationIndex(build_clusters(pages, max_options), pages_by_code, max_extra_tokens)
+    phrase_codes = {}
+    for page in pages:
+        for phrase in [page.name, *page.keywords, *page.examples]:
+            phrase_codes.setdefault(normalize_text(phrase), {"text": phrase, "codes": set()})["codes"].add(page.code)
+
+    shared = [entry for entry in phrase_codes.values() if len(entry["codes"]) > 1]
+    unique = [entry for entry in phrase_codes.values() if len(entry["codes"]) == 1]
+    match_times, answered, covering = [], 0, 0
+    for entry in shared:
+        started = time.perf_counter()
+        answer = index.match(entry["text"])
+        match_times.append(time.perf_counter() - started)
+        if answer is not None:
+            answered += 1
+            covering += entry["codes"] <= {option["code"] for option in json.loads(answer)["options"]}
+    caught = sum(index.match(entry["text"]) is not None for entry in unique)
+
+    picks = {"code": [0, 0], "name": [0, 0], "name fragment": [0, 0]}
+    mentions = [0, 0]
+    resolve_times = []
+    for answer in index.answers:
+        history = [{"role": "user", "content": "..."}, {"role": "assistant", "content": answer}]
+        for option in json.loads(answer)["options"]:
+            name = option["name"]
+            queries = [("code", option["code"]), ("name", name)]
+            if len(name.split()) > 1:
+                queries.append(("name fragment", name.rsplit(None, 1)[0]))
+            for kind, query in queries:
+                started = time.perf_counter()
+                service = resolve_selection(query, history, pages_by_code)
+                resolve_times.append(time.perf_counter() - started)
+                picks[kind][0] += 1
+                picks[kind][1] += service is not None and service.code == option["code"]
+            mentions[0] += 1
+            mentions[1] += resolve_selection(name + " בבקשה", history, pages_by_code) is None
+    return {
+        "clusters": len(index.clusters),
+        "shared": len(shared),
+        "answered": answered,
+        "covering": covering,
+        "unique": len(unique),
+        "caught": caught,
+        "picks": picks,
+        "mentions": mentions,
+        "match_us": np.percentile(np.array(match_times) * 1e6, [50, 99]),
+        "resolve_us": np.percentile(np.array(resolve_times) * 1e6, [50, 99]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", "-P", type=str, default=PAGES_CATALOG["PATH"])
+    parser.add_argument("--max-options", type=int, default=PAGES_CLARIFICATION["MAX_OPTIONS"])
+    parser.add_argument("--max-extra-tokens", type=int, default=PAGES_CLARIFICATION["MAX_EXTRA_TOKENS"])
+    args = parser.parse_args()
+
+    _, services = load_catalog(args.path)
+    result = evaluate(services, args.max_options, args.max_extra_tokens)
+    print(f"services={len(services)} clusters={result['clusters']} max_options={args.max_options} "
+          f"max_extra_tokens={args.max_extra_tokens}")
+    print(f"shared phrases: {result['answered']}/{result['shared']} answered with options, "
+          f"{result['covering']} covering all their services")
+    print(f"single-service phrases caught by a cluster: {result['caught']}/{result['unique']}")
+    for kind, (total, resolved) in result["picks"].items():
+        print(f"  pick by {kind:<13} resolved {resolved}/{total}")
+    print("  new query mentioning a name left to the other tiers {1}/{0}".format(*result["mentions"]))
+    print("match p50={:.0f}us p99={:.0f}us  resolve p50={:.0f}us p99={:.0f}us".format(
+        *result["match_us"], *result["resolve_us"]))
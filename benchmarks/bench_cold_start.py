@@ -0,0 +1,150 @@
+"""
+Cold start of a fresh interpreter, as a serverless instance sees it (function_app.py): the import of the app
+module under `python -X importtime`, then the app's lifespan and the first request - a fast-path /query -
+through the ASGI app with lazy connections (as function_app.py is deployed), so it also pays for creating the clients. Nothing is contacted:
+Redis points at a closed port and the fast-path answer needs no model call.
+
+Each run is a new process; the median of --runs is reported, with the modules the app imports directly
+that take the most time and which of the heavy libraries (openai, redis, numpy, pandas, openpyxl) are
+already loaded once the import returns.
+
+--output / --compare / --tolerance work as in bench_replay, to follow cold start from commit to commit:
+    python -m benchmarks.bench_cold_start --output base.json
+    python -m benchmarks.bench_cold_start --compare base.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.bench_replay import _git_commit
+
+HEAVY_MODULES = ("openai", "redis", "numpy", "pandas", "openpyxl", "httpx")
+# (name, better when higher) - what --compare checks
+COMPARED = (("import_ms", False), ("first_request_ms", False), ("cold_start_ms", False))
+
+CHILD = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+loaded = [name for name in {heavy!r} if name in sys.modules]
+
+import httpx
+import main
+
+async def first_request():
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://cold") as client:
+            response = await client.post("/query", headers={headers!r}, json={body!r})
+            response.raise_for_status()
+
+asyncio.run(first_request())
+answered = time.perf_counter()
+print("COLD_START " + json.dumps({{"import_ms": (imported - started) * 1000, "first_request_ms": (answered - imported) * 1000,
+                                  "loaded": loaded}}))
+"""
+
+HEADERS = {
+    "x-login-mask-id": "cold", "x-login-gender": "U", "x-cust-mask-id": "cold", "x-cust-gender": "F",
+    "x-cust-age": "40", "x-dr-license": "cold",
+}
+BODY = {"request_id": "1", "source_system": 46, "session_id": "cold-start", "query": "טופס 17"}
+
+
+def _env() -> dict:
+    return dict(
+        os.environ, PYTHONPATH=os.getcwd(), APP_ENV="COLD",
+        AZURE_OPENAI_API_KEY_COLD="cold-key", AZURE_OPENAI_ENDPOINT_COLD="http://127.0.0.1:9",
+        AZURE_OPENAI_RETRIES_COLD="0", AZURE_OPENAI_VERSION_COLD="2024-10-21",
+        REDIS_HOST_COLD="127.0.0.1", REDIS_PORT_COLD="9", REDIS_DB_COLD="0", REDIS_PASSWORD_COLD="cold",
+        REDIS_SSL_COLD="false", PAGES_LAZY_CONNECTIONS="1",
+    )
+
+
+def parse_importtime(stderr: str, module: str) -> tuple:
+    """(cumulative us of `module`, [(cumulative us, self us, name)] of the modules it imports directly)."""
+    children, pending, total = [], [], None
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        entry = (int(cumulative_us), int(self_us), name.strip())
+        if depth == 1:
+            pending.append(entry)
+        elif depth == 0:
+            if entry[2] == module:
+                total, children = entry[0], pending
+            pending = []
+    return total, children
+
+
+def run_once(module: str) -> dict:
+    code = CHILD.format(module=module, heavy=HEAVY_MODULES, headers=HEADERS, body=BODY)
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=_env(), capture_output=True,
+                             text=True, timeout=120)
+    result = next((json.loads(line.split(" ", 1)[1]) for line in process.stdout.splitlines()
+                   if line.startswith("COLD_START ")), None)
+    if process.returncode != 0 or result is None:
+        raise RuntimeError(f"cold start run failed:\n{process.stderr[-3000:]}")
+    result["importtime_us"], result["children"] = parse_importtime(process.stderr, module)
+    return result
+
+
+def compare(results: dict, path: str, tolerance: float) -> bool:
+    with open(path, encoding="utf-8") as file:
+        base = json.load(file)
+    print(f"\ncompared with {path} ({base.get('commit')}):")
+    regressed = False
+    for name, higher_is_better in COMPARED:
+        old, new = base["results"].get(name), results.get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        regressed |= bool(flag)
+        print(f"  {name:<18} {old:>9.1f} -> {new:>9.1f} {change:+8.1%}{flag}")
+    return regressed
+
+
+def main(args) -> int:
+    runs = [run_once(args.module) for _ in range(args.runs)]
+    results = {
+        "import_ms": round(statistics.median(run["import_ms"] for run in runs), 1),
+        "first_request_ms": round(statistics.median(run["first_request_ms"] for run in runs), 1),
+        "cold_start_ms": round(statistics.median(run["import_ms"] + run["first_request_ms"] for run in runs), 1),
+        "loaded_at_import": runs[-1]["loaded"],
+    }
+    print(f"commit {_git_commit()}: import {args.module} x{args.runs} (median)")
+    print(f"  import={results['import_ms']}ms (importtime {runs[-1]['importtime_us'] / 1000:.0f}ms) "
+          f"first request={results['first_request_ms']}ms cold start={results['cold_start_ms']}ms")
+    print(f"  heavy modules loaded by the import: {', '.join(results['loaded_at_import']) or 'none'}")
+    print(f"  slowest direct imports of {args.module} (last run):")
+    for cumulative, self_us, name in sorted(runs[-1]["children"], reverse=True)[:args.top]:
+        print(f"    {cumulative / 1000:8.1f}ms  (self {self_us / 1000:6.1f}ms)  {name}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"commit": _git_commit(), "module": args.module, "runs": args.runs, "results": results},
+                      file, indent=2)
+    if args.compare and compare(results, args.compare, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main", help="entry module (function_app needs azure-functions)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="direct imports listed")
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative change counted as a regression")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,151 @@
+"""
+Prompt size and model latency per turn of multi-turn sessions: verbatim history vs compact turns
+(utils/conversation.py).
+
+Each session is replayed turn by turn the way main.py stores it: verbatim mode keeps the full answers of
+the last MEMORY_K turns, compact mode stores compact turns for MEMORY_K + SUMMARY_TURNS turns and sends the
+older ones as a summary. For every turn the exact prompt is built and its tokens counted (the cacheable
+prefix is the same in both modes, so only the part after it is reported), then the same turn is sent to
+the mock endpoint, which charges --prefill-ms per 1000 prompt tokens on top of its base latency.
+
+Sessions come from --sessions, a JSONL file of recorded sessions, one per line:
+    {"turns": [{"query": "...", "answer": "<the model's answer JSON>"}, ...]}
+otherwise clarification chains are generated from the catalog: every answer offers the service asked
+about and --options - 1 others with a clarification question, every fourth answer settles on one code.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_conversation_compaction --sessions-count 40 --turns 8
+    python -m benchmarks.bench_conversation_compaction --sessions recorded_sessions.jsonl
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+
+from benchmarks.bench_async_load import _configure_env
+from benchmarks.bench_prompt_tokens import load_tokenizer
+from benchmarks.mock_llm_server import start_mock_server
+from config import PAGES_CONVERSATION, PAGES_MODEL
+from utils.conversation import compact_turn
+
+QUESTION = "כדי שאוכל לכוון אותך לשירות הנכון, האם תוכל לפרט אם מדובר בהגשת בקשה חדשה, בבירור סטטוס של בקשה קיימת או בצפייה במסמכים?"
+
+
+def load_sessions(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["turns"] for line in f if line.strip()]
+
+
+def generate_sessions(catalog, n: int, turns: int, options: int, seed: int = 17) -> list:
+    rng = random.Random(seed)
+    questions = [(question, service) for service in catalog.services for question in service.examples]
+    sessions = []
+    for _ in range(n):
+        session = []
+        for turn in range(1, turns + 1):
+            query, service = rng.choice(questions)
+            offered = [service] + rng.sample(catalog.services, options - 1)
+            if turn % 4 == 0:
+                answer = {"code": service.code, "name": service.name}
+            else:
+                answer = {"options": [{"code": s.code, "name": s.name} for s in offered],
+                          "clarification_question": QUESTION}
+            session.append({"query": query, "answer": json.dumps(answer, ensure_ascii=False)})
+        sessions.append(session)
+    return sessions
+
+
+def session_window(compact: bool) -> int:
+    # as main.SESSION_WINDOW
+    return (PAGES_MODEL["MEMORY_K"] + (PAGES_CONVERSATION["SUMMARY_TURNS"] if compact else 0)) * 2
+
+
+def stored_turn(compact: bool, turn: dict) -> list:
+    if compact:
+        return compact_turn(turn["query"], turn["answer"])
+    return [{"role": "user", "content": turn["query"]}, {"role": "assistant", "content": turn["answer"]}]
+
+
+async def replay(agent, sessions: list, compact: bool, count_tokens, call: bool) -> dict:
+    PAGES_CONVERSATION["COMPACT"] = compact
+    window = session_window(compact)
+    result = {"tokens": [], "history_bytes": [], "build_ms": [], "latency_ms": [], "by_turn": {}}
+    for session in sessions:
+        history = []
+        for number, turn in enumerate(session, start=1):
+            started = time.perf_counter()
+            messages = agent._construct_prompt(turn["query"], history)
+            result["build_ms"].append((time.perf_counter() - started) * 1000)
+            tokens = sum(count_tokens(message["content"]) for message in messages[1:])
+            result["tokens"].append(tokens)
+            result["by_turn"].setdefault(number, []).append(tokens)
+            result["history_bytes"].append(sum(len(json.dumps(message, ensure_ascii=False).encode("utf-8"))
+                                               for message in history))
+            if call:
+                started = time.perf_counter()
+                await agent.ainvoke(turn["query"], history)
+                result["latency_ms"].append((time.perf_counter() - started) * 1000)
+            history = (history + stored_turn(compact, turn))[-window:]
+    return result
+
+
+def p95(values: list) -> float:
+    return sorted(values)[max(int(len(values) * 0.95) - 1, 0)]
+
+
+def report(name: str, result: dict) -> None:
+    line = (f"{name:<9} prompt tokens after prefix: mean={statistics.mean(result['tokens']):7.1f} "
+            f"p95={p95(result['tokens']):6d} max={max(result['tokens']):6d} | "
+            f"session read={statistics.mean(result['history_bytes']):7.0f}B "
+            f"build={statistics.mean(result['build_ms']):5.2f}ms")
+    if result["latency_ms"]:
+        line += (f" | model p50={statistics.median(result['latency_ms']):6.0f}ms "
+                 f"p95={p95(result['latency_ms']):6.0f}ms")
+    print(line)
+    print(f"{'':<9} mean tokens by turn: "
+          + " ".join(f"{number}:{statistics.mean(tokens):.0f}" for number, tokens in sorted(result["by_turn"].items())))
+
+
+async def main(args) -> None:
+    from service_page_agent import AzureOpenAiClient
+
+    agent = AzureOpenAiClient()
+    if args.sessions:
+        sessions = load_sessions(args.sessions)
+    else:
+        sessions = generate_sessions(agent.catalog.current, args.sessions_count, args.turns, args.options)
+    tokenizer, count_tokens = load_tokenizer()
+    print(f"{len(sessions)} sessions, {sum(map(len, sessions))} turns, tokens: {tokenizer}")
+
+    results = {}
+    for name, compact in (("verbatim", False), ("compact", True)):
+        results[name] = await replay(agent, sessions, compact, count_tokens, not args.no_calls)
+        report(name, results[name])
+    saved = 1 - statistics.mean(results["compact"]["tokens"]) / statistics.mean(results["verbatim"]["tokens"])
+    print(f"compact turns send {saved:.1%} fewer tokens after the prefix")
+    if not args.no_calls:
+        faster = statistics.mean(results["verbatim"]["latency_ms"]) - statistics.mean(results["compact"]["latency_ms"])
+        print(f"compact turns are {faster:.0f}ms faster per model call on average "
+              f"(mock prefill {args.prefill_ms:.0f}ms per 1k prompt tokens)")
+    await agent.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", help="JSONL file of recorded sessions")
+    parser.add_argument("--sessions-count", type=int, default=40, help="generated sessions")
+    parser.add_argument("--turns", type=int, default=8, help="turns per generated session")
+    parser.add_argument("--options", type=int, default=5, help="services offered per generated clarification")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--prefill-ms", type=float, default=150, help="mock prompt processing per 1k tokens")
+    parser.add_argument("--no-calls", action="store_true", help="count tokens only, no model calls")
+    parser.add_argument("--port", type=int, default=8018)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    _configure_env(args.port)
+    start_mock_server(args.port, latency_ms=args.latency_ms, prefill_ms_per_1k=args.prefill_ms)
+    asyncio.run(main(args))
@@ -0,0 +1,94 @@
+"""
+Offline accuracy and latency of the embedding index over the catalog's own example questions.
+
+As in bench_retrieval_recall, every example is scored against an index built without it (k-fold).
+Reported per fold set:
+* recall@K of the candidate list (the services the model is narrowed to on an ambiguous match),
+* for each (threshold, margin): the share of questions answered directly and how many of those are right.
+  A held-out question the catalog also lists under another service (a shared phrase) counts as right for
+  that service too - in the full index such phrases tie and are never answered directly,
+* search latency (embedding + brute-force search over the memory-mapped matrix) and index load time.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_embedding_index --folds 5 --dim 512
+"""
+import argparse
+import dataclasses
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from config import PAGES_CATALOG, PAGES_EMBEDDINGS
+from utils.catalog import load_catalog
+from utils.embedding_index import EmbeddingIndex, build_embedding_index
+from utils.hebrew_text import normalize_text
+
+THRESHOLDS = (0.6, 0.7, 0.8)
+MARGINS = (0.1, 0.15, 0.2)
+
+
+def evaluate(pages: list, folds: int, ks: list, dim: int) -> dict:
+    codes_by_phrase = {}
+    for page in pages:
+        for phrase in [page.name, *page.keywords, *page.examples]:
+            codes_by_phrase.setdefault(normalize_text(phrase), set()).add(page.code)
+    hits = {k: 0 for k in ks}
+    decided = {(t, m): [0, 0] for t in THRESHOLDS for m in MARGINS}
+    search_times, load_times = [], []
+    with tempfile.TemporaryDirectory() as directory:
+        for fold in range(folds):
+            train = [
+                dataclasses.replace(page, examples=[q for i, q in enumerate(page.examples) if i % folds != fold])
+                for page in pages
+            ]
+            path = os.path.join(directory, f"fold{fold}.npy")
+            build_embedding_index(train, path, "bench", dim)
+            index = EmbeddingIndex(path, "bench")
+            started = time.perf_counter()
+            index.load()
+            load_times.append(time.perf_counter() - started)
+            for page in pages:
+                for question in page.examples[fold::folds]:
+                    started = time.perf_counter()
+                    candidates = index.search(question, max(ks))
+                    search_times.append(time.perf_counter() - started)
+                    ranked = [code for code, _ in candidates]
+                    for k in ks:
+                        hits[k] += page.code in ranked[:k]
+                    if not candidates:
+                        continue
+                    runner_up = candidates[1][1] if len(candidates) > 1 else 0.0
+                    for (threshold, margin), counts in decided.items():
+                        if candidates[0][1] >= threshold and candidates[0][1] - runner_up >= margin:
+                            counts[0] += 1
+                            counts[1] += ranked[0] in codes_by_phrase[normalize_text(question)]
+    total = len(search_times)
+    return {
+        "questions": total,
+        "recall": {k: hits[k] / total for k in ks},
+        "decided": decided,
+        "search_us": np.percentile(np.array(search_times) * 1e6, [50, 99]),
+        "load_ms": sum(load_times) / len(load_times) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", "-P", type=str, default=PAGES_CATALOG["PATH"])
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=PAGES_EMBEDDINGS["DIM"])
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 8, 10])
+    args = parser.parse_args()
+
+    _, services = load_catalog(args.path)
+    result = evaluate(services, args.folds, args.k, args.dim)
+    p50, p99 = result["search_us"]
+    print(f"services={len(services)} questions={result['questions']} dim={args.dim} "
+          f"search p50={p50:.0f}us p99={p99:.0f}us load={result['load_ms']:.2f}ms")
+    print("  ".join(f"recall@{k}={recall:.3f}" for k, recall in result["recall"].items()))
+    print(f"{'threshold':>9} {'margin':>6} {'answered':>9} {'precision':>9}")
+    for (threshold, margin), (answered, correct) in result["decided"].items():
+        precision = correct / answered if answered else 0.0
+        print(f"{threshold:9.2f} {margin:6.2f} {answered / result['questions']:9.3f} {precision:9.3f}")
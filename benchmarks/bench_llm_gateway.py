@@ -0,0 +1,112 @@
+"""
+Model calls under a burst that overloads the deployment: the SDK's own retries vs the LLM gateway
+(utils/llm_gateway.py).
+
+The mock Azure endpoint accepts --capacity concurrent calls and answers the rest with a 429 and a
+retry-after-ms header; every call in flight also slows the others a little. A burst of --requests model
+calls arrives over --arrival-seconds from the apps (65), the website (46) and batch (no source_system),
+and a --duplicates fraction repeats a query already in flight.
+
+Without the gateway each call retries on its own (SDK max_retries=2) and gives up after three 429s.
+With it, calls queue by priority under the adaptive cap, duplicates share a call, and 429s pause everyone.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_llm_gateway --requests 300 --capacity 12
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from benchmarks.bench_async_load import _configure_env
+from benchmarks.mock_llm_server import MOCK_STATS, start_mock_server
+from config import PAGES_GATEWAY
+
+SOURCES = ((65, 0.4), (46, 0.4), (None, 0.2))
+
+
+def workload(n: int, arrival_seconds: float, duplicates: float, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    calls = []
+    for i in range(n):
+        source = rng.choices([source for source, _ in SOURCES], [weight for _, weight in SOURCES])[0]
+        query = f"אני רוצה טופס 17 {i}"
+        if calls and rng.random() < duplicates:
+            query = calls[-1][2]
+        calls.append((rng.uniform(0, arrival_seconds), source, query))
+    return sorted(calls)
+
+
+async def run(agent, calls: list) -> dict:
+    latencies = defaultdict(list)
+    failures = defaultdict(int)
+    started = time.perf_counter()
+
+    async def one(at: float, source, query: str):
+        await asyncio.sleep(at)
+        sent = time.perf_counter()
+        try:
+            await agent.ainvoke(query, [], source_system=source)
+            latencies[source].append(time.perf_counter() - sent)
+        except Exception:
+            failures[source] += 1
+
+    await asyncio.gather(*(one(*call) for call in calls))
+    return {"wall": time.perf_counter() - started, "latencies": latencies, "failures": failures}
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[max(int(len(values) * q) - 1, 0)] * 1000 if values else float("nan")
+
+
+def report(name: str, result: dict) -> None:
+    every = [latency for values in result["latencies"].values() for latency in values]
+    print(f"{name:<8} ok={len(every):<4} failed={sum(result['failures'].values()):<4} wall={result['wall']:5.1f}s "
+          f"p50={statistics.median(every) * 1000:7.0f}ms p95={percentile(every, .95):7.0f}ms "
+          f"p99={percentile(every, .99):7.0f}ms | upstream calls={MOCK_STATS['requests']:<4} "
+          f"429s={MOCK_STATS['rate_limited']:<4} max in flight={MOCK_STATS['max_in_flight']}")
+    for source, _ in SOURCES:
+        values = result["latencies"][source]
+        print(f"{'':<8} source {str(source):<4} ok={len(values):<4} failed={result['failures'][source]:<4} "
+              f"p50={statistics.median(values) * 1000 if values else float('nan'):7.0f}ms "
+              f"p95={percentile(values, .95):7.0f}ms")
+
+
+async def main(args) -> None:
+    from service_page_agent import AzureOpenAiClient
+
+    calls = workload(args.requests, args.arrival_seconds, args.duplicates)
+    for enabled in (False, True):
+        PAGES_GATEWAY["ENABLED"] = enabled
+        agent = AzureOpenAiClient()
+        MOCK_STATS.update(requests=0, rate_limited=0, max_in_flight=0)
+        result = await run(agent, calls)
+        report("gateway" if enabled else "sdk", result)
+        if enabled:
+            print(f"{'':<8} gateway {agent.gateway.snapshot()}")
+        await agent.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", "-n", type=int, default=300)
+    parser.add_argument("--arrival-seconds", type=float, default=1.0)
+    parser.add_argument("--duplicates", type=float, default=0.2)
+    parser.add_argument("--capacity", type=int, default=12, help="concurrent calls the mock accepts")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--port", type=int, default=8015)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)  # the SDK run logs every failed call
+    _configure_env(args.port)
+    os.environ["AZURE_OPENAI_RETRIES_BENCH"] = "2"
+    # the mock enforces concurrency, not a per-minute quota - leave the rate budget out of the comparison
+    PAGES_GATEWAY.update(RPM=None, TPM=None)
+    start_mock_server(args.port, latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 3,
+                      max_in_flight=args.capacity, retry_after_ms=500, in_flight_latency_ms=5)
+    asyncio.run(main(args))
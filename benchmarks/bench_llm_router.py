@@ -0,0 +1,104 @@
+"""
+Tail latency when one region slows down: a single deployment vs the router over two deployments,
+without and with hedging (utils/llm_router.py).
+
+Two mock Azure endpoints run as separate processes. Both answer in --latency-ms (+-1/3 jitter), with
+5% of the calls taking 2s longer. A steady stream of --requests calls arrives at --rate per second;
+halfway through, the primary's latency goes up to --degraded-ms, the way a region does when it is
+overloaded. The gateway is off, so only the routing differs between the runs.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_llm_router --requests 400 --rate 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+
+import httpx
+
+from benchmarks.bench_async_load import _configure_env
+from benchmarks.mock_llm_server import start_mock_process
+from config import PAGES_ROUTER
+
+BASELINE = {"slow_fraction": 0.05, "slow_ms": 2000}
+
+
+async def configure(port: int, **settings) -> dict:
+    async with httpx.AsyncClient() as client:
+        response = await client.post(f"http://127.0.0.1:{port}/mock/settings", json=settings)
+        return response.json()["stats"]
+
+
+async def run(agent, args) -> list:
+    latencies = []
+
+    async def one(i: int):
+        sent = time.perf_counter()
+        try:
+            await agent.ainvoke(f"אני רוצה טופס 17 {i}", [])
+            latencies.append(time.perf_counter() - sent)
+        except Exception:
+            latencies.append(float("inf"))
+
+    tasks = []
+    for i in range(args.requests):
+        if i == args.requests // 2:
+            await configure(args.ports[0], latency_ms=args.degraded_ms, jitter_ms=args.degraded_ms / 3)
+        tasks.append(asyncio.create_task(one(i)))
+        await asyncio.sleep(1 / args.rate)
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def quantile(values: list, q: float) -> float:
+    return sorted(values)[min(int(len(values) * q), len(values) - 1)] * 1000
+
+
+async def main(args) -> None:
+    from service_page_agent import AzureOpenAiClient
+
+    modes = (("single", None, False),
+             ("router", [{"name": "secondary", "endpoint": f"http://127.0.0.1:{args.ports[1]}"}], False),
+             ("hedged", [{"name": "secondary", "endpoint": f"http://127.0.0.1:{args.ports[1]}"}], True))
+    for name, deployments, hedge in modes:
+        for port in args.ports:
+            await configure(port, latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 3, **BASELINE)
+        if deployments:
+            os.environ["AZURE_OPENAI_DEPLOYMENTS_BENCH"] = json.dumps(deployments)
+        else:
+            os.environ.pop("AZURE_OPENAI_DEPLOYMENTS_BENCH", None)
+        PAGES_ROUTER["HEDGE"] = hedge
+
+        agent = AzureOpenAiClient()
+        latencies = await run(agent, args)
+        failed = sum(latency == float("inf") for latency in latencies)
+        router = agent.router.snapshot()
+        print(f"{name:<7} failed={failed:<3} p50={statistics.median(latencies) * 1000:6.0f}ms "
+              f"p95={quantile(latencies, .95):6.0f}ms p99={quantile(latencies, .99):6.0f}ms "
+              f"max={max(latencies) * 1000:6.0f}ms | "
+              + " ".join(f"{deployment}={stats.get('ok', 0)}" for deployment, stats in router["deployments"].items())
+              + f" hedged={router.get('hedged', 0)} hedge_won={router.get('hedge_won', 0)}")
+        await agent.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", "-n", type=int, default=400)
+    parser.add_argument("--rate", type=float, default=20, help="calls per second")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--degraded-ms", type=float, default=1500)
+    parser.add_argument("--ports", type=int, nargs=2, default=[8016, 8017])
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    _configure_env(args.ports[0])
+    mocks = [start_mock_process(port) for port in args.ports]
+    try:
+        asyncio.run(main(args))
+    finally:
+        for mock in mocks:
+            mock.terminate()
@@ -0,0 +1,120 @@
+"""
+Per-request CPU spent on logging: the previous synchronous, eager f-string logging of one /query model request
+vs the queued, lazy, sampled pipeline (utils/logging_setup.py).
+
+Both variants run the log statements a /query request makes on the model path with real payloads
+(prompt built by the agent, a 3-turn history, a ChatCompletion object). Request-thread CPU is what the
+event loop pays; total CPU adds the background writer thread. Output goes to /dev/null.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_logging --requests 2000
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+from openai.types.chat import ChatCompletion
+
+from benchmarks.bench_async_load import _configure_env
+from utils.logging_setup import SAMPLED, configure_logging, redact_id, stop_logging
+
+logger = logging.getLogger("bench")
+
+ANSWER = json.dumps({"code": "101", "name": "ההתחייבויות שלי"}, ensure_ascii=False)
+
+
+def previous_request_logs(session_id, history, messages, response, answer, updated_history, parsed) -> None:
+    """The log statements of a model request before the logging pipeline, verbatim."""
+    logger.info(f"History read from Redis for session {session_id}")
+    logger.info(f"History: {history}")
+    logger.debug(f"Prompt constructed with messages: {messages}")
+    logger.info("Received response from Azure OpenAI.")
+    logger.debug(f"Response: {response}")
+    logger.debug(f"Response content: {answer}")
+    logger.info(f"response_content: {answer}")
+    logger.info(f"History: {updated_history}")
+    logger.debug(f"Updated history length: {len(updated_history)}")
+    logger.info("Memory window updated.")
+    logger.info(f"History after: {updated_history}")
+    logger.info(f"Answer: {answer}")
+    logger.info(f"Session {session_id} updated with 2 messages")
+    logger.info(f"parsed_ans: {parsed}")
+
+
+def current_request_logs(session_id, history, messages, response, answer, updated_history, parsed) -> None:
+    logger.info("Query %s session %s source %s login %s cust %s", "1", session_id, 46,
+                redact_id("masked-123"), redact_id("masked-456"))
+    logger.info("History read from Redis for session %s", session_id)
+    logger.info("History: %s", history, extra=SAMPLED)
+    logger.debug("Prompt constructed with messages: %s", messages)
+    logger.info("Received response from Azure OpenAI.")
+    logger.debug("Response: %s", response)
+    logger.debug("Response content: %s", answer)
+    logger.debug("response_content: %s", answer)
+    logger.debug("History: %s", updated_history)
+    logger.debug("Updated history length: %s", len(updated_history))
+    logger.debug("Memory window updated.")
+    logger.debug("History after: %s", updated_history)
+    logger.info("Answer: %s", answer, extra=SAMPLED)
+    logger.info("Session %s updated with %s messages", session_id, 2)
+    logger.debug("parsed_ans: %s", parsed)
+
+
+def payloads(agent) -> tuple:
+    history = []
+    for query in ("אני צריך טופס 17", "לניתוח ברך", "כן"):
+        history += [{"role": "user", "content": query}, {"role": "assistant", "content": ANSWER}]
+    messages = agent._construct_prompt("ואיך אני מגיש בקשה להחזר?", history)
+    response = ChatCompletion.model_validate({
+        "id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": ANSWER}}],
+        "usage": {"prompt_tokens": 5000, "completion_tokens": 20, "total_tokens": 5020},
+    })
+    updated = history[2:] + [{"role": "user", "content": "ואיך אני מגיש בקשה להחזר?"},
+                             {"role": "assistant", "content": ANSWER}]
+    return "xyz-456", history[-6:], messages, response, ANSWER, updated, json.loads(ANSWER)
+
+
+def measure(log_request, args: tuple, n: int) -> tuple:
+    thread_start, process_start = time.thread_time(), time.process_time()
+    for _ in range(n):
+        log_request(*args)
+    thread_cpu = time.thread_time() - thread_start
+    return thread_cpu, process_start
+
+
+def main(n: int) -> None:
+    from service_page_agent import AzureOpenAiClient
+    agent = AzureOpenAiClient()
+    args = payloads(agent)
+    print(f"prompt size {sum(len(m['content']) for m in args[2])} chars, history {len(args[1])} messages")
+
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        sync_handler = logging.StreamHandler(devnull)
+        sync_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        root.addHandler(sync_handler)
+        root.setLevel(logging.INFO)
+        thread_cpu, process_start = measure(previous_request_logs, args, n)
+        total_cpu = time.process_time() - process_start
+        print(f"previous  request-thread {thread_cpu / n * 1e6:8.1f}us/request   total {total_cpu / n * 1e6:8.1f}us/request")
+        root.removeHandler(sync_handler)
+
+        configure_logging(logging.INFO, stream=devnull)
+        thread_cpu, process_start = measure(current_request_logs, args, n)
+        stop_logging()  # drains the queue, so the writer thread's work is included in total
+        total_cpu = time.process_time() - process_start
+        print(f"current   request-thread {thread_cpu / n * 1e6:8.1f}us/request   total {total_cpu / n * 1e6:8.1f}us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", "-n", type=int, default=2000)
+    args = parser.parse_args()
+
+    _configure_env(8013)
+    main(args.requests)
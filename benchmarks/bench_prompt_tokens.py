@@ -0,0 +1,105 @@
+"""
+Token accounting of the prompt: cacheable prefix vs per-request variable part.
+
+For a sample of single-turn requests (catalog example questions) and follow-up turns, builds the exact
+messages AzureOpenAiClient sends and counts tokens of the stable prefix (first developer message) and
+of everything after it. Azure OpenAI caches prompt prefixes of at least 1024 tokens, in 128-token steps.
+
+Counts use tiktoken's o200k_base (the gpt-4o tokenizer) when its BPE file is available locally,
+otherwise a UTF-8 length estimate - the output says which.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_prompt_tokens --requests 200 --show 10
+"""
+import argparse
+import json
+import logging
+import os
+import random
+
+from config import PAGES_MODEL
+
+MIN_CACHEABLE_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+
+
+def load_tokenizer():
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("o200k_base")
+        return "o200k_base", lambda text: len(encoding.encode(text))
+    except Exception:
+        # Hebrew averages roughly 3 UTF-8 bytes per token with o200k_base
+        return "estimate (utf-8 bytes / 3)", lambda text: max(1, len(text.encode("utf-8")) // 3)
+
+
+def cached_tokens(prefix_tokens: int) -> int:
+    if prefix_tokens < MIN_CACHEABLE_TOKENS:
+        return 0
+    return prefix_tokens - prefix_tokens % CACHE_BLOCK_TOKENS
+
+
+def sample_requests(agent, n: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    questions = [(q, service) for service in agent.catalog.current.services for q in service.examples]
+    requests = []
+    for question, service in rng.sample(questions, min(n, len(questions))):
+        if rng.random() < 0.5:
+            requests.append((question, []))
+        else:
+            # follow-up: the previous turn asked for clarification between this service and another one
+            other = rng.choice(agent.catalog.current.services)
+            answer = json.dumps({
+                "options": [{"code": service.code, "name": service.name}, {"code": other.code, "name": other.name}],
+                "clarification_question": "לאיזה שירות התכוונת?"
+            }, ensure_ascii=False)
+            requests.append((service.name, [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]))
+    return requests
+
+
+def account(agent, requests: list, count_tokens) -> list:
+    rows = []
+    for user_input, history in requests:
+        messages = agent._construct_prompt(user_input, history)
+        prefix = count_tokens(messages[0]["content"])
+        variable = sum(count_tokens(message["content"]) for message in messages[1:])
+        rows.append({"query": user_input, "prefix": prefix, "variable": variable, "cached": cached_tokens(prefix)})
+    return rows
+
+
+def summarize(label: str, rows: list, show: int) -> None:
+    for row in rows[:show]:
+        print(f"  prefix={row['prefix']:>6} variable={row['variable']:>6} cached={row['cached']:>6}  {row['query'][:40]}")
+    total = sum(row["prefix"] + row["variable"] for row in rows)
+    cached = sum(row["cached"] for row in rows)
+    print(f"{label}: requests={len(rows)} avg_prompt={total / len(rows):8.1f} "
+          f"avg_prefix={sum(r['prefix'] for r in rows) / len(rows):8.1f} "
+          f"avg_variable={sum(r['variable'] for r in rows) / len(rows):8.1f} "
+          f"cacheable_fraction={cached / total:.3f} avg_uncached={(total - cached) / len(rows):8.1f}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", "-n", type=int, default=200)
+    parser.add_argument("--show", type=int, default=5, help="per-request rows to print for each mode")
+    args = parser.parse_args()
+
+    for key, value in {"APP_ENV": "BENCH", "AZURE_OPENAI_API_KEY_BENCH": "bench-key",
+                       "AZURE_OPENAI_ENDPOINT_BENCH": "http://127.0.0.1:8011",
+                       "AZURE_OPENAI_RETRIES_BENCH": "0", "AZURE_OPENAI_VERSION_BENCH": "2024-10-21"}.items():
+        os.environ.setdefault(key, value)
+
+    from service_page_agent import AzureOpenAiClient
+    agent = AzureOpenAiClient()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    tokenizer, count_tokens = load_tokenizer()
+    print(f"tokenizer: {tokenizer}\n")
+    requests = sample_requests(agent, args.requests)
+
+    configured_top_k = PAGES_MODEL["TOP_K"]
+    for top_k in dict.fromkeys([configured_top_k, None]):
+        PAGES_MODEL["TOP_K"] = top_k
+        agent.catalog.reload(force=True)
+        summarize(f"TOP_K={top_k}", account(agent, requests, count_tokens), args.show)
+    PAGES_MODEL["TOP_K"] = configured_top_k
@@ -0,0 +1,121 @@
+"""
+Redis session layer throughput: pooling, pipelining and the asyncio client.
+
+Every simulated request reads the session window and writes one turn, as /query does:
+  sync-commands      one blocking client, TYPE/LRANGE/RPUSH/LTRIM/EXPIRE as separate round trips, serial
+  async-new-conn     asyncio client created per request (no connection reuse), pipelined
+  async-commands     shared asyncio pool, the five commands as separate round trips, concurrent
+  async-pipelined    AsyncRedisSessionManager.get_history + append_turns on the shared pool, concurrent
+
+Usage (from the repo root):
+    python -m benchmarks.bench_redis_pool --requests 2000 --concurrency 1 64
+    python -m benchmarks.bench_redis_pool --url redis://localhost:6379/0
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+import redis
+import redis.asyncio as aioredis
+
+from config import PAGES_MODEL, PAGES_REDIS
+from benchmarks.redis_stand_in import start_redis_stand_in
+from utils.redis_handler import AsyncRedisSessionManager
+
+WINDOW = PAGES_MODEL["MEMORY_K"] * 2
+TURN = [
+    {"role": "user", "content": "אני רוצה להגיש בקשה להחזר"},
+    {"role": "assistant", "content": json.dumps({"code": "102", "name": "ההחזרים שלי"}, ensure_ascii=False)},
+]
+ITEMS = [json.dumps(message, ensure_ascii=False) for message in TURN]
+
+
+def report(name: str, wall: float, latencies: list, concurrency: int = 1) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<16} concurrency={concurrency:<4} requests={len(latencies):<6} throughput={len(latencies) / wall:9.1f} req/s "
+          f"p50={statistics.median(latencies) * 1000:7.3f}ms p95={p95 * 1000:7.3f}ms")
+
+
+def sync_commands(url: str, n: int) -> None:
+    client = redis.Redis.from_url(url, decode_responses=True)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(n):
+        session_id = f"bench-sync-{i % 500}"
+        t = time.perf_counter()
+        client.type(session_id)
+        client.lrange(session_id, -WINDOW, -1)
+        client.rpush(session_id, *ITEMS)
+        client.ltrim(session_id, -WINDOW, -1)
+        client.expire(session_id, PAGES_REDIS["SESSION_TTL"])
+        latencies.append(time.perf_counter() - t)
+    report("sync-commands", time.perf_counter() - start, latencies)
+    client.close()
+
+
+async def run_concurrent(name: str, request, n: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            t = time.perf_counter()
+            await request(f"bench-{name}-{i % 500}")
+            latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    report(name, time.perf_counter() - start, latencies, concurrency)
+
+
+async def async_modes(url: str, n: int, concurrency_levels: list) -> None:
+    pool = aioredis.BlockingConnectionPool.from_url(url, decode_responses=True,
+                                                    max_connections=PAGES_REDIS["MAX_CONNECTIONS"])
+    manager = AsyncRedisSessionManager(redis_client=aioredis.Redis(connection_pool=pool))
+    client = manager.redis_client
+
+    async def new_connection(session_id):
+        fresh = aioredis.Redis.from_url(url, decode_responses=True)
+        pipe = fresh.pipeline(transaction=False)
+        pipe.lrange(session_id, -WINDOW, -1)
+        pipe.rpush(session_id, *ITEMS)
+        pipe.ltrim(session_id, -WINDOW, -1)
+        pipe.expire(session_id, PAGES_REDIS["SESSION_TTL"])
+        await pipe.execute()
+        await fresh.aclose()
+
+    async def commands(session_id):
+        await client.type(session_id)
+        await client.lrange(session_id, -WINDOW, -1)
+        await client.rpush(session_id, *ITEMS)
+        await client.ltrim(session_id, -WINDOW, -1)
+        await client.expire(session_id, PAGES_REDIS["SESSION_TTL"])
+
+    async def pipelined(session_id):
+        await manager.get_history(session_id, WINDOW)
+        await manager.append_turns(session_id, TURN, WINDOW, PAGES_REDIS["SESSION_TTL"])
+
+    for concurrency in concurrency_levels:
+        await run_concurrent("async-new-conn", new_connection, n, concurrency)
+        await run_concurrent("async-commands", commands, n, concurrency)
+        await run_concurrent("async-pipelined", pipelined, n, concurrency)
+    await manager.close_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default=None, help="real Redis URL, defaults to a local fakeredis server")
+    parser.add_argument("--requests", "-n", type=int, default=2000)
+    parser.add_argument("--concurrency", "-c", type=int, nargs="+", default=[1, 64])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    url = start_redis_stand_in(args.url)
+    logging.getLogger("utils.redis_handler").setLevel(logging.WARNING)
+
+    sync_commands(url, args.requests)
+    asyncio.run(async_modes(url, args.requests, args.concurrency))
@@ -0,0 +1,346 @@
+"""
+Replay /query traffic against the production server setup, without Azure or a real Redis.
+
+Starts `gunicorn -c gunicorn_conf.py main:app` (--workers workers) with Azure OpenAI pointed at the mock
+endpoint (a child process, benchmarks/mock_llm_server.py) and Redis at a fakeredis stand-in (or --redis-url),
+then sends the traffic open-loop at --rps for --duration seconds after a --warmup: every request leaves at its
+scheduled time whether or not earlier ones have answered, and its latency is counted from that time, so a
+slow server shows up as latency instead of silently lowering the load.
+
+Traffic is a JSONL file of recorded /query calls, one per line - either the request body
+{"request_id", "source_system", "session_id", "query"} or {"body": {...}, "headers": {"x-login-mask-id": ...}};
+lines without a query are skipped. Without --traffic, sessions of one to three turns are generated from the
+catalog's example questions. The traffic is cycled, with the session ids renamed per cycle.
+
+Reported: throughput, latency percentiles, status codes, the server's event loop lag (the worker's
+pages_event_loop_lag_seconds histogram - the worker that answers /metrics when there are several), RSS of
+master + workers sampled during the run (peak) and PSS at the end, and the model calls the mock received.
+The gateway's per-minute budget is turned off, since the mock has no quota; the rest of the configuration is
+the production one.
+
+--output saves the results with the commit and the settings; --compare prints the change against a saved run
+and exits with 1 when a metric got worse by more than --tolerance, so hot-path regressions show up:
+    python -m benchmarks.bench_replay --rps 50 --duration 30 --output base.json
+    (change the code)
+    python -m benchmarks.bench_replay --rps 50 --duration 30 --compare base.json
+
+Linux only (reads /proc).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+from benchmarks.bench_server_startup import _children, _memory
+from benchmarks.mock_llm_server import start_mock_process
+from benchmarks.redis_stand_in import start_redis_stand_in
+from config import PAGES_CATALOG
+
+HEADERS = {
+    "x-login-mask-id": "replay-login", "x-login-gender": "U", "x-cust-mask-id": "replay-cust",
+    "x-cust-gender": "F", "x-cust-age": "40", "x-dr-license": "replay-license",
+}
+FOLLOW_UPS = ("ואיך מגישים?", "כן", "התכוונתי לשני", "ומה עם החזר?", "תודה")
+# (name, better when higher) - what --compare checks
+COMPARED = (("throughput_rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False),
+            ("error_rate", False), ("loop_lag_p99_ms", False), ("rss_peak_mb", False))
+
+
+def load_traffic(path: str) -> list:
+    traffic = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            body = record.get("body", record)
+            if not isinstance(body, dict) or not body.get("query"):
+                continue
+            traffic.append(({
+                "request_id": str(body.get("request_id", len(traffic))),
+                "source_system": int(body.get("source_system", 46)),
+                "session_id": str(body.get("session_id", f"replay-{len(traffic)}")),
+                "query": body["query"],
+            }, {**HEADERS, **record.get("headers", {})}))
+    if not traffic:
+        raise ValueError(f"no /query calls in {path}")
+    return traffic
+
+
+def generate_traffic(sessions: int, seed: int) -> list:
+    from utils.catalog import load_catalog
+
+    rng = random.Random(seed)
+    _, services = load_catalog(PAGES_CATALOG["PATH"])
+    questions = [question for service in services for question in service.examples]
+    traffic = []
+    for number in range(sessions):
+        turns = [rng.choice(questions)] + rng.sample(FOLLOW_UPS, rng.choice((0, 0, 1, 2)))
+        source_system = rng.choice((46, 46, 65))
+        for query in turns:
+            traffic.append(({"request_id": str(len(traffic)), "source_system": source_system,
+                             "session_id": f"replay-{number}", "query": query}, HEADERS))
+    return traffic
+
+
+def _git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except OSError:
+        return "unknown"
+
+
+def start_server(args, redis_url: str, tmp: str) -> tuple:
+    conf = os.path.join(tmp, "gunicorn_replay_conf.py")
+    with open(conf, "w", encoding="utf-8") as file:
+        file.write("from gunicorn_conf import *\n"
+                   "from config import PAGES_CACHE, PAGES_GATEWAY\n"
+                   "PAGES_GATEWAY.update(RPM=None, TPM=None)\n"
+                   f"PAGES_CACHE['ENABLED'] = {not args.no_cache}\n")
+    redis = urlparse(redis_url)
+    env = dict(
+        os.environ, PYTHONPATH=os.getcwd(), HOST="127.0.0.1", PORT=str(args.port), APP_ENV="REPLAY",
+        AZURE_OPENAI_API_KEY_REPLAY="replay-key", AZURE_OPENAI_ENDPOINT_REPLAY=f"http://127.0.0.1:{args.mock_port}",
+        AZURE_OPENAI_RETRIES_REPLAY="0", AZURE_OPENAI_VERSION_REPLAY="2024-10-21",
+        REDIS_HOST_REPLAY=redis.hostname, REDIS_PORT_REPLAY=str(redis.port or 6379),
+        REDIS_DB_REPLAY=(redis.path.lstrip("/") or "0"), REDIS_PASSWORD_REPLAY=redis.password or "replay",
+        REDIS_SSL_REPLAY=str(redis.scheme == "rediss").lower(),
+    )
+    log_path = os.path.join(tmp, "server.log")
+    with open(log_path, "w", encoding="utf-8") as log:
+        server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", conf, "--workers", str(args.workers),
+                                   "main:app"], env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            break
+        with open(log_path, encoding="utf-8") as file:
+            if file.read().count("connections opened") >= args.workers:
+                return server, log_path
+        time.sleep(0.1)
+    server.kill()
+    with open(log_path, encoding="utf-8") as file:
+        raise RuntimeError(f"server did not start:\n{file.read()[-3000:]}")
+
+
+class MemorySampler(threading.Thread):
+    """Peak RSS of the server process tree, sampled every `interval` seconds."""
+
+    def __init__(self, pid: int, interval: float = 0.25) -> None:
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self._done = threading.Event()
+
+    def rss_kb(self) -> int:
+        total = 0
+        for pid in [self.pid, *_children(self.pid)]:
+            try:
+                with open(f"/proc/{pid}/status", encoding="utf-8") as file:
+                    total += next(int(line.split()[1]) for line in file if line.startswith("VmRSS:"))
+            except (OSError, StopIteration):
+                pass
+        return total
+
+    def run(self) -> None:
+        while not self._done.wait(self.interval):
+            self.peak_kb = max(self.peak_kb, self.rss_kb())
+
+    def stop(self) -> None:
+        self._done.set()
+        self.join()
+
+
+def loop_lag_histogram(port: int) -> dict:
+    """{upper bound: cumulative count} plus sum and count of the server's event loop lag histogram."""
+    body = httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=10).text
+    histogram = {"buckets": {}, "sum": 0.0, "count": 0.0}
+    for family in text_string_to_metric_families(body):
+        if family.name != "pages_event_loop_lag_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_bucket"):
+                histogram["buckets"][float(sample.labels["le"])] = sample.value
+            elif sample.name.endswith("_sum"):
+                histogram["sum"] = sample.value
+            elif sample.name.endswith("_count"):
+                histogram["count"] = sample.value
+    return histogram
+
+
+def lag_between(before: dict, after: dict) -> dict:
+    count = after["count"] - before["count"]
+    if count <= 0:
+        return {"loop_lag_mean_ms": None, "loop_lag_p99_ms": None}
+    buckets = sorted((bound, after["buckets"][bound] - before["buckets"].get(bound, 0))
+                     for bound in after["buckets"])
+    # p99 as the upper bound of the bucket it falls in
+    p99 = next(bound for bound, cumulative in buckets if cumulative >= 0.99 * count)
+    return {"loop_lag_mean_ms": round((after["sum"] - before["sum"]) / count * 1000, 3),
+            "loop_lag_p99_ms": p99 * 1000 if p99 != float("inf") else None}
+
+
+async def replay(traffic: list, port: int, rps: float, seconds: float, cycle_offset: int = 0) -> dict:
+    results = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=1000)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+
+        async def send(body: dict, headers: dict, scheduled: float):
+            try:
+                response = await client.post("/query", json=body, headers=headers)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            results.append((status, time.perf_counter() - scheduled))
+
+        tasks = []
+        started = time.perf_counter()
+        total = int(rps * seconds)
+        for i in range(total):
+            scheduled = started + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            body, headers = traffic[i % len(traffic)]
+            body = {**body, "session_id": f"{body['session_id']}-{i // len(traffic) + cycle_offset}"}
+            tasks.append(asyncio.create_task(send(body, headers, scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for _, latency in results)
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = statuses.get("200", 0)
+
+    def percentile(q: float) -> float:
+        return round(latencies[min(int(len(latencies) * q), len(latencies) - 1)], 1)
+
+    return {
+        "requests": len(results),
+        "throughput_rps": round(ok / elapsed, 2),
+        "error_rate": round(1 - ok / len(results), 4),
+        "statuses": statuses,
+        "p50_ms": percentile(0.5), "p90_ms": percentile(0.9), "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99), "max_ms": round(latencies[-1], 1),
+        "mean_ms": round(statistics.mean(latencies), 1),
+    }
+
+
+def mock_stats(port: int, **settings) -> dict:
+    return httpx.post(f"http://127.0.0.1:{port}/mock/settings", json=settings, timeout=10).json()["stats"]
+
+
+def compare(results: dict, path: str, tolerance: float) -> bool:
+    with open(path, encoding="utf-8") as file:
+        base = json.load(file)
+    print(f"\ncompared with {path} ({base.get('commit')}):")
+    regressed = False
+    for name, higher_is_better in COMPARED:
+        old, new = base["results"].get(name), results.get(name)
+        if old in (None, 0) or new is None:
+            print(f"  {name:<16} {old!s:>10} -> {new!s:>10}")
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        regressed |= bool(flag)
+        print(f"  {name:<16} {old:>10} -> {new:>10} {change:+8.1%}{flag}")
+    if base.get("settings") != results.get("settings"):
+        print("  note: the runs used different settings")
+    return regressed
+
+
+def main(args) -> int:
+    traffic = load_traffic(args.traffic) if args.traffic else generate_traffic(args.sessions, args.seed)
+    redis_url = start_redis_stand_in(args.redis_url, args.redis_port)
+    mock = start_mock_process(args.mock_port)
+    settings = {key: value for key, value in vars(args).items()
+                if key not in ("output", "compare", "tolerance", "port", "mock_port", "redis_port")}
+    try:
+        mock_stats(args.mock_port, latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+                   token_ms=args.token_ms, options_fraction=args.options_fraction,
+                   max_options=args.max_options, slow_fraction=args.slow_fraction, slow_ms=args.slow_ms,
+                   seed=args.seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            server, _ = start_server(args, redis_url, tmp)
+            try:
+                sampler = MemorySampler(server.pid)
+                sampler.start()
+                if args.warmup:
+                    asyncio.run(replay(traffic, args.port, args.rps, args.warmup, cycle_offset=1000))
+                calls_before = mock_stats(args.mock_port)["requests"]
+                lag_before = loop_lag_histogram(args.port)
+                results = asyncio.run(replay(traffic, args.port, args.rps, args.duration))
+                lag_after = loop_lag_histogram(args.port)
+                results["model_calls"] = mock_stats(args.mock_port)["requests"] - calls_before
+                sampler.stop()
+                results.update(lag_between(lag_before, lag_after))
+                results["rss_peak_mb"] = round(sampler.peak_kb / 1024, 1)
+                results["pss_end_mb"] = round(sum(_memory(pid)["pss"] for pid in [server.pid, *_children(server.pid)])
+                                              / 1024, 1)
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+    finally:
+        mock.terminate()
+
+    results["settings"] = settings
+    print(f"commit {_git_commit()}: {len(traffic)} recorded calls, {args.rps} rps for {args.duration}s, "
+          f"{args.workers} worker(s)")
+    print(f"  throughput={results['throughput_rps']} req/s errors={results['error_rate']:.2%} {results['statuses']} "
+          f"model calls={results['model_calls']}")
+    print(f"  latency p50={results['p50_ms']}ms p90={results['p90_ms']}ms p95={results['p95_ms']}ms "
+          f"p99={results['p99_ms']}ms max={results['max_ms']}ms")
+    print(f"  event loop lag mean={results['loop_lag_mean_ms']}ms p99<={results['loop_lag_p99_ms']}ms | "
+          f"rss peak={results['rss_peak_mb']}MB pss end={results['pss_end_mb']}MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"commit": _git_commit(), "settings": settings,
+                       "results": {k: v for k, v in results.items() if k != "settings"}}, file, indent=2)
+    if args.compare and compare(results, args.compare, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--traffic", help="JSONL of recorded /query calls (default: generated from the catalog)")
+    parser.add_argument("--sessions", type=int, default=200, help="generated sessions")
+    parser.add_argument("--rps", type=float, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of load before measuring")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="turn the response cache off")
+    parser.add_argument("--latency-ms", type=float, default=800, help="mock model latency, mean")
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="lognormal sigma of the latency")
+    parser.add_argument("--token-ms", type=float, default=5, help="mock generation time per 4-char chunk")
+    parser.add_argument("--options-fraction", type=float, default=0.4, help="answers that list options")
+    parser.add_argument("--max-options", type=int, default=5)
+    parser.add_argument("--slow-fraction", type=float, default=0.01)
+    parser.add_argument("--slow-ms", type=float, default=3000)
+    parser.add_argument("--seed", type=int, default=19)
+    parser.add_argument("--redis-url", help="a real Redis instead of the fakeredis stand-in")
+    parser.add_argument("--port", type=int, default=8030)
+    parser.add_argument("--mock-port", type=int, default=8031)
+    parser.add_argument("--redis-port", type=int, default=6391)
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change counted as a regression")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,125 @@
+"""
+Cost of turning a model answer into the /query response body: the previous model-based path vs the dict +
+orjson path of main.build_response.
+
+pydantic:  json.loads, ResponseMSG / card models constructed (with the card-fixing __init__ the model had),
+           then validated and dumped to JSON bytes against the response model, as FastAPI does for a
+           returned model with response_model set.
+orjson:    orjson.loads, the response built as a plain dict, orjson.dumps.
+
+Both produce the same JSON document, which is checked before timing. Stage metrics are switched off so
+only building and serializing is timed.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_response_build --iterations 20000
+"""
+import argparse
+import json
+import logging
+import time
+
+import orjson
+from pydantic import TypeAdapter
+
+from config import PAGES_METRICS
+
+ANSWERS = {
+    "code": json.dumps({"code": "101", "name": "ההתחייבויות שלי"}, ensure_ascii=False),
+    "options": json.dumps({
+        "options": [{"code": "101", "name": "ההתחייבויות שלי"}, {"code": "102", "name": "ההחזרים שלי"},
+                    {"code": "205", "name": "טופס 17"}, {"code": "310", "name": "בקשה להחזר הוצאות"}],
+        "clarification_question": "האם ברצונך להגיש בקשה להתחייבות, לבדוק החזר קיים או להגיש בקשה להחזר הוצאות?"
+    }, ensure_ascii=False),
+    "error": json.dumps({"error_message": "אני יכול לעזור רק במציאת שירותים באתר."}, ensure_ascii=False),
+    "text": "שלום! אני כאן כדי לעזור לך למצוא את השירות המתאים.",
+}
+
+
+def legacy_builder(main):
+    """The response path as it was: json.loads, then the pydantic models."""
+
+    class LegacyResponseMSG(main.ResponseMSG):
+        def __init__(self, **data):
+            super().__init__(**data)
+            if self.card_type == "text":
+                if self.text_card is None:
+                    self.text_card = main.Text_card(text="")
+                self.options_card = None
+                self.json_card = None
+                self.card_sub_type = "redirect"
+            elif self.card_type == "json":
+                if self.json_card is None:
+                    self.json_card = main.Json_card(text="", content={})
+                self.text_card = None
+                self.options_card = None
+                self.card_sub_type = "redirect"
+            elif self.card_type == "error":
+                self.card_sub_type = "redirect"
+                if self.error_card is None:
+                    self.error_card = main.Error_card()
+                self.text_card = None
+                self.options_card = None
+                self.json_card = None
+
+    def build(req, answer: str, catalog_version: str):
+        try:
+            parsed = json.loads(answer)
+        except json.JSONDecodeError:
+            parsed = answer
+        common = dict(request_id=req.request_id, source_system=req.source_system, session_id=req.session_id,
+                      next_agent="redirect")
+        if isinstance(parsed, dict) and "error_message" in parsed:
+            response = LegacyResponseMSG(**common, card_type="error",
+                                         error_card=main.Error_card(text=parsed["error_message"]))
+        elif isinstance(parsed, dict):
+            try:
+                options, text = parsed["options"], parsed["clarification_question"]
+            except KeyError:
+                options, text = parsed, "זה מה שמצאתי:"
+            response = LegacyResponseMSG(**common, card_type="json", json_card=main.Json_card(
+                text=text, content=json.dumps(options, ensure_ascii=False)))
+        else:
+            response = LegacyResponseMSG(**common, card_type="text", text_card=main.Text_card(text=parsed))
+        response.catalog_version = catalog_version
+        return response
+
+    return build
+
+
+def timed(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main(iterations: int) -> None:
+    import main as app_main
+
+    req = app_main.RequestMSG(request_id="1", source_system=46, session_id="xyz-456", query="טופס 17")
+    legacy_build = legacy_builder(app_main)
+    adapter = TypeAdapter(app_main.ResponseMSG)
+
+    def legacy(answer: str) -> bytes:
+        # FastAPI: validate the returned object against response_model, then dump it to JSON bytes
+        return adapter.dump_json(adapter.validate_python(legacy_build(req, answer, "v1")))
+
+    def current(answer: str) -> bytes:
+        return orjson.dumps(app_main.build_response(req, answer, "v1"))
+
+    print(f"{'answer':<8} {'pydantic':>12} {'orjson':>12} {'speedup':>8}")
+    for name, answer in ANSWERS.items():
+        assert json.loads(legacy(answer)) == json.loads(current(answer)), name
+        before = timed(lambda: legacy(answer), iterations)
+        after = timed(lambda: current(answer), iterations)
+        print(f"{name:<8} {before:10.1f}us {after:10.1f}us {before / after:7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", "-n", type=int, default=20000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    PAGES_METRICS["ENABLED"] = False
+    main(args.iterations)
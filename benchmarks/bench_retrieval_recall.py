@@ -0,0 +1,62 @@
+"""
+Offline recall@K of the catalog retriever over the catalog's own example questions.
+
+The example questions are part of the index, so each one is evaluated against an index built
+without it (k-fold: an example in fold f is scored against the index of the other folds).
+A hit means the example's service is among the top K shortlisted services.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_retrieval_recall --folds 5 --k 1 5 10 15 20
+"""
+import argparse
+import dataclasses
+import time
+
+from config import PAGES_CATALOG
+from utils.catalog import load_catalog
+from utils.retrieval import ServiceRetriever
+
+
+def evaluate(pages: list, folds: int, ks: list) -> dict:
+    hits = {k: 0 for k in ks}
+    total, search_time = 0, 0.0
+    for fold in range(folds):
+        train = [
+            dataclasses.replace(page, examples=[q for i, q in enumerate(page.examples) if i % folds != fold])
+            for page in pages
+        ]
+        retriever = ServiceRetriever(train)
+        for page in pages:
+            for question in page.examples[fold::folds]:
+                start = time.perf_counter()
+                ranked = [candidate.code for candidate, _ in retriever.search(question, max(ks))]
+                search_time += time.perf_counter() - start
+                total += 1
+                for k in ks:
+                    hits[k] += page.code in ranked[:k]
+    return {"questions": total, "recall": {k: hits[k] / total for k in ks}, "avg_search_ms": search_time / total * 1000}
+
+
+def shortlist_size(pages: list, k: int) -> float:
+    """Average UTF-8 size of the top-k shortlist rendered into the prompt."""
+    retriever = ServiceRetriever(pages)
+    questions = [q for page in pages for q in page.examples]
+    sizes = [sum(len(p.markdown.encode("utf-8")) for p, _ in retriever.search(q, k)) for q in questions]
+    return sum(sizes) / len(sizes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", "-P", type=str, default=PAGES_CATALOG["PATH"])
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10, 15, 20])
+    args = parser.parse_args()
+
+    _, services = load_catalog(args.path)
+
+    result = evaluate(services, args.folds, args.k)
+    print(f"services={len(services)} questions={result['questions']} avg_search={result['avg_search_ms']:.3f}ms")
+    full_size = sum(len(page.markdown.encode("utf-8")) for page in services)
+    for k, recall in result["recall"].items():
+        print(f"recall@{k:<3} {recall:.3f}  prompt catalog {shortlist_size(services, k) / 1024:6.1f} KB "
+              f"(full catalog {full_size / 1024:.1f} KB)")
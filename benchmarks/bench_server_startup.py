@@ -0,0 +1,103 @@
+"""
+Server startup time and memory: gunicorn_conf.py with the app preloaded in the master vs every worker
+importing the app (and building the catalog) itself.
+
+Each mode starts `gunicorn -c gunicorn_conf.py main:app` with --workers workers and measures:
+  * ready: launch until every worker has opened its connections (the lifespan ran),
+  * first response: launch until GET /catalog answers,
+  * memory from /proc/<pid>/smaps_rollup: USS (private pages) per worker and the PSS of master + workers,
+    i.e. what the server really costs the host once shared pages are split between the processes.
+
+Redis and Azure OpenAI are configured but never contacted (clients connect lazily). Linux only.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_server_startup --workers 4
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_async_load import _configure_env
+
+
+def _memory(pid: int) -> dict:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return {"pss": values["Pss"], "uss": values["Private_Clean"] + values["Private_Dirty"]}
+
+
+def _children(pid: int) -> list:
+    with open(f"/proc/{pid}/task/{pid}/children", "r") as file:
+        return [int(child) for child in file.read().split()]
+
+
+def run(preload: bool, workers: int, port: int, timeout: float = 120) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        conf = os.path.join(tmp, "gunicorn_bench_conf.py")
+        with open(conf, "w", encoding="utf-8") as file:
+            file.write(f"from gunicorn_conf import *\npreload_app = {preload}\n")
+        log_path = os.path.join(tmp, "server.log")
+        env = dict(os.environ, PYTHONPATH=os.getcwd(), PORT=str(port), HOST="127.0.0.1")
+
+        started = time.perf_counter()
+        with open(log_path, "w", encoding="utf-8") as log:
+            server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", conf, "--workers", str(workers),
+                                       "main:app"], env=env, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            ready = first_response = None
+            while ready is None or first_response is None:
+                elapsed = time.perf_counter() - started
+                if elapsed > timeout or server.poll() is not None:
+                    with open(log_path, "r", encoding="utf-8") as file:
+                        raise RuntimeError(f"server did not start:\n{file.read()[-3000:]}")
+                if first_response is None:
+                    try:
+                        if httpx.get(f"http://127.0.0.1:{port}/catalog", timeout=1).status_code == 200:
+                            first_response = time.perf_counter() - started
+                    except httpx.HTTPError:
+                        pass
+                if ready is None:
+                    with open(log_path, "r", encoding="utf-8") as file:
+                        if file.read().count("connections opened") >= workers:
+                            ready = time.perf_counter() - started
+                time.sleep(0.02)
+
+            time.sleep(1)  # let the workers settle after startup
+            master = _memory(server.pid)
+            worker_memory = [_memory(pid) for pid in _children(server.pid)]
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+
+    return {
+        "ready": ready,
+        "first_response": first_response,
+        "worker_uss_mb": sum(memory["uss"] for memory in worker_memory) / len(worker_memory) / 1024,
+        "total_pss_mb": (master["pss"] + sum(memory["pss"] for memory in worker_memory)) / 1024,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", "-w", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8014)
+    args = parser.parse_args()
+
+    _configure_env(8011)
+    for key, value in (("HOST", "127.0.0.1"), ("PORT", "6390"), ("DB", "0"), ("PASSWORD", "bench")):
+        os.environ[f"REDIS_{key}_BENCH"] = value
+
+    for preload in (False, True):
+        result = run(preload, args.workers, args.port)
+        print(f"{'preload' if preload else 'no preload':<11} workers={args.workers} "
+              f"ready {result['ready']:5.2f}s  first response {result['first_response']:5.2f}s  "
+              f"USS/worker {result['worker_uss_mb']:6.1f}MB  total PSS {result['total_pss_mb']:6.1f}MB")
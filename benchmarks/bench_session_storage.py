@@ -0,0 +1,83 @@
+"""
+Per-request Redis cost of session history as the session grows.
+
+legacy: the previous /query flow - get_session, then append_to_session of the updated history
+        (GET + GET + SET of a JSON blob that nests the whole previous blob, so it doubles every turn -
+        keep --turns small, 14 turns is already ~6 MB per session).
+list:   get_history + append_turns (pipelined LRANGE, then RPUSH + LTRIM + EXPIRE on a bounded list).
+
+Usage (from the repo root):
+    python -m benchmarks.bench_session_storage --turns 12 --sessions 20
+    python -m benchmarks.bench_session_storage --url redis://localhost:6379/0
+"""
+import argparse
+import logging
+import statistics
+import time
+import json
+
+import redis
+
+from config import PAGES_MODEL, PAGES_REDIS
+from benchmarks.redis_stand_in import start_redis_stand_in
+from utils.redis_handler import RedisSessionManager
+
+WINDOW = PAGES_MODEL["MEMORY_K"] * 2
+ANSWER = json.dumps({
+    "options": [{"code": "101", "name": "ההתחייבויות שלי"}, {"code": "102", "name": "ההחזרים שלי"}],
+    "clarification_question": "האם ברצונך להגיש בקשה להתחייבות או להחזר כספי?"
+}, ensure_ascii=False)
+
+
+def turn(i: int) -> list:
+    return [{"role": "user", "content": f"אני רוצה להגיש בקשה {i}"}, {"role": "assistant", "content": ANSWER}]
+
+
+def legacy_request(manager: RedisSessionManager, session_id: str, i: int) -> None:
+    history = manager.get_session(session_id)
+    updated_history = ([history] + turn(i))[-WINDOW:]
+    manager.append_to_session(session_id, updated_history)
+
+
+def list_request(manager: RedisSessionManager, session_id: str, i: int) -> None:
+    manager.get_history(session_id, WINDOW)
+    manager.append_turns(session_id, turn(i), WINDOW, PAGES_REDIS["SESSION_TTL"])
+
+
+def stored_bytes(client, session_id: str) -> int:
+    if client.type(session_id) == "string":
+        return client.strlen(session_id)
+    return sum(len(item.encode("utf-8")) for item in client.lrange(session_id, 0, -1))
+
+
+def run(manager: RedisSessionManager, request, name: str, turns: int, sessions: int, report_at: list) -> None:
+    client = manager.redis_client
+    latencies = {n: [] for n in report_at}
+    for s in range(sessions):
+        session_id = f"bench-{name}-{s}"
+        client.delete(session_id)
+        for i in range(1, turns + 1):
+            start = time.perf_counter()
+            request(manager, session_id, i)
+            if i in latencies:
+                latencies[i].append(time.perf_counter() - start)
+    for n in report_at:
+        print(f"{name:<7} turn={n:<4} per-request={statistics.median(latencies[n]) * 1000:8.3f}ms "
+              f"stored={stored_bytes(client, f'bench-{name}-0') if n == turns else '':>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default=None, help="real Redis URL, defaults to a local fakeredis server")
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--sessions", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    url = start_redis_stand_in(args.url)
+    manager = RedisSessionManager(redis_client=redis.Redis.from_url(url, decode_responses=True))
+    logging.getLogger("utils.redis_handler").setLevel(logging.WARNING)
+
+    report_at = sorted({n for n in (1, 2, 4, 8, 12, 16, 24, 32, args.turns) if n <= args.turns})
+    run(manager, legacy_request, "legacy", args.turns, args.sessions, report_at)
+    run(manager, list_request, "list", args.turns, args.sessions, report_at)
@@ -0,0 +1,71 @@
+"""
+Time to first visible content: streamed answer + AnswerStreamParser vs the blocking ainvoke.
+
+The mock LLM returns a clarification answer (options + question) token by token, the long output
+shape where waiting for the whole generation hurts most.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_streaming --latency-ms 300 --token-ms 15 --runs 5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+from benchmarks.bench_async_load import _configure_env
+from benchmarks.mock_llm_server import start_mock_server
+from utils.stream_parser import AnswerStreamParser
+
+ANSWER = json.dumps({
+    "options": [
+        {"code": "101", "name": "ההתחייבויות שלי"},
+        {"code": "102", "name": "ההחזרים שלי"},
+        {"code": "107", "name": "התיק הרפואי שלי"},
+    ],
+    "clarification_question": "האם ברצונך להגיש בקשה להתחייבות (טופס 17), לבקש החזר כספי על טיפול שכבר בוצע, "
+                              "או לצפות במסמכים בתיק הרפואי שלך?"
+}, ensure_ascii=False)
+
+
+async def streamed(agent, query: str) -> dict:
+    marks = {}
+    start = time.perf_counter()
+    parser = AnswerStreamParser()
+    async for delta in agent.astream(query, []):
+        for event in parser.feed(delta):
+            marks.setdefault(f"first_{event['event']}", time.perf_counter() - start)
+    marks["complete"] = time.perf_counter() - start
+    return marks
+
+
+async def blocking(agent, query: str) -> dict:
+    start = time.perf_counter()
+    await agent.ainvoke(query, [])
+    return {"complete": time.perf_counter() - start}
+
+
+async def main(runs: int) -> None:
+    from service_page_agent import AzureOpenAiClient
+    agent = AzureOpenAiClient()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    for name, run in (("ainvoke", blocking), ("astream", streamed)):
+        samples = [await run(agent, f"בקשה לכסף {i}") for i in range(runs)]
+        for mark in samples[0]:
+            print(f"{name:<8} {mark:<16} {statistics.median(s[mark] for s in samples) * 1000:8.1f}ms")
+    await agent.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=300, help="mock time to first token")
+    parser.add_argument("--token-ms", type=float, default=15, help="mock delay between chunks")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8012)
+    args = parser.parse_args()
+
+    _configure_env(args.port)
+    start_mock_server(args.port, latency_ms=args.latency_ms, token_ms=args.token_ms, content=ANSWER)
+    asyncio.run(main(args.runs))
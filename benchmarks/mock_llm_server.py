@@ -0,0 +1,233 @@
+"""
+Local stand-in for the Azure OpenAI chat-completions endpoint.
+
+Answers every request with a canned classification after a configurable delay, so benchmarks
+can exercise the real SDK/HTTP path without paying for Azure calls. Streaming requests get the same
+content as SSE chunks of CHUNK_CHARS characters, TOKEN_MS apart, after the initial delay; blocking
+requests wait for the same simulated generation time before answering.
+
+Overload can be simulated the way Azure behaves under it: requests beyond MAX_IN_FLIGHT concurrent ones
+(and a random RATE_LIMIT_FRACTION of the rest) get a 429 with a RETRY_AFTER_MS retry-after-ms header, and
+every request in flight adds IN_FLIGHT_LATENCY_MS to the latency of a new one. MOCK_STATS counts both.
+PREFILL_MS_PER_1K adds prompt processing time per 1000 prompt tokens (4 characters a token), so prompt size
+shows up in the latency. A request with a json_schema response_format gets CONTENT as a structured answer,
+{"answer": ...} without the service names, the way the schema of utils/answer_schema.py makes the model answer.
+A SLOW_FRACTION of the requests takes SLOW_MS longer (tail latency) and an ERROR_FRACTION fails with a 500.
+Settings can be changed while the server runs with POST /mock/settings {"latency_ms": 1500, ...}.
+
+Distributions for load tests: LATENCY_SIGMA > 0 draws the base latency from a lognormal with mean LATENCY_MS,
+and an OPTIONS_FRACTION of the answers list 2..MAX_OPTIONS services (codes from the request's json_schema enum)
+with a clarification question, so completion sizes - and with TOKEN_MS their generation time - vary. SEED
+makes the draws repeatable.
+
+Run standalone:
+    python -m benchmarks.mock_llm_server --port 8011 --latency-ms 1000
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MOCK_SETTINGS = {
+    "LATENCY_MS": 1000,
+    "JITTER_MS": 0,
+    "TOKEN_MS": 0,
+    "CHUNK_CHARS": 4,
+    "CONTENT": json.dumps({"code": "101", "name": "ההתחייבויות שלי"}, ensure_ascii=False),
+    "MAX_IN_FLIGHT": 0,  # 0 = no concurrency limit
+    "RATE_LIMIT_FRACTION": 0.0,
+    "RETRY_AFTER_MS": 500,
+    "IN_FLIGHT_LATENCY_MS": 0,
+    "SLOW_FRACTION": 0.0,
+    "SLOW_MS": 0,
+    "ERROR_FRACTION": 0.0,
+    "PREFILL_MS_PER_1K": 0,
+    "LATENCY_SIGMA": 0.0,
+    "OPTIONS_FRACTION": 0.0,
+    "MAX_OPTIONS": 5,
+}
+QUESTION = "כדי שאוכל לכוון אותך לשירות הנכון, האם תוכל לפרט למה בדיוק התכוונת?"
+MOCK_STATS = {"requests": 0, "rate_limited": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+
+app = FastAPI(title="Mock Azure OpenAI")
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    body = await request.json()
+    MOCK_STATS["requests"] += 1
+    if ((MOCK_SETTINGS["MAX_IN_FLIGHT"] and MOCK_STATS["in_flight"] >= MOCK_SETTINGS["MAX_IN_FLIGHT"])
+            or random.random() < MOCK_SETTINGS["RATE_LIMIT_FRACTION"]):
+        MOCK_STATS["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"code": "429", "message": "Requests to the ChatCompletions_Create Operation have "
+                                                        "exceeded call rate limit."}},
+            headers={"retry-after-ms": str(MOCK_SETTINGS["RETRY_AFTER_MS"]),
+                     "retry-after": str(-(-MOCK_SETTINGS["RETRY_AFTER_MS"] // 1000))},
+        )
+
+    if random.random() < MOCK_SETTINGS["ERROR_FRACTION"]:
+        MOCK_STATS["errors"] += 1
+        return JSONResponse(status_code=500, content={"error": {"code": "InternalServerError",
+                                                                "message": "The server had an error."}})
+
+    MOCK_STATS["in_flight"] += 1
+    MOCK_STATS["max_in_flight"] = max(MOCK_STATS["max_in_flight"], MOCK_STATS["in_flight"])
+    try:
+        return await _answer(deployment, body)
+    finally:
+        MOCK_STATS["in_flight"] -= 1
+
+
+async def _answer(deployment: str, body: dict):
+    prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+    base = MOCK_SETTINGS["LATENCY_MS"]
+    if MOCK_SETTINGS["LATENCY_SIGMA"] > 0:
+        sigma = MOCK_SETTINGS["LATENCY_SIGMA"]
+        base *= random.lognormvariate(-sigma ** 2 / 2, sigma)
+    delay = (base + random.uniform(-1, 1) * MOCK_SETTINGS["JITTER_MS"]
+             + (MOCK_STATS["in_flight"] - 1) * MOCK_SETTINGS["IN_FLIGHT_LATENCY_MS"]
+             + (MOCK_SETTINGS["SLOW_MS"] if random.random() < MOCK_SETTINGS["SLOW_FRACTION"] else 0)
+             + prompt_tokens / 1000 * MOCK_SETTINGS["PREFILL_MS_PER_1K"])
+    await asyncio.sleep(max(delay, 0) / 1000)
+
+    content = MOCK_SETTINGS["CONTENT"]
+    if random.random() < MOCK_SETTINGS["OPTIONS_FRACTION"]:
+        content = _options_answer(body)
+    if (body.get("response_format") or {}).get("type") == "json_schema":
+        content = _structured(content)
+    if body.get("stream"):
+        return StreamingResponse(_stream_chunks(deployment, content), media_type="text/event-stream")
+    chunks = -(-len(content) // MOCK_SETTINGS["CHUNK_CHARS"])
+    await asyncio.sleep(chunks * MOCK_SETTINGS["TOKEN_MS"] / 1000)
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+        },
+    }
+
+
+def _schema_codes(body: dict) -> list:
+    try:
+        answer = body["response_format"]["json_schema"]["schema"]["properties"]["answer"]
+        return answer["anyOf"][0]["properties"]["code"]["enum"]
+    except (KeyError, IndexError, TypeError):
+        return []
+
+
+def _options_answer(body: dict) -> str:
+    codes = _schema_codes(body) or [str(code) for code in range(101, 121)]
+    offered = random.sample(codes, min(random.randint(2, max(MOCK_SETTINGS["MAX_OPTIONS"], 2)), len(codes)))
+    return json.dumps({"options": [{"code": code, "name": f"שירות {code}"} for code in offered],
+                       "clarification_question": QUESTION}, ensure_ascii=False)
+
+
+def _structured(content: str) -> str:
+    try:
+        answer = json.loads(content)
+    except ValueError:
+        return json.dumps({"answer": {"text": content}}, ensure_ascii=False)
+    if "code" in answer:
+        answer = {"code": answer["code"]}
+    elif "options" in answer:
+        answer = {"options": [{"code": option["code"]} for option in answer["options"]],
+                  "clarification_question": answer.get("clarification_question", "")}
+    return json.dumps({"answer": answer}, ensure_ascii=False)
+
+
+@app.post("/mock/settings")
+async def update_settings(request: Request) -> dict:
+    settings = {key.upper(): value for key, value in (await request.json()).items()}
+    if "SEED" in settings:
+        random.seed(settings.pop("SEED"))
+    MOCK_SETTINGS.update(settings)
+    return {"settings": MOCK_SETTINGS, "stats": MOCK_STATS}
+
+
+async def _stream_chunks(deployment: str, content: str):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        return "data: " + json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }, ensure_ascii=False) + "\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+    step = MOCK_SETTINGS["CHUNK_CHARS"]
+    for i in range(0, len(content), step):
+        yield chunk({"content": content[i:i + step]})
+        await asyncio.sleep(MOCK_SETTINGS["TOKEN_MS"] / 1000)
+    yield chunk({}, finish_reason="stop")
+    yield "data: [DONE]\n\n"
+
+
+def start_mock_process(port: int) -> subprocess.Popen:
+    """Serve the mock in a child process (so it does not share the GIL with the load) and wait until it listens."""
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.mock_llm_server", "--port", str(port)])
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"mock server on port {port} did not start")
+
+
+def start_mock_server(port: int = 8011, **settings) -> uvicorn.Server:
+    """Serve the mock in a daemon thread and block until it accepts connections."""
+    MOCK_SETTINGS.update({k.upper(): v for k, v in settings.items()})
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency-ms", type=float, default=MOCK_SETTINGS["LATENCY_MS"])
+    parser.add_argument("--jitter-ms", type=float, default=MOCK_SETTINGS["JITTER_MS"])
+    parser.add_argument("--max-in-flight", type=int, default=MOCK_SETTINGS["MAX_IN_FLIGHT"])
+    parser.add_argument("--rate-limit-fraction", type=float, default=MOCK_SETTINGS["RATE_LIMIT_FRACTION"])
+    parser.add_argument("--in-flight-latency-ms", type=float, default=MOCK_SETTINGS["IN_FLIGHT_LATENCY_MS"])
+    parser.add_argument("--slow-fraction", type=float, default=MOCK_SETTINGS["SLOW_FRACTION"])
+    parser.add_argument("--slow-ms", type=float, default=MOCK_SETTINGS["SLOW_MS"])
+    parser.add_argument("--error-fraction", type=float, default=MOCK_SETTINGS["ERROR_FRACTION"])
+    args = parser.parse_args()
+
+    MOCK_SETTINGS.update({"LATENCY_MS": args.latency_ms, "JITTER_MS": args.jitter_ms,
+                          "MAX_IN_FLIGHT": args.max_in_flight, "RATE_LIMIT_FRACTION": args.rate_limit_fraction,
+                          "IN_FLIGHT_LATENCY_MS": args.in_flight_latency_ms, "SLOW_FRACTION": args.slow_fraction,
+                          "SLOW_MS": args.slow_ms, "ERROR_FRACTION": args.error_fraction})
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,54 @@
+"""
+Redis for benchmarks: a real server when a URL is given, otherwise fakeredis served over a local TCP
+socket in a child process, so every command still pays a real network round trip and the stand-in does
+not compete with the benchmark for the GIL.
+
+Run standalone:
+    python -m benchmarks.redis_stand_in --port 6390
+"""
+import argparse
+import atexit
+import socket
+import subprocess
+import sys
+import time
+
+
+def serve(port: int) -> None:
+    from fakeredis import TcpFakeServer
+
+    class NoDelayServer(TcpFakeServer):
+        # fakeredis writes each pipelined reply separately - without TCP_NODELAY every pipeline pays
+        # a ~40ms Nagle / delayed-ACK stall that a real redis-server does not have
+        def get_request(self):
+            connection, address = super().get_request()
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return connection, address
+
+    server = NoDelayServer(("127.0.0.1", port), server_type="redis")
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def start_redis_stand_in(url: str = None, port: int = 6390) -> str:
+    """Return a redis:// URL to benchmark against, starting a fakeredis server process when no URL is given."""
+    if url:
+        return url
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.redis_stand_in", "--port", str(port)])
+    atexit.register(process.terminate)
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return f"redis://127.0.0.1:{port}/0"
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"fakeredis stand-in did not start on port {port}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    serve(args.port)
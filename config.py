@@ -5,16 +5,147 @@ PAGES_MODEL = {
     "TIMEOUT": 30.0,
     "TEMPERATURE": 0.0,
     "TOP_P": 1.0,
-    "STREAM": False,
+    "STREAM": True, # serve the opt-in /query/stream endpoint
+    "STRUCTURED_OUTPUT": True, # JSON-schema answers with catalog codes only (api-version 2024-08-01-preview or later)
     "MEMORY_K": 3,
-    "FILE_PATH": "utils/output.md",
-    "SEED": 42
+    "TOP_K": 15, # services shortlisted into the prompt per request, None sends the whole catalog
+    "SEED": 42,
+    "MAX_CONNECTIONS": 200, # pooled HTTP connections shared by the async client
+    "MAX_KEEPALIVE_CONNECTIONS": 50
+}
+
+PAGES_CONVERSATION = {
+    "COMPACT": True, # store and send assistant turns as codes + a short question (utils/conversation.py)
+    "TEXT_CHARS": 120, # clarification question / message kept per compact assistant turn
+    "USER_CHARS": 400, # user message kept per history turn
+    "SUMMARY_TURNS": 6, # turns before the MEMORY_K window kept in the session, sent as a summary of their codes
+    "SUMMARY_CODES": 10, # most recent codes in the summary
+    "HISTORY_TOKENS": 400, # history messages per prompt, the oldest turns move into the summary first
+    "HISTORY_SERVICES": 8, # services offered earlier that stay in the shortlist, the most recent ones
+    "SHORTLIST_TOKENS": 4500 # shortlisted services' markdown per prompt, lowest ranked dropped first
+}
+
+PAGES_GATEWAY = {
+    "ENABLED": True, # admission control in front of the async model calls (utils/llm_gateway.py)
+    "RPM": 600, # quota of each deployment, requests per minute, split evenly between the workers - None for no request budget
+    "TPM": 300000, # quota of each deployment, tokens per minute, split evenly between the workers - None for no token budget
+    "BURST_SECONDS": 10, # budget that may be spent at once; Azure enforces the quota over short windows
+    "CHARS_PER_TOKEN": 2.5, # prompt token estimate (Hebrew-heavy prompts), also for the conversation budgets
+    "INITIAL_CONCURRENCY": 16, # model calls in flight per worker, adapted between MIN and MAX
+    "MIN_CONCURRENCY": 1,
+    "MAX_CONCURRENCY": 128,
+    "LATENCY_TARGET": 6.0, # seconds - slower calls shrink the concurrency cap like a 429 does, but gently
+    "THROTTLE_BACKOFF": 0.5, # cap multiplier on a 429
+    "LATENCY_BACKOFF": 0.9, # cap multiplier on a slow call
+    "DECREASE_COOLDOWN": 1.0, # seconds between two cuts of the cap, one cut per congestion event
+    "RETRY_PAUSE": 1.0, # seconds every caller waits after a 429 without Retry-After
+    "MAX_ATTEMPTS": 4, # per call, on 429 / timeouts / 5xx (the SDK's own retries are off)
+    "BACKOFF_BASE": 0.25, # seconds, doubled per attempt (full jitter), for non-429 errors
+    "BACKOFF_MAX": 4,
+    "QUEUE_TIMEOUT": 20, # seconds a request may wait for a slot before it is shed with a 503
+    "PRIORITIES": {65: 0, 46: 1}, # source_system -> priority, lower is served first (65 apps, 46 website)
+    "DEFAULT_PRIORITY": 2, # other systems and batch classification
+    "SINGLE_FLIGHT": True # identical concurrent requests share one call (deterministic TEMPERATURE 0 only)
+}
+
+PAGES_ROUTER = {
+    # Deployments: the AZURE_OPENAI_* env variables are the primary one. More can be listed as a JSON array in
+    # AZURE_OPENAI_DEPLOYMENTS_<ENV>: [{"name": "...", "endpoint": "...", "api_key": "...", "model": "..."}]
+    # (missing fields default to the primary's; "model" is the Azure deployment name; optional "rpm" / "tpm"
+    # override the PAGES_GATEWAY quota for that deployment).
+    "EWMA_ALPHA": 0.3, # weight of the newest latency / error sample
+    "ERROR_PENALTY": 4, # score multiplier per unit of error rate
+    "FAILURES_TO_EJECT": 3, # consecutive failures that take a deployment out of rotation
+    "EJECT_SECONDS": 30,
+    "PROBE_SECONDS": 30, # a deployment unused this long gets the next call, to refresh its latency
+    "HEDGE": True, # duplicate slow calls to a second deployment (needs two deployments)
+    "HEDGE_QUANTILE": 0.95, # hedge after this quantile of the primary's recent latency
+    "HEDGE_DELAY": 3.0, # seconds, until a deployment has MIN_SAMPLES latencies
+    "HEDGE_MIN_DELAY": 0.5,
+    "HEDGE_BUDGET": 0.1, # at most this fraction of calls is hedged
+    "LATENCY_WINDOW": 200, # recent latencies kept per deployment for the quantile
+    "MIN_SAMPLES": 20
+}
+
+PAGES_FAST_PATH = {
+    "ENABLED": True,
+    "THRESHOLD": 0.9, # minimal trigram similarity of a near-exact match
+    "MARGIN": 0.1, # required lead over the best phrase of any other service
+    "MIN_FUZZY_LENGTH": 6 # shorter queries must match a catalog phrase exactly
+}
+
+PAGES_EMBEDDINGS = {
+    "ENABLED": True,
+    "PATH": None, # index built by `python -m utils.embedding_index`, None = next to the catalog (utils/catalog.embeddings.npy)
+    "DIM": 512, # hashed features per vector, used when the index is built
+    "THRESHOLD": 0.7, # minimal cosine similarity of the closest phrase to answer without the model
+    "MARGIN": 0.2, # required lead over the closest phrase of any other service
+    "CANDIDATES": 8, # services sent to the model on an ambiguous match, instead of TOP_K retrieval hits
+    "MIN_SCORE": 0.35 # below this the candidates are no evidence and retrieval shortlists as before
+}
+
+PAGES_CLARIFICATION = {
+    "ENABLED": True, # precomputed options for queries of an ambiguous service cluster (utils/clarification.py)
+    "PATH": None, # built by `python -m utils.clarification`, None = next to the catalog (utils/catalog.clarifications.json)
+    "MAX_OPTIONS": 5, # services sharing a phrase with more than this are left to the model, used when the artifact is built
+    "MAX_EXTRA_TOKENS": 2, # words a query may add to a multi-word shared phrase and still fall in its cluster
+    "RESOLVE_SELECTIONS": True # a follow-up naming one of the options just offered (code or name) is answered without the model
+}
+
+PAGES_CACHE = {
+    "ENABLED": True, # only used while TEMPERATURE is 0 - sampled answers are never cached
+    "MAX_ENTRIES": 10000, # in-process LRU size
+    "TTL": 3600, # seconds, both tiers
+    "SHARED": True # share answers between workers through Redis
+}
+
+PAGES_CATALOG = {
+    "PATH": "utils/catalog.json", # JSON artifact built by `python -m utils.catalog` (a services .md also works)
+    "WATCH": True, # reload in the background when the file changes
+    "CHECK_SECONDS": 5 # how often the watcher checks the file
+}
+
+PAGES_REDIS = {
+    "SESSION_TTL": 86400, # seconds a session is kept after its last turn
+    "MAX_CONNECTIONS": 50, # per worker pool size
+    "POOL_TIMEOUT": 1.0, # seconds to wait for a free pooled connection
+    "SOCKET_TIMEOUT": 0.5,
+    "SOCKET_CONNECT_TIMEOUT": 1.0,
+    "HEALTH_CHECK_INTERVAL": 30, # idle connections are PINGed before reuse after this many seconds
+    "BREAKER_FAILURES": 5, # consecutive failed/slow calls that open the circuit
+    "BREAKER_SLOW_SECONDS": 0.25, # a call slower than this counts as a failure
+    "BREAKER_RESET_SECONDS": 10 # open circuit is probed again after this many seconds
+}
+
+PAGES_BATCH = {
+    "CONCURRENCY": 16, # model calls in flight per batch
+    "MAX_ATTEMPTS": 5, # per query, on rate limits / timeouts / 5xx - without the LLM gateway, which otherwise does the retrying
+    "BACKOFF_BASE": 0.5, # seconds, doubled per attempt (full jitter)
+    "BACKOFF_MAX": 30,
+    "MAX_QUERIES": 5000 # per /query/batch request - larger logs go through the CLI
+}
+
+PAGES_METRICS = {
+    "ENABLED": True, # per-stage timers exposed at /metrics
+    "LOOP_LAG_INTERVAL": 0.1, # seconds between event loop lag probes per worker, None to turn the probe off
+    "OTEL": False # also emit OpenTelemetry spans (needs opentelemetry-api and a configured tracer provider)
+}
+
+PAGES_LOGGING = {
+    "LEVEL": "INFO",
+    "QUEUE_SIZE": 10000, # records waiting for the background writer, further records are dropped
+    "MAX_MESSAGE_CHARS": 4000, # longer messages are truncated
+    "PAYLOAD_SAMPLE_RATE": 0.01 # fraction of history / answer payload logs that are written
 }
 
 PAGES_API = {
     "HOST": "127.0.0.1",
     "PORT": 5000,
     "RELOAD":False, # use for development NOT FOR PROD!
-    "WORKERS":None, # set as int
+    "WORKERS":None, # set as int, default WEB_CONCURRENCY or the CPU count (gunicorn_conf.py)
+    "WORKER_TIMEOUT": 120, # seconds a silent worker is given before gunicorn restarts it
+    "GRACEFUL_TIMEOUT": 30, # seconds a stopping worker gets to finish requests and close its connections
+    "LAZY_CONNECTIONS": False, # open Redis / Azure OpenAI clients on the first request, not at worker start - also PAGES_LAZY_CONNECTIONS=1 (function_app.py)
+    "ADMIN_TOKEN_ENV": "PAGES_ADMIN_TOKEN", # /admin/* require x-admin-token equal to $<this>_<APP_ENV>; unset, loopback clients only
     "OUT_OF_SCOPE_ERROR_CODE":429
 }
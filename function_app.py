@@ -0,0 +1,18 @@
+"""
+Azure Functions entry point (Python v2 programming model): the FastAPI app behind an ASGI HTTP trigger.
+
+    func start
+
+An instance is created on demand, so its cold start is on the request path. Importing main stays cheap
+(the client libraries are imported on first use) and the catalog's indexes are read from the prebuilt
+artifact (`python -m utils.catalog_store`) instead of being built. Not every Functions host runs the ASGI
+lifespan at instance start, so set the PAGES_LAZY_CONNECTIONS=1 app setting: the Redis / Azure OpenAI
+clients are then opened by the first request (main.lazy_connections).
+Exercised through the ASGI trigger by tests/test_function_app.py, not yet on a Functions host.
+Benchmark: `python -m benchmarks.bench_cold_start`.
+"""
+import azure.functions as func
+
+from main import app as fastapi_app
+
+app = func.AsgiFunctionApp(app=fastapi_app, http_auth_level=func.AuthLevel.ANONYMOUS)
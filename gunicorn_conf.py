@@ -0,0 +1,77 @@
+"""
+Production server: gunicorn managing uvicorn workers, with the app preloaded in the master.
+
+    gunicorn -c gunicorn_conf.py main:app
+
+With preload_app the master imports main once, so the libraries, the services catalog, its indexes and
+the prompt prefix are built before the fork and shared copy-on-write by every worker. main defers the client
+libraries (openai, redis, numpy) for serverless cold starts; main.preload() imports them in the master too.
+gc.freeze() right before each fork moves those objects out of the collector's generations, so a worker's
+garbage collection does not write to (and copy) the shared pages. Network state is never created in the
+master: each worker opens its own Redis pool and Azure OpenAI clients in the app lifespan, and closes them
+on a graceful stop (SIGTERM, worker restart) within graceful_timeout.
+
+Metrics run in prometheus_client's multiprocess mode: every worker writes its samples to files in
+PROMETHEUS_MULTIPROC_DIR (a fresh temporary directory unless it is set) and /metrics, whichever worker
+answers it, aggregates all of them (utils/metrics.py).
+
+Bind address and worker count can be overridden with the HOST / PORT / WEB_CONCURRENCY env variables.
+"""
+import gc
+import glob
+import os
+import shutil
+import tempfile
+
+from config import PAGES_API, PAGES_METRICS
+
+# before the app (and so prometheus_client) is imported - the variable selects its multiprocess mode
+metrics_dir = None
+if PAGES_METRICS["ENABLED"] and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="pages-metrics-")
+
+bind = f"{os.getenv('HOST', PAGES_API['HOST'])}:{os.getenv('PORT', PAGES_API['PORT'])}"
+workers = PAGES_API["WORKERS"] or int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# code reload re-imports the app in every worker, which defeats (and does not work with) preloading
+reload = PAGES_API["RELOAD"]
+preload_app = not reload
+
+timeout = PAGES_API["WORKER_TIMEOUT"]
+graceful_timeout = PAGES_API["GRACEFUL_TIMEOUT"]
+keepalive = 5
+
+
+def on_starting(server):
+    # the workers split each deployment's rate budget between them (utils/llm_gateway.py) - `-w` on the
+    # command line overrides `workers` above, so the count is taken from the running config
+    os.environ["WEB_CONCURRENCY"] = str(server.cfg.workers)
+    # samples of a previous run in a reused directory would be added to this run's totals
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+            os.remove(path)
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        import main
+
+        main.preload()
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s forked, %s objects shared with the master", worker.pid, gc.get_freeze_count())
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if metrics_dir is not None:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
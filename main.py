@@ -1,24 +1,116 @@
-from fastapi import FastAPI, Body, Request, HTTPException, Depends
+from fastapi import FastAPI, Body, Request, HTTPException, Depends, BackgroundTasks
 from pydantic import BaseModel, Field, ValidationError
 from fastapi import Header
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import os
+import hmac
 import json
-from typing import List, Optional
-import uvicorn
+import orjson
+import time
+from typing import TYPE_CHECKING, List, Optional
+from contextlib import asynccontextmanager
 import logging
-from service_page_agent import AzureOpenAiClient
-from config import PAGES_API
-from utils.redis_handler import RedisSessionManager
+import asyncio
+import importlib
+from service_page_agent import AzureOpenAiClient, load_catalog_store
+from config import (PAGES_API, PAGES_BATCH, PAGES_CACHE, PAGES_CATALOG, PAGES_CONVERSATION, PAGES_METRICS,
+                    PAGES_MODEL, PAGES_REDIS)
+from utils.fast_path import FastPathStats
+from utils.response_cache import ResponseCache
+from utils.stream_parser import AnswerStreamParser
+from utils.conversation import compact_turn
+from utils.errors import GatewayOverloaded
+from utils import metrics
+from utils.logging_setup import SAMPLED, configure_logging, redact_id, stop_logging
+
+if TYPE_CHECKING:
+    from utils.redis_handler import AsyncRedisSessionManager
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
-redis_manager = RedisSessionManager()
+# the session list keeps the messages of the model's memory window, plus, with compact turns,
+# the older turns whose codes are summarized into the prompt
+SESSION_WINDOW = (PAGES_MODEL["MEMORY_K"]
+                  + (PAGES_CONVERSATION["SUMMARY_TURNS"] if PAGES_CONVERSATION["COMPACT"] else 0)) * 2
+
+# Built at import: the catalog snapshot (services, indexes, prompt prefix) is immutable and holds no
+# connections, so under `gunicorn --preload` it is loaded once in the master and shared copy-on-write
+# by the workers (see gunicorn_conf.py).
+catalog_store = load_catalog_store()
+fast_path_stats = FastPathStats()
+
+# Per-worker network state (Redis pool, HTTP clients), created by the lifespan after the fork - or, with
+# lazy connections (serverless hosts), by the first request.
+redis_manager: "AsyncRedisSessionManager" = None
+response_cache: ResponseCache = None
+chat_agent: AzureOpenAiClient = None
+
+# modules left out of the imports above because they pull in the client libraries (openai, redis, numpy)
+# that an import of main should not pay for; they are imported on first use, or by preload()
+CLIENT_MODULES = ("utils.redis_handler", "utils.llm_gateway", "utils.llm_router", "utils.batch_classify",
+                  "utils.embedding_index")
+
+
+def preload() -> None:
+    """
+    Import the client libraries and map the catalog's embedding index without opening any connection - for
+    a server that forks its workers from a preloaded app, so they share these pages (gunicorn_conf.py).
+    """
+    for module in CLIENT_MODULES:
+        importlib.import_module(module)
+    catalog_store.current.embeddings.load()
+
+
+def open_connections() -> None:
+    global redis_manager, response_cache, chat_agent
+    from utils.redis_handler import AsyncRedisSessionManager
+
+    redis_manager = AsyncRedisSessionManager()
+    response_cache = ResponseCache(
+        redis_manager=redis_manager if PAGES_CACHE["SHARED"] else None,
+        max_entries=PAGES_CACHE["MAX_ENTRIES"],
+        ttl=PAGES_CACHE["TTL"]
+    )
+    chat_agent = AzureOpenAiClient(cache=response_cache, catalog=catalog_store)
+    metrics.register_stats(response_cache, fast_path_stats, redis_manager, chat_agent.gateway, chat_agent.router)
+    logger.info("Worker %s connections opened", os.getpid())
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-    ,encoding="utf-8"
-)
-logger = logging.getLogger(__name__)
+def lazy_connections() -> bool:
+    """PAGES_API["LAZY_CONNECTIONS"], or the PAGES_LAZY_CONNECTIONS env variable a serverless host sets (function_app.py)."""
+    return PAGES_API["LAZY_CONNECTIONS"] or os.getenv("PAGES_LAZY_CONNECTIONS", "").lower() in ("1", "true", "yes")
+
+
+async def connections() -> None:
+    """App-wide dependency: opens the worker's connections on the first request when the lifespan did not."""
+    if chat_agent is None:
+        open_connections()
+
+
+async def close_connections() -> None:
+    if chat_agent is None:
+        return
+    await chat_agent.aclose()
+    await redis_manager.close_connection()
+    logger.info("Worker %s connections closed", os.getpid())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not lazy_connections():
+        open_connections()
+    if PAGES_CATALOG["WATCH"]:
+        catalog_store.start_watching()
+    loop_monitor = None
+    if PAGES_METRICS["ENABLED"] and PAGES_METRICS["LOOP_LAG_INTERVAL"]:
+        loop_monitor = asyncio.create_task(metrics.monitor_event_loop(PAGES_METRICS["LOOP_LAG_INTERVAL"]))
+    yield
+    if loop_monitor is not None:
+        loop_monitor.cancel()
+    catalog_store.stop_watching()
+    await close_connections()
+    stop_logging()
 
 
 app = FastAPI(
@@ -27,14 +119,17 @@ app = FastAPI(
                 "Usage:\n"
                 "- If the 'query' parameter is string, a text card is returned.\n"
                 "- If it contains json dictionary, a JSON card response is returned.\n"
-                "- If it contains json dictionary with 'error_message' key, an error card is returned."
+                "- If it contains json dictionary with 'error_message' key, an error card is returned.",
+    lifespan=lifespan,
+    dependencies=[Depends(connections)]
 )
 
-# ---------------------------------------------------------
-# Azure openAI API wrapper
-# ---------------------------------------------------------
-chat_agent = AzureOpenAiClient()
 
+@app.exception_handler(GatewayOverloaded)
+async def gateway_overloaded_handler(request: Request, exc: GatewayOverloaded) -> JSONResponse:
+    """A request the LLM gateway could not admit in time is shed with a 503 instead of piling up."""
+    logger.warning("Request shed by the LLM gateway: %s", exc)
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
 
 # ---------------------------------------------------------
 # Pydentic Models
@@ -93,6 +188,8 @@ class RequestHeaders(BaseModel):
     pass
 
 
+# Documents the /query response (OpenAPI). Responses are built as plain dicts by card_response and
+# serialized once with orjson instead of constructing, validating and re-serializing these models.
 class ResponseMSG(BaseModel):
     request_id: str = Field(example="1", description="Unique request identifier")
     source_system: int = Field(example=46, description="System code (46=Website, 65=Apps)")
@@ -106,114 +203,81 @@ class ResponseMSG(BaseModel):
     options_card: Optional[Options_card] = Field(default=None, description="Options list for the user")
     json_card: Optional[Json_card] = Field(default=None, description="JSON structured data")
     error_card: Optional[Error_card] = Field(default=None, description="Error structured data")
-
-    # Validators to ensure proper card setup based on card_type
-    def __init__(self, **data):
-        super().__init__(**data)
-        if self.card_type == "text":
-            if self.text_card is None:
-                self.text_card = Text_card(text="")
-            self.options_card = None
-            self.json_card = None
-            self.card_sub_type = "redirect"
-        elif self.card_type == "options":
-            if self.options_card is None:
-                self.options_card = Options_card(text="", options=[])
-            self.text_card = None
-            self.json_card = None
-            self.card_sub_type = "redirect"
-        elif self.card_type == "json":
-            if self.json_card is None:
-                self.json_card = Json_card(text="", content={}) #content=json.dumps({}))
-            self.text_card = None
-            self.options_card = None
-            self.card_sub_type = "redirect"
-        elif self.card_type == "error":
-            self.card_sub_type = "redirect"
-            if self.error_card is None:
-                self.error_card = Error_card()
-            self.text_card = None
-            self.options_card = None
-            self.json_card = None
+    catalog_version: Optional[str] = Field(default=None, example="d49ea12fbb5a48a4",
+                                           description="Version of the services catalog the answer was produced with")
 
 
 # ---------------------------------------------------------
 # Helper functions for responses
 # ---------------------------------------------------------
-def create_json_response(req: RequestMSG, model_answer: dict) -> ResponseMSG:
-    try:
+ERROR_CARD_DEFAULTS = Error_card().model_dump()
+
+
+def card_response(req: RequestMSG, card_type: str, **card) -> dict:
+    """A ResponseMSG as a plain dict, fields in model order, with only the card of `card_type` set."""
+    return {
+        "request_id": req.request_id,
+        "source_system": req.source_system,
+        "session_id": req.session_id,
+        "next_agent": "redirect",
+        "card_type": card_type,
+        "card_sub_type": "redirect",
+        "text_card": None,
+        "options_card": None,
+        "json_card": None,
+        "error_card": None,
+        "catalog_version": None,
+        **card
+    }
+
+
+def json_response(body) -> Response:
+    return Response(content=orjson.dumps(body), media_type="application/json")
+
+
+def create_json_response(req: RequestMSG, model_answer: dict) -> dict:
+    if "options" in model_answer and "clarification_question" in model_answer:
         options = model_answer["options"]
         text = model_answer["clarification_question"]
-    except:
+    else:
         options = model_answer
         text = "זה מה שמצאתי:"
-    json_card = Json_card(
-        text=text,
-        content= json.dumps(options, ensure_ascii=False)
-    )
-
-    return ResponseMSG(
-        request_id=req.request_id,
-        source_system=req.source_system,
-        session_id=req.session_id,
-        next_agent="redirect",
-        card_type="json",
-        json_card=json_card
-    )
+    return card_response(req, "json", json_card={"text": text, "content": json.dumps(options, ensure_ascii=False)})
 
 
-def create_text_response(req: RequestMSG, model_answer: str) -> ResponseMSG:
-    return ResponseMSG(
-        request_id=req.request_id,
-        source_system=req.source_system,
-        session_id=req.session_id,
-        next_agent="redirect",
-        card_type="text",
-        text_card=Text_card(text=model_answer)
-    )
+def create_text_response(req: RequestMSG, model_answer: str) -> dict:
+    return card_response(req, "text", text_card={"text": model_answer})
 
 
-def create_options_response(req: RequestMSG) -> ResponseMSG:
-    return ResponseMSG(
-        request_id=req.request_id,
-        source_system=req.source_system,
-        session_id=req.session_id,
-        next_agent="redirect",
-        card_type="options",
-        options_card=Options_card(
-            text="בחר אפשרות:",
-            options=["אפשרות א'", "אפשרות ב'", "אפשרות ג'"]
-        )
-    )
+def create_options_response(req: RequestMSG) -> dict:
+    return card_response(req, "options", options_card={
+        "text": "בחר אפשרות:",
+        "options": ["אפשרות א'", "אפשרות ב'", "אפשרות ג'"]
+    })
 
 
-def create_error_response(req: RequestMSG, model_answer: dict) -> ResponseMSG:
-    return ResponseMSG(
-        request_id=req.request_id,
-        source_system=req.source_system,
-        session_id=req.session_id,
-        next_agent="redirect",
-        card_type="error",
-        error_card=Error_card(
-            text=model_answer["error_message"],
-        )
-    )
+def create_error_response(req: RequestMSG, model_answer: dict) -> dict:
+    return card_response(req, "error", error_card={**ERROR_CARD_DEFAULTS, "text": model_answer["error_message"]})
 
 
-def check_model_response_type(res: str) -> str:
+def check_model_response_type(res: str) -> tuple:
     try:
-        parsed = json.loads(res)
-
-        if isinstance(parsed, dict) and "error_message" in parsed:
-            return "error", parsed
-        elif isinstance(parsed, dict):
-            return "dict", parsed
-        elif isinstance(parsed, list):
-            return "list", parsed
-        else:
-            return "text", parsed
-    except json.JSONDecodeError:
-        return "text", res
+        parsed = orjson.loads(res)
+    except orjson.JSONDecodeError:
+        try:
+            # streamed answers are free-form and may carry raw newlines / tabs inside their strings
+            parsed = json.loads(res, strict=False)
+        except ValueError:
+            return "text", res
+
+    if isinstance(parsed, dict) and "error_message" in parsed:
+        return "error", parsed
+    elif isinstance(parsed, dict):
+        return "dict", parsed
+    elif isinstance(parsed, list):
+        return "list", parsed
+    else:
+        return "text", parsed if isinstance(parsed, str) else res
 
     # ---------------------------------------------------------
 
@@ -233,7 +297,8 @@ async def query_endpoint(
         cust_age: int = Header(..., alias="x-cust-age", example=30, description="Customer age"),
         dr_license: str = Header(..., alias="x-dr-license", example="abcde-1245",
                                  description="personal doctor license"),
-) -> ResponseMSG:
+        background_tasks: BackgroundTasks = None,
+) -> Response:
     try:
         # Convert request to Pydantic model
         request_msg = req_body
@@ -242,35 +307,323 @@ async def query_endpoint(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid request: {str(e)}")
 
+    started = time.perf_counter()
+    query = request_msg.query
+    logger.info("Query %s session %s source %s login %s cust %s", request_msg.request_id, request_msg.session_id,
+                request_msg.source_system, redact_id(login_mask_id), redact_id(cust_mask_id))
+    # one catalog snapshot for the whole request, even if a reload swaps it meanwhile
+    catalog = catalog_store.current
+    fast_answer, source, candidates, history = None, None, [], None
+    # a pick from the options of the previous answer comes first - the other tiers only see the query - but
+    # only a query that can be a pick waits for the session before the fast path
+    if chat_agent.may_select(query, catalog):
+        history = await read_history(request_msg.session_id)
+        fast_answer, source = chat_agent.classify_selection(query, history, catalog), "selection"
+    if fast_answer is None:
+        lookup_started = time.perf_counter()
+        with metrics.stage("fast_path"):
+            fast_answer = chat_agent.classify_fast(query, catalog)
+        fast_path_stats.record_lookup(request_msg.source_system, fast_answer is not None,
+                                      time.perf_counter() - lookup_started)
+        source = "fast_path"
+    if fast_answer is None and history is None:
+        history = await read_history(request_msg.session_id)
+    if fast_answer is None:
+        with metrics.stage("embedding_search"):
+            fast_answer, candidates = chat_agent.classify_nearest(query, catalog, history)
+        source = "embeddings"
+    if fast_answer is None:
+        fast_answer = chat_agent.classify_cluster(query, catalog)
+        source = "clarification"
+    if fast_answer is not None:
+        metrics.record_request("/query", source)
+        # answered without the model - the session is updated after the response is sent
+        background_tasks.add_task(record_fast_path_turn, request_msg.session_id, query, fast_answer)
+        response = json_response(build_response(request_msg, fast_answer, catalog.version))
+        if source == "fast_path":
+            fast_path_stats.record_hit_response(request_msg.source_system, time.perf_counter() - started)
+        return response
+
+    answer, updated_history = await chat_agent.ainvoke(query, history, catalog, request_msg.source_system,
+                                                       candidates)
+    metrics.record_request("/query", "model")
+
+    logger.debug("History after: %s", updated_history)
+    logger.info("Answer: %s", answer, extra=SAMPLED)
+    with metrics.stage("redis_write"):
+        await redis_manager.append_turns(
+            request_msg.session_id, session_turn(query, answer), SESSION_WINDOW, PAGES_REDIS["SESSION_TTL"]
+        )
+
+    return json_response(build_response(request_msg, answer, catalog.version))
+
+
+async def read_history(session_id: str) -> list:
+    with metrics.stage("redis_read"):
+        history = await redis_manager.get_history(session_id, SESSION_WINDOW)
+    logger.info("History: %s", history, extra=SAMPLED)
+    return history
+
+
+def session_turn(query: str, answer: str) -> list:
+    if PAGES_CONVERSATION["COMPACT"]:
+        return compact_turn(query, answer)
+    return [
+        {"role": "user", "content": query},
+        {"role": "assistant", "content": answer}
+    ]
+
+
+async def record_fast_path_turn(session_id: str, query: str, answer: str) -> None:
+    with metrics.stage("redis_write"):
+        await redis_manager.append_turns(
+            session_id, session_turn(query, answer), SESSION_WINDOW, PAGES_REDIS["SESSION_TTL"]
+        )
+
+
+def build_response(request_msg: RequestMSG, answer: str, catalog_version: str = None) -> dict:
+    with metrics.stage("json_parse"):
+        response_type, parsed_ans = check_model_response_type(answer)
+    logger.debug("parsed_ans: %s", parsed_ans)
+
+    with metrics.stage("card_build"):
+        if response_type == "text":
+            response = create_text_response(request_msg, parsed_ans)
+        elif response_type in ("dict", "list"):
+            # a bare list is the options without a clarification question
+            response = create_json_response(request_msg, parsed_ans)
+        elif response_type == "error":
+            response = create_error_response(request_msg, parsed_ans)
+        else:
+            logger.error("Unexpected %s answer for session %s", response_type, request_msg.session_id)
+            response = card_response(request_msg, "error", error_card=dict(ERROR_CARD_DEFAULTS))
+    response["catalog_version"] = catalog_version
+    return response
+
+
+def required_headers(
+        login_mask_id: str = Header(..., alias="x-login-mask-id", example="masked-123",
+                                    description="Masked login identifier"),
+        login_gender: str = Header(..., alias="x-login-gender", example="M",
+                                   description="Gender of logged-in user (M/F/U)"),
+        cust_mask_id: str = Header(..., alias="x-cust-mask-id", example="masked-456",
+                                   description="Masked customer identifier"),
+        cust_gender: str = Header(..., alias="x-cust-gender", example="F", description="Customer gender (M/F)"),
+        cust_age: int = Header(..., alias="x-cust-age", example=30, description="Customer age"),
+        dr_license: str = Header(..., alias="x-dr-license", example="abcde-1245",
+                                 description="personal doctor license"),
+) -> RequestHeaders:
+    return RequestHeaders(
+        login_mask_id=login_mask_id,
+        login_gender=login_gender,
+        cust_mask_id=cust_mask_id,
+        cust_gender=cust_gender,
+        cust_age=cust_age,
+        dr_license=dr_license
+    )
+
+
+# ---------------------------------------------------------
+# Streaming /query/stream endpoint
+# ---------------------------------------------------------
+@app.post("/query/stream")
+async def query_stream_endpoint(
+        req_body: RequestMSG = Body(...),
+        headers: RequestHeaders = Depends(required_headers),
+) -> StreamingResponse:
+    """
+    Opt-in streaming variant of /query, as NDJSON - one event per line:
+    card_type as soon as it is known, each option as it completes, text deltas of the clarification
+    question / error / free text, and finally "response" with exactly the ResponseMSG /query would return.
+    """
+    if not PAGES_MODEL["STREAM"]:
+        raise HTTPException(status_code=404, detail="Streaming is disabled")
+    return StreamingResponse(stream_answer(req_body), media_type="application/x-ndjson")
+
+
+def ndjson_event(event: dict) -> bytes:
+    return orjson.dumps(event) + b"\n"
+
+
+async def single_delta(answer: str):
+    yield answer
+
+
+async def stream_answer(request_msg: RequestMSG):
     query = request_msg.query
-    history = redis_manager.get_session(request_msg.session_id)
-    if isinstance(history, bytes):
-        history = history.decode('utf-8')
-    logger.info(f"History: {history}")
-
-    answer, updated_history = chat_agent.invoke(query, [history])
-    response_type, parsed_ans = check_model_response_type(answer)
-    logger.info(f"parsed_ans: {parsed_ans}")
-
-    logger.info(f"History after: {updated_history}")
-    logger.info(f"Answer: {answer}")
-    if updated_history:
-        redis_manager.append_to_session(request_msg.session_id, updated_history)
+    catalog = catalog_store.current
+    fast_answer, source, candidates, history = None, None, [], None
+    if chat_agent.may_select(query, catalog):
+        history = await read_history(request_msg.session_id)
+        fast_answer, source = chat_agent.classify_selection(query, history, catalog), "selection"
+    if fast_answer is None:
+        started = time.perf_counter()
+        with metrics.stage("fast_path"):
+            fast_answer = chat_agent.classify_fast(query, catalog)
+        fast_path_stats.record_lookup(request_msg.source_system, fast_answer is not None,
+                                      time.perf_counter() - started)
+        source = "fast_path"
+    if fast_answer is None and history is None:
+        history = await read_history(request_msg.session_id)
+    if fast_answer is None:
+        with metrics.stage("embedding_search"):
+            fast_answer, candidates = chat_agent.classify_nearest(query, catalog, history)
+        source = "embeddings"
+    if fast_answer is None:
+        fast_answer = chat_agent.classify_cluster(query, catalog)
+        source = "clarification"
+    if fast_answer is not None:
+        deltas = single_delta(fast_answer)
     else:
-        redis_manager.save_session(request_msg.session_id, updated_history)
+        source = "model"
+        deltas = chat_agent.astream(query, history, catalog, request_msg.source_system, candidates)
+    metrics.record_request("/query/stream", source)
+
+    parser = AnswerStreamParser()
+    parts = []
+    try:
+        async for delta in deltas:
+            parts.append(delta)
+            for event in parser.feed(delta):
+                yield ndjson_event(event)
+    except Exception as e:
+        logger.error("Streaming failed for session %s: %s", request_msg.session_id, e)
+        yield ndjson_event({"event": "error", "detail": "failed to get an answer from the model"})
+        return
+
+    answer = "".join(parts)
+    logger.info("Answer: %s", answer, extra=SAMPLED)
+    with metrics.stage("redis_write"):
+        await redis_manager.append_turns(
+            request_msg.session_id, session_turn(query, answer), SESSION_WINDOW, PAGES_REDIS["SESSION_TTL"]
+        )
+    response = build_response(request_msg, answer, catalog.version)
+    yield ndjson_event({"event": "response", "response": response})
+
+
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+
+def admin_access(request: Request,
+                 admin_token: Optional[str] = Header(None, alias="x-admin-token",
+                                                     description="Shared admin token")) -> None:
+    """
+    Guard of the /admin endpoints and of /query/batch: the x-admin-token header must match the token
+    configured for the environment; without one configured only loopback clients are served.
+    """
+    env = os.getenv("APP_ENV", "DEV").upper()
+    expected = os.getenv(f"{PAGES_API['ADMIN_TOKEN_ENV']}_{env}")
+    if expected:
+        if admin_token is None or not hmac.compare_digest(admin_token.encode(), expected.encode()):
+            logger.warning("Rejected admin request to %s", request.url.path)
+            raise HTTPException(status_code=403, detail="Invalid admin token")
+    elif request.client is None or request.client.host not in LOOPBACK_HOSTS:
+        logger.warning("Rejected admin request to %s: no admin token configured", request.url.path)
+        raise HTTPException(status_code=403, detail="Admin endpoints are local only")
+
+
+# ---------------------------------------------------------
+# Batch /query/batch endpoint
+# ---------------------------------------------------------
+@app.post("/query/batch", dependencies=[Depends(admin_access)])
+async def query_batch_endpoint(request: Request) -> StreamingResponse:
+    """
+    Classify a JSONL body of queries ({"id", "query", "history"?, "gold"?} per line) without touching sessions.
+
+    Results are streamed back as JSONL in completion order, followed by a {"summary": ...} line with
+    throughput, p50/p95 latency and - when gold labels were sent - accuracy and per-service confusion.
+    """
+    from utils.batch_classify import parse_jsonl
+
+    try:
+        items = parse_jsonl((await request.body()).decode("utf-8").splitlines())
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch: {e}")
+    if len(items) > PAGES_BATCH["MAX_QUERIES"]:
+        raise HTTPException(status_code=413, detail=f"At most {PAGES_BATCH['MAX_QUERIES']} queries per batch")
+    logger.info("Batch of %s queries received", len(items))
+    return StreamingResponse(stream_batch(items), media_type="application/x-ndjson")
+
+
+async def stream_batch(items: list):
+    from utils.batch_classify import BatchReport, BatchRunner
+
+    report = BatchReport()
+    async for result in BatchRunner(chat_agent).run(items):
+        report.record(result)
+        metrics.record_request("/query/batch", result["source"])
+        yield ndjson_event(result)
+    summary = report.snapshot()
+    logger.info("Batch done: %s queries, %s failed, %s q/s",
+                summary["queries"], summary["failed"], summary["throughput_qps"])
+    yield ndjson_event({"summary": summary})
+
+
+@app.get("/health")
+async def health_endpoint() -> dict:
+    """Liveness plus the Redis dependency state - the service still answers (statelessly) while Redis is down."""
+    return {
+        "status": "ok",
+        "redis": {"reachable": await redis_manager.ping(), **redis_manager.breaker.snapshot()}
+    }
+
+
+@app.get("/llm/stats")
+async def llm_stats_endpoint() -> dict:
+    """LLM gateway state (concurrency cap, queue, rate budget) and the health of each Azure deployment."""
+    return {
+        "gateway": chat_agent.gateway.snapshot() if chat_agent.gateway is not None else None,
+        "router": chat_agent.router.snapshot()
+    }
+
+
+@app.get("/cache/stats")
+async def cache_stats_endpoint() -> dict:
+    """Response cache hit / miss / bypass counters."""
+    return response_cache.snapshot()
+
+
+@app.get("/fast-path/stats")
+async def fast_path_stats_endpoint() -> dict:
+    """Fast path hit rate and latency per source_system."""
+    return fast_path_stats.snapshot()
+
+
+@app.get("/metrics")
+async def metrics_endpoint() -> Response:
+    """Prometheus scrape endpoint: per-stage latency, LLM tokens/retries, cache, fast path and Redis breaker."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/catalog")
+async def catalog_endpoint() -> dict:
+    """Version and size of the services catalog this worker is serving."""
+    catalog = catalog_store.current
+    return {"version": catalog.version, "source": catalog.source, "services": len(catalog.services),
+            "loaded_at": catalog.loaded_at}
+
+
+@app.post("/admin/catalog/reload", dependencies=[Depends(admin_access)])
+async def catalog_reload_endpoint(force: bool = False) -> dict:
+    """
+    Rebuild the catalog from its file now instead of waiting for the watcher. The new snapshot is built
+    off the event loop and swapped in atomically; requests in flight finish on the snapshot they started with.
+    """
+    previous = catalog_store.current.version
+    try:
+        changed, catalog = await asyncio.to_thread(catalog_store.reload, force)
+    except Exception as e:
+        logger.error("Catalog reload failed: %s", e)
+        raise HTTPException(status_code=422, detail=f"Catalog reload failed, still serving {previous}: {e}")
+    return {"changed": changed, "previous_version": previous, "version": catalog.version,
+            "services": len(catalog.services)}
 
-    if response_type == "text":
-        response = create_text_response(request_msg, parsed_ans)
-        return response
-    elif response_type == "dict":
-        response = create_json_response(request_msg, parsed_ans)
-        return response
-    elif response_type == "error":
-        response = create_error_response(request_msg, parsed_ans)
-        return response
 
+if __name__ == "__main__":
+    # single-process development server; production runs `gunicorn -c gunicorn_conf.py main:app`
+    import uvicorn
 
-# if __name__ == "__main__":
-#     port = int(os.environ.get("PORT", 5000))
-#     uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run("main:app", host=PAGES_API["HOST"], port=int(os.environ.get("PORT", PAGES_API["PORT"])),
+                reload=PAGES_API["RELOAD"])
 
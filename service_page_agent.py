@@ -1,16 +1,106 @@
 import logging
 from dotenv import load_dotenv
-from openai import AzureOpenAI
 from collections import deque
-from config import PAGES_MODEL
+from config import (PAGES_MODEL, PAGES_FAST_PATH, PAGES_CACHE, PAGES_CATALOG, PAGES_GATEWAY, PAGES_CONVERSATION,
+                    PAGES_EMBEDDINGS, PAGES_CLARIFICATION)
+from utils.catalog_store import CatalogSnapshot, CatalogStore
+from utils.answer_schema import answer_text
+from utils.clarification import resolve_selection
+from utils.conversation import Conversation, build_conversation, estimate_tokens
+from utils.response_cache import ResponseCache
+from utils import metrics
 import os
 import json
+import time
+
+SYSTEM_INSTRUCTIONS = """You are an expert Hebrew classification algorithm specialized in identifying the correct service/s based on user input. Your task is to analyze the user’s query, along with the provided chat history and a file describing the available services, to determine the most relevant service/s. Follow these steps carefully:
+
+            1. Consider Chat History for Context:
+
+            * If the chat history contains relevant messages (e.g., follow-up questions, clarifications), use them as context to enhance your understanding of the current user input.
+
+            2. Determine If the Input + Context Is Sufficient:
+
+            * If the combined information is enough to confidently determine the correct service, **meaning there is only one service that could be relevant**, return the relevant service in the format:
+            {"code": "<service_code>", "name": "<service_name>"} 
+
+            * If the information is insufficient or ambiguous, **meaning more than one service could be relevant**, list the most relevant services options in descending order of relevance and ask a targeted clarification question. The format should be:
+            {
+            "options": [
+                {"code": "<service_code>", "name": "<service_name>"},
+                {"code": "<service_code>", "name": "<service_name>"},
+                ... (more options if needed)
+            ],
+            "clarification_question": "<specific question to refine user intent>"
+            }
+            * The clarification question must be directly related to the listed service options and the user's input. 
+
+            3. Handle Non-Relevant Queries.
+
+            * If the user input is not relevant to any of the services or to your mission to find relevant services, explain it politely in the following format:
+            {"error_message": "<your message to the user>"}
+
+            4. Handle Greetings and General Inquiries:
+
+            * If the user input is a general greeting (e.g., "How are you?", "Good morning", "Hello"), respond politely and explain your purpose.
+
+            * If the user asks what you can help with (e.g., "What can you do?", "How can you assist me?"), respond politely and explain your purpose."""
+
+IMPORTANT_NOTES = (
+    "**Important Notes:**\n"
+    "* Do not return a clarification question without listing relevant service options.\n"
+    "* Keep responses concise, structured, and informative. Avoid unnecessary explanations.\n"
+    "* Do not return the answer wrap inside: ```json...```\n"
+    "* Earlier answers in the conversation are shortened to their service codes; always answer in the full formats above."
+)
+
+# Azure OpenAI caches prompt prefixes from this length on (benchmarks/bench_prompt_tokens.py)
+MIN_CACHED_PREFIX_TOKENS = 1024
+
+
+def build_prompt_prefix(services: list) -> str:
+    """
+    The byte-identical leading message of every request, built once per catalog load.
+
+    Everything that varies per request (shortlisted services, history, the query) goes in later
+    messages, so the provider-side prompt cache can reuse this prefix across requests and sessions.
+    With TOP_K = None the whole catalog is part of the prefix; otherwise a directory of every service's code
+    and name is, which also takes the prefix past the length Azure caches (the instructions alone are not).
+    """
+    prefix = SYSTEM_INSTRUCTIONS + "\n\n" + IMPORTANT_NOTES
+    if not PAGES_MODEL["TOP_K"]:
+        prefix += "\n\n**Context Information:**\n* Available services: " + "".join(
+            service.markdown for service in services)
+    else:
+        prefix += ("\n\n**Service directory** (every service; the most relevant ones are described in the context "
+                   "information below):\n" + "\n".join(f"{service.code} - {service.name}" for service in services))
+    if estimate_tokens(prefix) < MIN_CACHED_PREFIX_TOKENS:
+        logging.getLogger(__name__).warning("Prompt prefix of about %s tokens is too short for prompt caching",
+                                            estimate_tokens(prefix))
+    return prefix
+
+
+def load_catalog_store() -> CatalogStore:
+    """
+    The services catalog with its indexes and prompt prefix. Holds no connections, so it can be built once
+    in a server's master process and shared by the forked workers.
+    """
+    return CatalogStore(PAGES_CATALOG["PATH"], build_prompt_prefix, PAGES_CATALOG["CHECK_SECONDS"])
 
 
 class AzureOpenAiClient:
-    def __init__(self) -> None:
+    def __init__(self, cache: ResponseCache = None, catalog: CatalogStore = None) -> None:
+        # The client libraries are imported with the first client, not with this module: main imports it on
+        # every (serverless) cold start, before any request needs a model call. A preloading server imports
+        # them in the master instead (main.preload).
+        import httpx
+        from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+        from utils.llm_gateway import LLMGateway, budget_buckets
+        from utils.llm_router import LLMRouter, Upstream
+
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
+        self.cache = cache
 
         load_dotenv()
 
@@ -21,135 +111,432 @@ class AzureOpenAiClient:
         self.max_retries = os.getenv(f"AZURE_OPENAI_RETRIES_{env.upper()}")
         self.api_version = os.getenv(f"AZURE_OPENAI_VERSION_{env.upper()}")
 
-        # self.logger.info(f"ENV: {env} {self.azure_endpoint}")
+        # self.logger.info("ENV: %s %s", env, self.azure_endpoint)
 
         if not all([self.api_key, self.azure_endpoint, self.max_retries, self.api_version]):
             self.logger.error("Missing API key or endpoint. Please set environment variables correctly.")
             raise ValueError("Missing API key or endpoint!")
 
-        self.client = AzureOpenAI(
-            api_key=self.api_key,
-            azure_endpoint=self.azure_endpoint,
-            max_retries=int(self.max_retries),
-            api_version=self.api_version
+        # blocking client of invoke(), created by its first call - the service only uses the async clients
+        self._client = None
+
+        # Non-blocking clients for the FastAPI path, one per deployment, over a single pooled HTTP client
+        # so connections (and TLS sessions) to Azure are reused by all in-flight requests.
+        # Retries belong to the router (failover) and the gateway (429 pause); SDK retries against the same
+        # endpoint are only kept for a lone deployment without the gateway.
+        deployments = self._deployments(env)
+        sdk_retries = int(self.max_retries) if not PAGES_GATEWAY["ENABLED"] and len(deployments) == 1 else 0
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=PAGES_MODEL["MAX_CONNECTIONS"],
+                max_keepalive_connections=PAGES_MODEL["MAX_KEEPALIVE_CONNECTIONS"]
+            ),
+            # every HTTP attempt (SDK retries included) is counted for the retry metrics
+            event_hooks={"request": [metrics.acount_llm_attempt]}
         )
+        self.router = LLMRouter([
+            Upstream(
+                deployment["name"],
+                AsyncAzureOpenAI(
+                    api_key=deployment["api_key"],
+                    azure_endpoint=deployment["endpoint"],
+                    max_retries=sdk_retries,
+                    api_version=deployment["api_version"],
+                    timeout=PAGES_MODEL["TIMEOUT"],
+                    http_client=http_client
+                ),
+                deployment["model"],
+                # the gateway's rate budget, per deployment - its own "rpm" / "tpm" or the PAGES_GATEWAY quota
+                budget_buckets(deployment.get("rpm"), deployment.get("tpm")) if PAGES_GATEWAY["ENABLED"]
+                else (None, None)
+            )
+            for deployment in deployments
+        ])
+        self.gateway = LLMGateway(budget=self.router) if PAGES_GATEWAY["ENABLED"] else None
+        self.async_client = self.router.upstreams[0].client
 
         self.logger.info("AzureOpenAiClient initialized with API key and endpoint.")
-        self._load_services_info()
+        self._load_services_info(catalog)
+
+    def _deployments(self, env: str) -> list:
+        """The primary deployment (AZURE_OPENAI_* variables), then those listed in AZURE_OPENAI_DEPLOYMENTS_<ENV>."""
+        primary = {"name": "primary", "endpoint": self.azure_endpoint, "api_key": self.api_key,
+                   "api_version": self.api_version, "model": PAGES_MODEL["MODEL"]}
+        deployments = [primary]
+        listed = os.getenv(f"AZURE_OPENAI_DEPLOYMENTS_{env}")
+        if listed:
+            try:
+                extra = json.loads(listed)
+            except json.JSONDecodeError as e:
+                self.logger.error("AZURE_OPENAI_DEPLOYMENTS_%s is not valid JSON: %s", env, e)
+                raise ValueError(f"Invalid AZURE_OPENAI_DEPLOYMENTS_{env}")
+            for number, deployment in enumerate(extra, start=2):
+                deployments.append({**primary, "name": f"deployment-{number}", **deployment})
+        self.logger.info("Azure OpenAI deployments: %s", [deployment["name"] for deployment in deployments])
+        return deployments
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import AzureOpenAI, DefaultHttpxClient
+
+            self._client = AzureOpenAI(
+                api_key=self.api_key,
+                azure_endpoint=self.azure_endpoint,
+                max_retries=int(self.max_retries),
+                api_version=self.api_version,
+                timeout=PAGES_MODEL["TIMEOUT"],
+                http_client=DefaultHttpxClient(event_hooks={"request": [metrics.count_llm_attempt]})
+            )
+        return self._client
+
+    @property
+    def catalog_version(self) -> str:
+        return self.catalog.current.version
+
+    def invoke(self, user_input: str, history: list = None, catalog: CatalogSnapshot = None,
+               candidates: list = None) -> tuple:
+        catalog = catalog or self.catalog.current
+        cache_key = self._cache_key(user_input, history, catalog)
+        if cache_key is not None:
+            with metrics.stage("cache_lookup"):
+                cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.logger.info("Answer served from response cache.")
+                return cached, self.update_history(user_input, history, cached)
+            self.cache.record_miss()
+
+        with metrics.stage("prompt_build"):
+            messages = self._construct_prompt(user_input, history, catalog, candidates)
+        self.logger.debug("Prompt constructed with messages: %s", messages)
+
+        try:
+            with metrics.stage("llm_call"), metrics.llm_call():
+                response = self.client.chat.completions.create(**self._completion_params(messages, catalog))
+            self.logger.info("Received response from Azure OpenAI.")
+            metrics.record_usage(response.usage)
+        except Exception as e:
+            self.logger.error("Error while getting response from Azure OpenAI: %s", e)
+            self.logger.error("Error details: %s", e.args)
+            raise
 
-    def invoke(self, user_input: str, history: list = []) -> tuple:
-        messages = self._construct_prompt(user_input, history)
-        self.logger.debug(f"Prompt constructed with messages: {messages}")
+        response_content, history = self._handle_response(user_input, history, response, catalog)
+        if cache_key is not None:
+            self.cache.put(cache_key, response_content)
+        return response_content, history
+
+    async def ainvoke(self, user_input: str, history: list = None, catalog: CatalogSnapshot = None,
+                      source_system: int = None, candidates: list = None) -> tuple:
+        """
+        Async counterpart of invoke - awaits the model call instead of blocking the event loop.
+
+        `catalog` pins the snapshot the caller resolved for this request; by default the current one is used.
+        `source_system` sets the call's priority in the gateway queue. `candidates` are the embedding index's
+        (code, similarity) pairs of an ambiguous match (see classify_nearest).
+        """
+        catalog = catalog or self.catalog.current
+        cache_key = self._cache_key(user_input, history, catalog)
+        if cache_key is not None:
+            with metrics.stage("cache_lookup"):
+                cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                self.logger.info("Answer served from response cache.")
+                return cached, self.update_history(user_input, history, cached)
+
+        with metrics.stage("prompt_build"):
+            messages = self._construct_prompt(user_input, history, catalog, candidates)
+        self.logger.debug("Prompt constructed with messages: %s", messages)
 
         try:
-            response = self.client.chat.completions.create(
-                messages=messages,
-                model=PAGES_MODEL['MODEL'],
-                max_tokens=PAGES_MODEL['MAX_TOKENS'],
-                temperature=PAGES_MODEL['TEMPERATURE'],
-                top_p=PAGES_MODEL['TOP_P'],
-                stream=PAGES_MODEL['STREAM'],
-                seed = PAGES_MODEL['SEED']
-            )
+            with metrics.stage("llm_call"), metrics.llm_call():
+                response = await self._acreate(self._completion_params(messages, catalog), source_system)
             self.logger.info("Received response from Azure OpenAI.")
         except Exception as e:
-            self.logger.error(f"Error while getting response from Azure OpenAI: {e}")
-            self.logger.error(f"Error details: {e.args}")
+            self.logger.error("Error while getting response from Azure OpenAI: %s", e)
+            self.logger.error("Error details: %s", e.args)
             raise
 
-        self.logger.debug(f"Response: {response}")
+        response_content, history = self._handle_response(user_input, history, response, catalog)
+        if cache_key is not None:
+            await self.cache.aput(cache_key, response_content)
+        return response_content, history
+
+    async def astream(self, user_input: str, history: list = None, catalog: CatalogSnapshot = None,
+                      source_system: int = None, candidates: list = None):
+        """
+        Async generator of answer text deltas as the model produces them.
+
+        A cached answer is yielded as a single delta. The caller assembles the full answer and stores the turn.
+        """
+        catalog = catalog or self.catalog.current
+        cache_key = self._cache_key(user_input, history, catalog)
+        if cache_key is not None:
+            with metrics.stage("cache_lookup"):
+                cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                self.logger.info("Answer served from response cache.")
+                yield cached
+                return
+
+        with metrics.stage("prompt_build"):
+            messages = self._construct_prompt(user_input, history, catalog, candidates)
+        self.logger.debug("Prompt constructed with messages: %s", messages)
 
-        response_content = response.choices[0].message.content
-        self.logger.debug(f"Response content: {response_content}")
+        try:
+            with metrics.stage("llm_call"), metrics.llm_call():
+                stream = await self._acreate(self._completion_params(messages, catalog, stream=True), source_system)
+        except Exception as e:
+            self.logger.error("Error while getting response from Azure OpenAI: %s", e)
+            self.logger.error("Error details: %s", e.args)
+            raise
 
+        parts = []
+        started = time.perf_counter()
+        async for chunk in stream:
+            # Azure sends a leading chunk with prompt filter results and no choices
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        metrics.observe_stage("llm_stream", time.perf_counter() - started)
+        self.logger.info("Received streamed response from Azure OpenAI.")
+
+        if cache_key is not None:
+            await self.cache.aput(cache_key, "".join(parts))
+
+    async def _acreate(self, params: dict, source_system: int = None):
+        if self.gateway is not None:
+            return await self.gateway.complete(self.router.create, params, source_system)
+        response = await self.router.create(**params)
+        if not params.get("stream"):
+            metrics.record_usage(response.usage)
+        return response
+
+    async def aclose(self) -> None:
+        try:
+            for upstream in self.router.upstreams:
+                await upstream.client.close()
+            if self._client is not None:
+                self._client.close()
+            self.logger.info("Azure OpenAI clients closed")
+        except Exception as e:
+            self.logger.error("Error closing Azure OpenAI clients: %s", e)
+
+    def _cache_key(self, user_input: str, history: list, catalog: CatalogSnapshot):
+        """Response cache key for this turn, or None when the cache is off or answers are not deterministic."""
+        if self.cache is None:
+            return None
+        if not PAGES_CACHE["ENABLED"] or PAGES_MODEL["TEMPERATURE"] > 0:
+            self.cache.record_bypass()
+            return None
+        return self.cache.make_key(user_input, self.conversation(history).prompt_messages(), catalog.version)
+
+    def _completion_params(self, messages: list, catalog: CatalogSnapshot, stream: bool = False) -> dict:
+        params = dict(
+            messages=messages,
+            model=PAGES_MODEL['MODEL'],
+            max_tokens=PAGES_MODEL['MAX_TOKENS'],
+            temperature=PAGES_MODEL['TEMPERATURE'],
+            top_p=PAGES_MODEL['TOP_P'],
+            stream=stream,
+            seed=PAGES_MODEL['SEED']
+        )
+        # streams stay free-form: their incremental parser previews the answer's own top-level keys
+        if PAGES_MODEL["STRUCTURED_OUTPUT"] and not stream:
+            params["response_format"] = catalog.response_format
+        return params
+
+    def _handle_response(self, user_input: str, history: list, response, catalog: CatalogSnapshot) -> tuple:
+        self.logger.debug("Response: %s", response)
+
+        response_content = answer_text(response.choices[0].message.content, catalog.services_by_code)
+        self.logger.debug("Response content: %s", response_content)
+
+        return response_content, self.update_history(user_input, history, response_content)
+
+    def update_history(self, user_input: str, history: list, response_content: str) -> list:
         if history is None:
             history = []
         elif isinstance(history, str):
             history = [history]
+        else:
+            history = list(history)
 
-        self.logger.info(f"response_content: {response_content}")
+        self.logger.debug("response_content: %s", response_content)
 
         history.extend([
             {"role": "user", "content": user_input},
             {"role": "assistant", "content": response_content}
         ])
-        self.logger.info(f"History: {history}")
-        self.logger.debug(f"Updated history length: {len(history)}")
+        self.logger.debug("History: %s", history)
+        self.logger.debug("Updated history length: %s", len(history))
 
         history = self.memory_window(history)
 
-        self.logger.info("Memory window updated.")
-        return response_content, history
-
-    def _load_services_info(self) -> None:
+        self.logger.debug("Memory window updated.")
+        return history
+
+    def classify_fast(self, user_input: str, catalog: CatalogSnapshot = None):
+        """
+        Answer from the precomputed catalog lookup without calling the model.
+
+        Returns the same {"code", "name"} JSON the model would produce for a single confident service,
+        or None when the query is not a (near) exact match of exactly one service.
+        """
+        if not PAGES_FAST_PATH["ENABLED"]:
+            return None
+        match = (catalog or self.catalog.current).fast_path.match(user_input)
+        if match is None:
+            return None
+        service, score = match
+        self.logger.info("Fast path hit: %s (score %.2f)", service.code, score)
+        return json.dumps({"code": service.code, "name": service.name}, ensure_ascii=False)
+
+    def classify_nearest(self, user_input: str, catalog: CatalogSnapshot = None, history: list = None) -> tuple:
+        """
+        Nearest-neighbour lookup of the catalog's phrases in the embedding index: (answer, candidates).
+
+        A decisive match is answered like the fast path, with the {"code", "name"} JSON and no candidates -
+        unless `history` has turns: the index only sees the query, and a follow-up is read with the turns before
+        it, so its match goes to the model as a candidate instead.
+        Otherwise the answer is None and candidates are the top PAGES_EMBEDDINGS["CANDIDATES"] (code, similarity)
+        pairs for the model's prompt - empty when the index is off or unavailable, or its best match is weaker
+        than MIN_SCORE.
+        """
+        if not PAGES_EMBEDDINGS["ENABLED"]:
+            return None, []
+        catalog = catalog or self.catalog.current
+        candidates = catalog.embeddings.search(user_input, PAGES_EMBEDDINGS["CANDIDATES"])
+        if catalog.embeddings.decisive(candidates) and not self._history_messages(history):
+            code, score = candidates[0]
+            service = catalog.services_by_code[code]
+            self.logger.info("Embedding index hit: %s (score %.2f)", code, score)
+            return json.dumps({"code": service.code, "name": service.name}, ensure_ascii=False), []
+        if not candidates or candidates[0][1] < PAGES_EMBEDDINGS["MIN_SCORE"]:
+            return None, []
+        return None, candidates
+
+    def classify_cluster(self, user_input: str, catalog: CatalogSnapshot = None):
+        """
+        The precomputed {"options", "clarification_question"} JSON of the ambiguous service cluster the query
+        falls into (utils/clarification.py), or None.
+        """
+        if not PAGES_CLARIFICATION["ENABLED"]:
+            return None
+        answer = (catalog or self.catalog.current).clarifications.match(user_input)
+        if answer is not None:
+            self.logger.info("Precomputed clarification served.")
+        return answer
+
+    def may_select(self, user_input: str, catalog: CatalogSnapshot = None) -> bool:
+        """Whether classify_selection could answer `user_input` with some session - checked before reading it."""
+        if not PAGES_CLARIFICATION["RESOLVE_SELECTIONS"]:
+            return False
+        return (catalog or self.catalog.current).clarifications.may_select(user_input)
+
+    def classify_selection(self, user_input: str, history: list, catalog: CatalogSnapshot = None):
+        """
+        The {"code", "name"} JSON of the option the user picked (by code or name) from the options of the
+        previous answer in `history`, or None - resolved from the session, without the model.
+        """
+        if not PAGES_CLARIFICATION["RESOLVE_SELECTIONS"]:
+            return None
+        catalog = catalog or self.catalog.current
+        service = resolve_selection(user_input, self._history_messages(history), catalog.services_by_code)
+        if service is None:
+            return None
+        self.logger.info("Selection resolved from the session: %s", service.code)
+        return json.dumps({"code": service.code, "name": service.name}, ensure_ascii=False)
+
+    def _load_services_info(self, catalog: CatalogStore = None) -> None:
         try:
-            with open(PAGES_MODEL["FILE_PATH"], 'r', encoding='utf-8') as file:
-                self.file = file.read()
-            self.logger.info("Services file loaded successfully.")
+            self.catalog = catalog or load_catalog_store()
+            self.logger.info("Services catalog %s loaded successfully.", self.catalog.current.version)
         except Exception as e:
-            self.logger.error(f"Error loading services file: {e}")
+            self.logger.error("Error loading services catalog: %s", e)
             raise
+        self.catalog.add_listener(self._on_catalog_change)
+
+    def _on_catalog_change(self, previous: CatalogSnapshot, current: CatalogSnapshot) -> None:
+        # shared-tier keys embed the version, only the local tier needs dropping
+        if self.cache is not None:
+            self.cache.clear()
+            self.logger.info("Services catalog changed (%s -> %s), response cache cleared.",
+                             previous.version, current.version)
+
+    def _history_messages(self, history) -> list:
+        """Flatten the (possibly nested) session history into its role/content messages."""
+        if isinstance(history, dict):
+            return [history] if "role" in history else []
+        if isinstance(history, list):
+            return [message for item in history for message in self._history_messages(item)]
+        return []
+
+    def _shortlist_services(self, user_input: str, conversation: Conversation, catalog: CatalogSnapshot,
+                            candidates: list = None):
+        """
+        Markdown of the services relevant to this turn instead of the whole catalog
+        (None when TOP_K is off and the catalog is already part of the prompt prefix).
+
+        Services already offered in the conversation are kept first so follow-up answers can be resolved,
+        the rest is filled with the embedding index's candidates when there are any, otherwise with the top
+        PAGES_MODEL["TOP_K"] retrieval hits for the user's recent messages.
+        With compact conversations at most HISTORY_SERVICES offered services are kept (the most recent),
+        and the markdown is held to SHORTLIST_TOKENS by dropping the lowest ranked services.
+        """
+        if not PAGES_MODEL["TOP_K"]:
+            return None
+
+        query = " ".join([m["content"] for m in conversation.messages if m["role"] == "user"] + [user_input])
+        codes = [code for code in conversation.codes if code in catalog.services_by_code]
+        budget = None
+        if PAGES_CONVERSATION["COMPACT"]:
+            codes = codes[:PAGES_CONVERSATION["HISTORY_SERVICES"]]
+            budget = PAGES_CONVERSATION["SHORTLIST_TOKENS"]
+        if candidates:
+            codes.extend(code for code, _ in candidates)
+        else:
+            codes.extend(service.code for service, _ in catalog.retriever.search(query, PAGES_MODEL["TOP_K"]))
+
+        shortlist = []
+        for code in dict.fromkeys(codes):
+            service = catalog.services_by_code[code]
+            if budget is not None:
+                budget -= estimate_tokens(service.markdown)
+                if budget < 0 and shortlist:
+                    break
+            shortlist.append(service)
+        self.logger.debug("Shortlisted services: %s", [service.code for service in shortlist])
+        return "".join(service.markdown for service in shortlist)
 
     def memory_window(self, history: list) -> list:
         hist = deque(history, maxlen=(PAGES_MODEL["MEMORY_K"] * 2))
         return list(hist)
 
-    def _construct_prompt(self, user_input: str, history: list) -> list:
-        system_message = (
-            """You are an expert Hebrew classification algorithm specialized in identifying the correct service/s based on user input. Your task is to analyze the user’s query, along with the provided chat history and a file describing the available services, to determine the most relevant service/s. Follow these steps carefully:
-
-            1. Consider Chat History for Context:
-
-            * If the chat history contains relevant messages (e.g., follow-up questions, clarifications), use them as context to enhance your understanding of the current user input.
-
-            2. Determine If the Input + Context Is Sufficient:
-
-            * If the combined information is enough to confidently determine the correct service, **meaning there is only one service that could be relevant**, return the relevant service in the format:
-            {"code": "<service_code>", "name": "<service_name>"} 
-
-            * If the information is insufficient or ambiguous, **meaning more than one service could be relevant**, list the most relevant services options in descending order of relevance and ask a targeted clarification question. The format should be:
-            {
-            "options": [
-                {"code": "<service_code>", "name": "<service_name>"},
-                {"code": "<service_code>", "name": "<service_name>"},
-                ... (more options if needed)
-            ],
-            "clarification_question": "<specific question to refine user intent>"
-            }
-            * The clarification question must be directly related to the listed service options and the user's input. 
-
-            3. Handle Non-Relevant Queries.
-
-            * If the user input is not relevant to any of the services or to your mission to find relevant services, explain it politely in the following format:
-            {"error_message": "<your message to the user>"}
-
-            4. Handle Greetings and General Inquiries:
-
-            * If the user input is a general greeting (e.g., "How are you?", "Good morning", "Hello"), respond politely and explain your purpose.
-
-            * If the user asks what you can help with (e.g., "What can you do?", "How can you assist me?"), respond politely and explain your purpose.
-
-
-            **Context Information:**\n"""
-            f"* Available services: {self.file}"
-            f"* Chat history: {history}"
-
-            "**Important Notes:**"
-
-            "* Do not return a clarification question without listing relevant service options."
-            "* Keep responses concise, structured, and informative. Avoid unnecessary explanations."
-            "* Do not return the answer wrap inside: ```json...```"
-        )
-
-        self.logger.debug(f"Constructing system message.")
-
-        return [
-            {
-                "role": "developer",
-                "content": system_message
-            },
-            {
-                "role": "user",
-                "content": user_input
-            }
-        ]
\ No newline at end of file
+    def conversation(self, history) -> Conversation:
+        """The session history as it goes into the prompt - compacted and budgeted, or the plain memory window."""
+        messages = self._history_messages(history)
+        if PAGES_CONVERSATION["COMPACT"]:
+            return build_conversation(messages, PAGES_MODEL["MEMORY_K"] * 2)
+        return Conversation([
+            {"role": message["role"], "content": str(message["content"])}
+            for message in self.memory_window(messages)
+            if message["role"] in ("user", "assistant")
+        ], [])
+
+    def _construct_prompt(self, user_input: str, history: list, catalog: CatalogSnapshot = None,
+                          candidates: list = None) -> list:
+        catalog = catalog or self.catalog.current
+        conversation = self.conversation(history)
+        messages = [{"role": "developer", "content": catalog.prompt_prefix}]
+        messages.extend(conversation.prompt_messages())
+        services = self._shortlist_services(user_input, conversation, catalog, candidates)
+        if services is not None:
+            context = f"**Context Information:**\n* Available services: {services}"
+            if candidates:
+                context += "\n* Closest services to the user input by example questions (similarity): " + ", ".join(
+                    f"{code} ({score:.2f})" for code, score in candidates)
+            messages.append({"role": "developer", "content": context})
+        messages.append({"role": "user", "content": user_input})
+
+        self.logger.debug("Constructing system message.")
+        return messages
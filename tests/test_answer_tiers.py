@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+HISTORY = [{"role": "user", "content": "אני רוצה טופס 17"},
+           {"role": "assistant", "content": '{"code": "101", "name": "ההתחייבויות שלי"}'}]
+
+
+@pytest.fixture(scope="module")
+def agent():
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in (("APP_ENV", "TEST"), ("AZURE_OPENAI_API_KEY_TEST", "test-key"),
+                            ("AZURE_OPENAI_ENDPOINT_TEST", "http://127.0.0.1:9"),
+                            ("AZURE_OPENAI_RETRIES_TEST", "0"), ("AZURE_OPENAI_VERSION_TEST", "2024-10-21")):
+            patch.setenv(name, value)
+        from service_page_agent import AzureOpenAiClient
+
+        yield AzureOpenAiClient()
+
+
+def test_nearest_answers_a_new_conversation(agent):
+    answer, candidates = agent.classify_nearest("אני רוצה להגיש בקשה להתחייבות עכשיו", history=[])
+    assert json.loads(answer)["code"] == "101"
+    assert candidates == []
+
+
+def test_nearest_leaves_a_follow_up_to_the_model(agent):
+    answer, candidates = agent.classify_nearest("אני רוצה להגיש בקשה להתחייבות עכשיו", history=HISTORY)
+    assert answer is None
+    assert candidates[0][0] == "101"
+
+
+def options_turn(agent, codes: list) -> list:
+    services = agent.catalog.current.services_by_code
+    answer = {"options": [{"code": code, "name": services[code].name} for code in codes],
+              "clarification_question": "לאיזה מהם התכוונת?"}
+    return [{"role": "user", "content": "פסיכולוג"},
+            {"role": "assistant", "content": json.dumps(answer, ensure_ascii=False)}]
+
+
+def test_pick_by_name_after_clarification(agent):
+    history = options_turn(agent, ["207", "263"])
+    # the fast path alone takes the fragment for another service
+    assert json.loads(agent.classify_fast("בריאות הנפש"))["code"] == "207"
+    assert json.loads(agent.classify_selection("בריאות הנפש", history))["code"] == "263"
+    assert json.loads(agent.classify_selection("מוקד בריאות הנפש", history))["code"] == "263"
+
+
+def test_pick_by_code_after_clarification(agent):
+    history = options_turn(agent, ["207", "263"])
+    assert json.loads(agent.classify_selection("207", history))["code"] == "207"
+    assert json.loads(agent.classify_selection("אפשרות 263 בבקשה", history))["code"] == "263"
+
+
+def test_new_query_mentioning_an_option_is_not_a_pick(agent):
+    history = options_turn(agent, ["207", "263"])
+    assert agent.classify_selection("איך מתקשרים למוקד בריאות הנפש בלילה", history) is None
+    assert agent.classify_selection("מוקד בריאות הנפש בבקשה", history) is None
+
+
+def test_no_selection_without_options(agent):
+    assert agent.classify_selection("בריאות הנפש", HISTORY) is None
+    assert agent.classify_selection("בריאות הנפש", []) is None
@@ -0,0 +1,142 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from utils.batch_classify import BatchReport, BatchRunner
+from utils.errors import GatewayOverloaded
+
+
+class FakeAgent:
+    """Answers every query from the "fast path", after `delay` seconds; `failing` queries raise."""
+
+    def __init__(self, delay: float = 0.0, failing: tuple = ()) -> None:
+        self.catalog = SimpleNamespace(current=SimpleNamespace(version="test"))
+        self.delay = delay
+        self.failing = failing
+
+    def classify_fast(self, query, catalog):
+        if query in self.failing:
+            raise RuntimeError(f"broken {query}")
+        return json.dumps({"code": query, "name": query})
+
+    def classify_nearest(self, query, catalog, history=None):
+        return None, []
+
+    def classify_cluster(self, query, catalog):
+        return None
+
+    def classify_selection(self, query, history, catalog):
+        return None
+
+    async def ainvoke(self, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        return json.dumps({"code": "model", "name": "model"}), []
+
+
+async def collect(runner: BatchRunner, items: list, consumer_delay: float = 0.0) -> list:
+    results = []
+    async for result in runner.run(items):
+        results.append(result)
+        await asyncio.sleep(consumer_delay)
+    return results
+
+
+def test_slow_consumer_gets_every_result():
+    items = [{"id": i, "query": str(i)} for i in range(20)]
+    runner = BatchRunner(FakeAgent(), concurrency=2)
+    results = asyncio.run(asyncio.wait_for(collect(runner, items, consumer_delay=0.01), timeout=5))
+    assert sorted(result["id"] for result in results) == list(range(20))
+
+
+def test_fast_consumer_gets_every_result():
+    items = [{"id": i, "query": str(i)} for i in range(50)]
+    runner = BatchRunner(FakeAgent(), concurrency=8)
+    results = asyncio.run(asyncio.wait_for(collect(runner, items), timeout=5))
+    assert sorted(result["id"] for result in results) == list(range(50))
+
+
+def test_empty_batch():
+    assert asyncio.run(collect(BatchRunner(FakeAgent()), [])) == []
+
+
+def test_worker_error_is_raised_to_the_consumer():
+    items = [{"id": i, "query": str(i)} for i in range(10)]
+    runner = BatchRunner(FakeAgent(failing=("7",)), concurrency=1)
+    seen = []
+
+    async def consume():
+        async for result in runner.run(items):
+            seen.append(result["id"])
+
+    with pytest.raises(RuntimeError, match="broken 7"):
+        asyncio.run(asyncio.wait_for(consume(), timeout=5))
+    assert seen == list(range(7))
+
+
+def test_p95_is_the_nearest_rank():
+    report = BatchReport()
+    for latency in range(1, 11):
+        report.record({"latency_ms": float(latency), "source": "fast_path"})
+    assert report.snapshot()["p95_ms"] == 10.0
+    report = BatchReport()
+    for latency in range(1, 101):
+        report.record({"latency_ms": float(latency), "source": "fast_path"})
+    assert report.snapshot()["p95_ms"] == 95.0
+
+
+def test_selection_after_clarification_comes_first():
+    class PickingAgent(FakeAgent):
+        """The fast path also matches the pick - as a fragment of an option's name can."""
+
+        def classify_selection(self, query, history, catalog):
+            return json.dumps({"code": "263", "name": query}) if history else None
+
+    history = [{"role": "assistant", "content": '{"options": [{"code": "207"}, {"code": "263"}]}'}]
+    items = [{"id": 1, "query": "בריאות הנפש", "history": history}, {"id": 2, "query": "בריאות הנפש"}]
+    results = asyncio.run(collect(BatchRunner(PickingAgent()), items))
+    by_id = {result["id"]: result for result in results}
+    assert by_id[1]["source"] == "selection"
+    assert json.loads(by_id[1]["answer"])["code"] == "263"
+    assert by_id[2]["source"] == "fast_path"
+
+
+class ErrorAgent(FakeAgent):
+    """Every query goes to the model, which raises `error`."""
+
+    def __init__(self, error: Exception, gateway=None) -> None:
+        super().__init__()
+        self.error = error
+        self.gateway = gateway
+        self.calls = 0
+
+    def classify_fast(self, query, catalog):
+        return None
+
+    async def ainvoke(self, *args, **kwargs):
+        self.calls += 1
+        raise self.error
+
+
+def timeout_error():
+    return openai.APITimeoutError(request=httpx.Request("POST", "http://127.0.0.1:9"))
+
+
+def test_retries_without_the_gateway():
+    agent = ErrorAgent(timeout_error())
+    runner = BatchRunner(agent, max_attempts=3, backoff_base=0, backoff_max=0)
+    [result] = asyncio.run(collect(runner, [{"id": 1, "query": "q"}]))
+    assert agent.calls == 3
+    assert result["attempts"] == 3 and result["label"] == "failed"
+
+
+@pytest.mark.parametrize("error", [GatewayOverloaded("no slot"), timeout_error()])
+def test_no_retries_on_top_of_the_gateway(error):
+    agent = ErrorAgent(error, gateway=object())
+    runner = BatchRunner(agent, max_attempts=5, backoff_base=0, backoff_max=0)
+    [result] = asyncio.run(collect(runner, [{"id": 1, "query": "q"}]))
+    assert agent.calls == 1
+    assert result["attempts"] == 1 and result["error"].startswith(type(error).__name__)
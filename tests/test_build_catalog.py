@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from utils.build_catalog import build_catalog
+
+
+def test_rebuild_of_the_same_workbook_writes_nothing(tmp_path):
+    outputs = {"markdown": str(tmp_path / "output.md"), "json_path": str(tmp_path / "catalog.json")}
+    first = build_catalog("utils/services.xlsx", **outputs, index=True, clarifications=True)
+    assert len(first["written"]) == 4
+    modified = {name: os.stat(tmp_path / name).st_mtime_ns for name in os.listdir(tmp_path)}
+
+    second = build_catalog("utils/services.xlsx", **outputs, index=True, clarifications=True)
+    assert second["written"] == []
+    assert {name: os.stat(tmp_path / name).st_mtime_ns for name in os.listdir(tmp_path)} == modified
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    def replace(source, target):
+        raise PermissionError(target)
+
+    monkeypatch.setattr(os, "replace", replace)
+    with pytest.raises(PermissionError):
+        build_catalog("utils/services.xlsx", markdown=str(tmp_path / "output.md"))
+    assert os.listdir(tmp_path) == []
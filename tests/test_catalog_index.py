@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from utils.catalog import load_catalog
+from utils.catalog_store import build_indexes, read_catalog_index, write_catalog_index
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return load_catalog("utils/catalog.json")
+
+
+def test_prebuilt_index_answers_like_a_built_one(catalog, tmp_path):
+    version, services = catalog
+    path = tmp_path / "catalog.index.json"
+    write_catalog_index(services, str(path), version)
+    retriever, fast_path = read_catalog_index(str(path), version, services)
+    built_retriever, built_fast_path = build_indexes(services)
+
+    for service in services:
+        for query in (service.name, *service.keywords, *service.examples[:2], service.name + " עכשיו"):
+            assert ([(page.code, round(score, 9)) for page, score in retriever.search(query, 10)]
+                    == [(page.code, round(score, 9)) for page, score in built_retriever.search(query, 10)])
+            match, built = fast_path.match(query), built_fast_path.match(query)
+            assert (match and (match[0].code, round(match[1], 9))) == (built and (built[0].code, round(built[1], 9)))
+    # the pages come from the catalog, not from the artifact
+    assert retriever.pages[0] is services[0]
+
+
+def test_prebuilt_index_is_data_only(catalog, tmp_path):
+    version, services = catalog
+    path = tmp_path / "catalog.index.json"
+    write_catalog_index(services, str(path), version)
+    index = json.loads(path.read_text(encoding="utf-8"))
+    assert set(index) == {"format", "catalog_version", "codes", "retriever", "fast_path"}
+    assert services[0].markdown not in path.read_text(encoding="utf-8")
+
+
+def test_index_of_another_version_is_refused(catalog, tmp_path):
+    version, services = catalog
+    path = tmp_path / "catalog.index.json"
+    write_catalog_index(services, str(path), version)
+    with pytest.raises(ValueError):
+        read_catalog_index(str(path), "other", services)
+    with pytest.raises(ValueError):
+        read_catalog_index(str(path), version, list(reversed(services)))
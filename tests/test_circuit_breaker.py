@@ -0,0 +1,81 @@
+from utils import circuit_breaker
+from utils.circuit_breaker import CircuitBreaker
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def open_breaker(monkeypatch) -> tuple:
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    breaker = CircuitBreaker(failure_threshold=2, slow_call_seconds=0.25, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker, clock
+
+
+def test_opens_after_consecutive_failures(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_half_open_admits_a_single_probe(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert [breaker.allow() for _ in range(5)] == [False] * 5
+
+
+def test_successful_probe_closes(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_success(0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert all(breaker.allow() for _ in range(5))
+
+
+def test_call_from_before_the_opening_does_not_close(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    breaker.record_success(0.01)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock.now += 10
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock.now += 10
+    assert breaker.allow()
+
+
+def test_slow_probe_counts_as_failure(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_success(1.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_lost_probe_is_replaced_after_the_reset_timeout(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    clock.now += 10
+    assert breaker.allow()
+    clock.now += 5
+    assert not breaker.allow()
+    clock.now += 5
+    assert breaker.allow()
@@ -0,0 +1,44 @@
+import asyncio
+import importlib
+import json
+
+import pytest
+
+func = pytest.importorskip("azure.functions")
+
+ENV = {"APP_ENV": "TEST", "AZURE_OPENAI_API_KEY_TEST": "test-key", "AZURE_OPENAI_ENDPOINT_TEST": "http://127.0.0.1:9",
+       "AZURE_OPENAI_RETRIES_TEST": "0", "AZURE_OPENAI_VERSION_TEST": "2024-10-21", "REDIS_HOST_TEST": "127.0.0.1",
+       "REDIS_PORT_TEST": "9", "REDIS_DB_TEST": "0", "REDIS_PASSWORD_TEST": "test", "REDIS_SSL_TEST": "false",
+       "PAGES_LAZY_CONNECTIONS": "1"}
+
+
+@pytest.fixture(scope="module")
+def http_function():
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in ENV.items():
+            patch.setenv(name, value)
+        function_app = importlib.import_module("function_app")
+        [function] = function_app.app.get_functions()
+        yield function.get_user_function()
+
+
+def call(http_function, method: str, url: str, body: bytes = b"", headers: dict = None):
+    request = func.HttpRequest(method=method, url=url, body=body, headers=headers or {})
+    return asyncio.run(http_function(request, None))
+
+
+def test_lazy_connections_from_the_environment(http_function):
+    import main
+
+    assert main.lazy_connections()
+    assert main.PAGES_API["LAZY_CONNECTIONS"] is False
+
+
+def test_catalog_through_the_function_trigger(http_function):
+    import main
+
+    response = call(http_function, "GET", "http://localhost/catalog")
+    assert response.status_code == 200
+    assert json.loads(response.get_body())["version"] == main.catalog_store.current.version
+    # opened by the first request, not at import
+    assert main.chat_agent is not None
@@ -0,0 +1,125 @@
+import asyncio
+from types import SimpleNamespace
+
+from prometheus_client import REGISTRY
+
+from config import PAGES_GATEWAY, PAGES_ROUTER
+from utils import metrics
+from utils.llm_gateway import LLMGateway, budget_buckets
+from utils.llm_router import LLMRouter, Upstream
+
+
+class FakeClient:
+    """chat.completions.create answering after `delay` seconds, with `tokens` of usage."""
+
+    def __init__(self, delay: float, tokens: int = 100) -> None:
+        self.delay = delay
+        self.tokens = tokens
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **params):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="{}"))],
+                               usage=SimpleNamespace(total_tokens=self.tokens, prompt_tokens=self.tokens,
+                                                     completion_tokens=0, prompt_tokens_details=None))
+
+
+class HookedClient(FakeClient):
+    """FakeClient whose calls pass through the metrics httpx hook, like the real client's."""
+
+    async def create(self, **params):
+        await metrics.acount_llm_attempt(None)
+        return await super().create(**params)
+
+
+PARAMS = {"messages": [{"role": "user", "content": "x" * 25}], "max_tokens": 10}
+
+
+def test_budget_is_split_between_workers(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    requests, tokens = budget_buckets(600, 300000)
+    assert requests.rate * 60 == 150
+    assert tokens.rate * 60 == 75000
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    requests, _ = budget_buckets(600, None)
+    assert requests.rate * 60 == 600
+
+
+def test_hedge_is_charged_to_the_deployment_it_hits(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setitem(PAGES_ROUTER, "HEDGE_DELAY", 0.05)
+    monkeypatch.setitem(PAGES_ROUTER, "HEDGE_MIN_DELAY", 0.05)
+    monkeypatch.setitem(PAGES_ROUTER, "HEDGE_BUDGET", 1.0)
+    slow, fast = FakeClient(0.5), FakeClient(0.0)
+    primary = Upstream("primary", slow, "m", budget_buckets(600, 300000))
+    secondary = Upstream("secondary", fast, "m", budget_buckets(600, 300000))
+    router = LLMRouter([primary, secondary], hedge=True)
+
+    asyncio.run(router.create(**PARAMS))
+
+    assert (slow.calls, fast.calls) == (1, 1)
+    assert router.stats["hedge_won"] == 1
+    full = 600 / 60 * PAGES_GATEWAY["BURST_SECONDS"]
+    assert primary.requests.available == full - 1
+    assert secondary.requests.available == full - 1
+    # the hedge's usage settles the secondary's token estimate
+    assert secondary.tokens.available == 300000 / 60 * PAGES_GATEWAY["BURST_SECONDS"] - 100
+
+
+def test_hedge_is_not_counted_as_a_retry(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setitem(PAGES_ROUTER, "HEDGE_DELAY", 0.05)
+    monkeypatch.setitem(PAGES_ROUTER, "HEDGE_MIN_DELAY", 0.05)
+    monkeypatch.setitem(PAGES_ROUTER, "HEDGE_BUDGET", 1.0)
+    router = LLMRouter([Upstream("primary", HookedClient(0.5), "m", budget_buckets(600, None)),
+                        Upstream("secondary", HookedClient(0.0), "m", budget_buckets(600, None))], hedge=True)
+    hedges = REGISTRY.get_sample_value("pages_llm_hedges_total") or 0
+    retries = REGISTRY.get_sample_value("pages_llm_retries_sum") or 0
+
+    async def call():
+        with metrics.llm_call():
+            await router.create(**PARAMS)
+
+    asyncio.run(call())
+
+    assert router.stats["hedge_won"] == 1
+    assert REGISTRY.get_sample_value("pages_llm_hedges_total") == hedges + 1
+    assert (REGISTRY.get_sample_value("pages_llm_retries_sum") or 0) == retries
+
+
+def test_no_hedge_to_a_deployment_out_of_budget(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setitem(PAGES_ROUTER, "HEDGE_DELAY", 0.05)
+    monkeypatch.setitem(PAGES_ROUTER, "HEDGE_MIN_DELAY", 0.05)
+    monkeypatch.setitem(PAGES_ROUTER, "HEDGE_BUDGET", 1.0)
+    slow, idle = FakeClient(0.2), FakeClient(0.0)
+    primary = Upstream("primary", slow, "m", budget_buckets(600, None))
+    secondary = Upstream("secondary", idle, "m", budget_buckets(600, None))
+    secondary.requests.available = 0
+    router = LLMRouter([primary, secondary], hedge=True)
+
+    asyncio.run(router.create(**PARAMS))
+
+    assert (slow.calls, idle.calls) == (1, 0)
+    assert router.stats["hedged"] == 0
+
+
+def test_gateway_admits_within_the_deployments_budget(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setitem(PAGES_GATEWAY, "BURST_SECONDS", 0.5)  # 5 calls at once at 600 per minute
+    monkeypatch.setitem(PAGES_GATEWAY, "SINGLE_FLIGHT", False)
+    client = FakeClient(0.0, tokens=0)
+    router = LLMRouter([Upstream("primary", client, "m", budget_buckets(600, None))], hedge=False)
+
+    async def burst():
+        gateway = LLMGateway(budget=router)
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(*(gateway.complete(router.create, PARAMS) for _ in range(8)))
+        return asyncio.get_running_loop().time() - started
+
+    elapsed = asyncio.run(burst())
+    assert client.calls == 8
+    # 5 from the burst, the other 3 at 10 per second
+    assert elapsed >= 0.25
@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+httpx = pytest.importorskip("httpx")
+
+ENV = {"APP_ENV": "TEST", "AZURE_OPENAI_API_KEY_TEST": "test-key", "AZURE_OPENAI_ENDPOINT_TEST": "http://127.0.0.1:9",
+       "AZURE_OPENAI_RETRIES_TEST": "0", "AZURE_OPENAI_VERSION_TEST": "2024-10-21", "REDIS_HOST_TEST": "127.0.0.1",
+       "REDIS_PORT_TEST": "9", "REDIS_DB_TEST": "0", "REDIS_PASSWORD_TEST": "test", "REDIS_SSL_TEST": "false"}
+HEADERS = {"x-login-mask-id": "masked-123", "x-login-gender": "M", "x-cust-mask-id": "masked-456",
+           "x-cust-gender": "F", "x-cust-age": "30", "x-dr-license": "abcde-1245"}
+
+
+@pytest.fixture(scope="module")
+def main():
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in ENV.items():
+            patch.setenv(name, value)
+        import main
+
+        if main.chat_agent is None:
+            main.open_connections()
+        patch.setattr(main.redis_manager, "redis_client", fakeredis.FakeAsyncRedis(decode_responses=True))
+        yield main
+
+
+@pytest.fixture
+def history_reads(main, monkeypatch):
+    reads = []
+    get_history = main.redis_manager.get_history
+
+    async def counted(session_id, window):
+        reads.append(session_id)
+        return await get_history(session_id, window)
+
+    monkeypatch.setattr(main.redis_manager, "get_history", counted)
+    return reads
+
+
+def send(main, method: str, path: str, client=("127.0.0.1", 123), **kwargs) -> httpx.Response:
+    async def request():
+        transport = httpx.ASGITransport(app=main.app, client=client)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http_client:
+            return await http_client.request(method, path, **kwargs)
+
+    return asyncio.run(request())
+
+
+def post(main, path: str, query: str, session_id: str) -> httpx.Response:
+    return send(main, "POST", path, headers=HEADERS, json={"request_id": "1", "source_system": 46,
+                                                           "session_id": session_id, "query": query})
+
+
+def answered_code(response: httpx.Response) -> str:
+    return json.loads(response.json()["json_card"]["content"])["code"]
+
+
+def test_fast_path_does_not_wait_for_the_session(main, history_reads):
+    response = post(main, "/query", "טופס 17", "fast-session")
+    assert response.status_code == 200
+    assert answered_code(response) == "101"
+    assert history_reads == []
+
+
+def test_possible_pick_reads_the_session_first(main, history_reads):
+    services = main.catalog_store.current.services_by_code
+    options = {"options": [{"code": code, "name": services[code].name} for code in ("207", "263")],
+               "clarification_question": "לאיזה מהם התכוונת?"}
+    turns = [{"role": "user", "content": "פסיכולוג"},
+             {"role": "assistant", "content": json.dumps(options, ensure_ascii=False)}]
+    asyncio.run(main.redis_manager.append_turns("pick-session", turns, 10, 60))
+
+    # the fast path alone answers 207 for this fragment of 263's name
+    response = post(main, "/query", "בריאות הנפש", "pick-session")
+    assert answered_code(response) == "263"
+    assert history_reads == ["pick-session"]
+
+
+def test_list_answer_gets_a_card(main, monkeypatch):
+    options = [{"code": "207", "name": "רפואה דחופה"}, {"code": "263", "name": "מוקד בריאות הנפש"}]
+
+    async def ainvoke(query, history, *args):
+        return json.dumps(options, ensure_ascii=False), history
+
+    monkeypatch.setattr(main.chat_agent, "ainvoke", ainvoke)
+    response = post(main, "/query", "מה קורה", "list-session")
+    assert response.status_code == 200
+    assert response.json()["card_type"] == "json"
+    assert json.loads(response.json()["json_card"]["content"]) == options
+
+
+def test_unknown_answer_type_gets_an_error_card(main, monkeypatch):
+    monkeypatch.setattr(main, "check_model_response_type", lambda answer: ("number", 17))
+    request_msg = main.RequestMSG(request_id="1", source_system=46, session_id="s", query="q")
+    response = main.build_response(request_msg, "17", "v1")
+    assert response["card_type"] == "error"
+    assert response["error_card"]["code_error"] == main.PAGES_API["OUT_OF_SCOPE_ERROR_CODE"]
+
+
+BATCH = '{"id": "1", "query": "טופס 17"}\n'.encode()
+
+
+def test_batch_needs_the_admin_token(main, monkeypatch):
+    monkeypatch.setenv("PAGES_ADMIN_TOKEN_TEST", "secret")
+    assert send(main, "POST", "/query/batch", content=BATCH).status_code == 403
+    assert send(main, "POST", "/query/batch", content=BATCH, headers={"x-admin-token": "wrong"}).status_code == 403
+    response = send(main, "POST", "/query/batch", content=BATCH, headers={"x-admin-token": "secret"})
+    assert response.status_code == 200
+    assert json.loads(response.text.splitlines()[0])["label"] == "101"
+
+
+def test_batch_without_a_token_is_local_only(main, monkeypatch):
+    monkeypatch.delenv("PAGES_ADMIN_TOKEN_TEST", raising=False)
+    assert send(main, "POST", "/query/batch", content=BATCH, client=("203.0.113.7", 123)).status_code == 403
+    assert send(main, "POST", "/query/batch", content=BATCH).status_code == 200
@@ -0,0 +1,53 @@
+import json
+
+from utils.stream_parser import AnswerStreamParser
+
+
+def stream(answer: str, chunk: int = 3) -> list:
+    parser = AnswerStreamParser()
+    events = []
+    for i in range(0, len(answer), chunk):
+        events.extend(parser.feed(answer[i:i + chunk]))
+    return events
+
+
+def streamed_text(events: list) -> str:
+    return "".join(event["delta"] for event in events if event["event"] == "text")
+
+
+def test_options_and_clarification_question():
+    answer = json.dumps({"options": [{"code": "256", "name": "שליחת מייל"}, {"code": "288", "name": "מסך דברו איתנו"}],
+                         "clarification_question": "לאיזה מהם התכוונת?"}, ensure_ascii=False)
+    events = stream(answer)
+    assert events[0] == {"event": "card_type", "card_type": "json"}
+    assert [event["option"]["code"] for event in events if event["event"] == "option"] == ["256", "288"]
+    assert streamed_text(events) == "לאיזה מהם התכוונת?"
+
+
+def test_escapes_split_across_deltas():
+    message = 'שורה "ראשונה"\nשורה\tשנייה \\ א'
+    answer = json.dumps({"error_message": message})  # \uXXXX escapes, cut by the 3-char chunks
+    for chunk in (1, 2, 3, 5):
+        events = stream(answer, chunk)
+        assert events[0] == {"event": "card_type", "card_type": "error"}
+        assert streamed_text(events) == message
+
+
+def test_raw_control_characters_in_a_multi_line_message():
+    answer = '{"error_message": "שורה ראשונה\nשורה\tשנייה\r\nסוף"}'
+    events = stream(answer)
+    assert events[0] == {"event": "card_type", "card_type": "error"}
+    assert streamed_text(events) == "שורה ראשונה\nשורה\tשנייה\r\nסוף"
+
+
+def test_raw_newline_in_an_option():
+    answer = '{"options": [{"code": "101", "name": "ההתחייבויות\nשלי"}], "clarification_question": "?"}'
+    events = stream(answer)
+    assert [event["option"] for event in events if event["event"] == "option"] == [
+        {"code": "101", "name": "ההתחייבויות\nשלי"}]
+
+
+def test_plain_text_answer():
+    events = stream("שלום! אני יכול לעזור\nבמציאת שירותים.")
+    assert events[0] == {"event": "card_type", "card_type": "text"}
+    assert streamed_text(events) == "שלום! אני יכול לעזור\nבמציאת שירותים."
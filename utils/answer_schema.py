@@ -0,0 +1,64 @@
+"""
+JSON-schema structured outputs for the classifier's answer.
+
+The model is asked for {"answer": <one answer shape>} under a strict schema whose service codes are an
+enum of the catalog's codes, so a (non-streamed) answer always parses and never names a service that does
+not exist. Structured outputs need an object at the root, hence the "answer" wrapper. Names are not
+generated at all - `answer_text` takes them from the catalog when it turns the structured answer back into
+the answer text the rest of the service works with: {"code", "name"}, {"options", "clarification_question"},
+{"error_message"} or plain text.
+"""
+import json
+
+SCHEMA_NAME = "service_answer"
+
+
+def _object(properties: dict) -> dict:
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+def build_response_format(services: list) -> dict:
+    """The `response_format` of a catalog version - built once per snapshot, identical for every request."""
+    code = {"type": "string", "enum": [service.code for service in services]}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": SCHEMA_NAME,
+            "strict": True,
+            "schema": _object({
+                "answer": {"anyOf": [
+                    _object({"code": code}),
+                    _object({"options": {"type": "array", "items": _object({"code": code})},
+                             "clarification_question": {"type": "string"}}),
+                    _object({"error_message": {"type": "string"}}),
+                    _object({"text": {"type": "string"}}),
+                ]}
+            })
+        }
+    }
+
+
+def answer_text(content: str, services_by_code: dict) -> str:
+    """
+    The answer text of a structured answer. Content that is not a structured answer (a stream, a model
+    call without the schema) is returned as it is.
+    """
+    try:
+        answer = json.loads(content)["answer"]
+    except (TypeError, ValueError, KeyError):
+        return content
+    if not isinstance(answer, dict):
+        return content
+
+    def service(code: str) -> dict:
+        known = services_by_code.get(code)
+        return {"code": code, "name": known.name if known is not None else ""}
+
+    if "code" in answer:
+        return json.dumps(service(answer["code"]), ensure_ascii=False)
+    if "options" in answer:
+        return json.dumps({"options": [service(option["code"]) for option in answer["options"]],
+                           "clarification_question": answer["clarification_question"]}, ensure_ascii=False)
+    if "error_message" in answer:
+        return json.dumps({"error_message": answer["error_message"]}, ensure_ascii=False)
+    return answer.get("text", content)
@@ -0,0 +1,286 @@
+"""
+Bulk classification of query logs, shared by the /query/batch endpoint (admin only - x-admin-token, see
+main.admin_access) and the CLI below.
+
+Input is JSONL, one query per line: {"id": ..., "query": "...", "history": [...], "gold": "<code>"}
+where only "query" is required. Results are produced as they complete (not in input order) and
+nothing is written to the session store.
+
+Usage (from the repo root):
+    python -m utils.batch_classify --input queries.jsonl --output results.jsonl --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+
+import openai
+
+from config import PAGES_BATCH
+from utils.llm_gateway import RETRYABLE_ERRORS, retry_after
+
+
+def parse_jsonl(lines) -> list:
+    """Batch items from JSONL lines. Blank lines are skipped, a line may also be a bare JSON string query."""
+    items = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {number}: invalid JSON ({e})")
+        if isinstance(item, str):
+            item = {"query": item}
+        if not isinstance(item, dict) or not isinstance(item.get("query"), str):
+            raise ValueError(f"line {number}: expected an object with a string 'query'")
+        item.setdefault("id", number)
+        items.append(item)
+    return items
+
+
+def answer_label(answer) -> str:
+    """The service code of a confident answer, otherwise the kind of answer (clarify / out_of_scope / text / failed)."""
+    if answer is None:
+        return "failed"
+    try:
+        parsed = json.loads(answer)
+    except json.JSONDecodeError:
+        return "text"
+    if isinstance(parsed, dict):
+        if "code" in parsed:
+            return str(parsed["code"])
+        if "options" in parsed:
+            return "clarify"
+        if "error_message" in parsed:
+            return "out_of_scope"
+    return "text"
+
+
+class BatchRunner:
+    """
+    Runs a batch through the fast path, the embedding index, the precomputed clarifications and the agent with at
+    most `concurrency` model calls in flight.
+
+    Without the LLM gateway, retryable errors are retried with exponential backoff and full jitter. A
+    rate-limit response pauses every worker (not just the one that got it) until its Retry-After has passed,
+    so a throttled deployment is not hammered by the rest of the batch. With the gateway on, it is the one
+    layer that retries: a call it shed (GatewayOverloaded) or gave up on fails the item at once, instead of
+    multiplying its attempts and the router's failovers by MAX_ATTEMPTS.
+    """
+
+    def __init__(self, agent, concurrency: int = None, max_attempts: int = None,
+                 backoff_base: float = None, backoff_max: float = None) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.agent = agent
+        self.concurrency = concurrency or PAGES_BATCH["CONCURRENCY"]
+        self.max_attempts = max_attempts or PAGES_BATCH["MAX_ATTEMPTS"]
+        if getattr(agent, "gateway", None) is not None:
+            self.max_attempts = 1
+        self.backoff_base = backoff_base if backoff_base is not None else PAGES_BATCH["BACKOFF_BASE"]
+        self.backoff_max = backoff_max if backoff_max is not None else PAGES_BATCH["BACKOFF_MAX"]
+        self._resume_at = 0.0
+
+    async def run(self, items: list):
+        """
+        Async generator of result dicts, in completion order - one per item. An unexpected error in a worker
+        is raised to the consumer after the results queued before it.
+        """
+        results = asyncio.Queue(maxsize=self.concurrency * 2)
+        pending = iter(items)
+
+        async def worker():
+            for item in pending:
+                await results.put(await self.classify(item))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, len(items)))]
+        finished = asyncio.gather(*workers)
+        try:
+            for _ in range(len(items)):
+                if not finished.done():
+                    getter = asyncio.ensure_future(results.get())
+                    await asyncio.wait((getter, finished), return_when=asyncio.FIRST_COMPLETED)
+                    if getter.done():
+                        yield getter.result()
+                        continue
+                    getter.cancel()
+                # the workers are done: the remaining results are queued, unless one of them failed
+                if results.empty():
+                    finished.result()
+                yield results.get_nowait()
+        finally:
+            # the consumer went away (e.g. the HTTP client disconnected) - stop the remaining work
+            for task in workers:
+                task.cancel()
+            if finished.done() and not finished.cancelled():
+                finished.exception()  # retrieved, or asyncio logs it as never retrieved
+
+    async def classify(self, item: dict) -> dict:
+        started = time.perf_counter()
+        query = item["query"]
+        history = item.get("history") or []
+        catalog = self.agent.catalog.current
+        answer, source, attempts, error = self.agent.classify_selection(query, history, catalog), "selection", 0, None
+        candidates = []
+        if answer is None:
+            answer, source = self.agent.classify_fast(query, catalog), "fast_path"
+        if answer is None:
+            answer, candidates = self.agent.classify_nearest(query, catalog, history)
+            source = "embeddings"
+        if answer is None:
+            answer, source = self.agent.classify_cluster(query, catalog), "clarification"
+
+        if answer is None:
+            source = "model"
+            while attempts < self.max_attempts:
+                attempts += 1
+                await self._wait_for_rate_limit()
+                try:
+                    answer, _ = await self.agent.ainvoke(query, history, catalog, candidates=candidates)
+                    error = None
+                    break
+                except RETRYABLE_ERRORS as e:
+                    error = e
+                    if attempts == self.max_attempts:
+                        break
+                    delay = self._backoff(attempts, e)
+                    self.logger.warning("Batch item %s attempt %s failed (%s), retrying in %.2fs",
+                                        item["id"], attempts, type(e).__name__, delay)
+                    await asyncio.sleep(delay)
+                except Exception as e:
+                    error = e
+                    break
+            if error is not None:
+                self.logger.error("Batch item %s failed after %s attempts: %s", item["id"], attempts, error)
+
+        result = {
+            "id": item["id"],
+            "query": query,
+            "answer": answer,
+            "label": answer_label(answer),
+            "source": source,
+            "attempts": attempts,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "catalog_version": catalog.version
+        }
+        if "gold" in item:
+            result["gold"] = str(item["gold"])
+        if error is not None:
+            result["error"] = f"{type(error).__name__}: {error}"
+        return result
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        if isinstance(error, openai.RateLimitError):
+            pause = retry_after(error)
+            if pause is not None:
+                delay = max(delay, pause)
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        return delay
+
+    async def _wait_for_rate_limit(self) -> None:
+        wait = self._resume_at - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class BatchReport:
+    """Throughput, latency percentiles and per-service confusion of a batch run."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.latencies = []
+        self.sources = Counter()
+        self.failed = 0
+        self.confusion = defaultdict(Counter)
+
+    def record(self, result: dict) -> None:
+        self.latencies.append(result["latency_ms"])
+        self.sources[result["source"]] += 1
+        self.failed += "error" in result
+        if "gold" in result:
+            self.confusion[result["gold"]][result["label"]] += 1
+
+    def snapshot(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        latencies = sorted(self.latencies)
+        summary = {
+            "queries": len(latencies),
+            "failed": self.failed,
+            "sources": dict(self.sources),
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput_qps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": statistics.median(latencies) if latencies else 0.0,
+            "p95_ms": latencies[math.ceil(len(latencies) * 0.95) - 1] if latencies else 0.0,  # nearest rank
+        }
+        if self.confusion:
+            summary.update(self._evaluation())
+        return summary
+
+    def _evaluation(self) -> dict:
+        predicted = Counter()
+        for row in self.confusion.values():
+            predicted.update(row)
+        total = sum(predicted.values())
+        correct = sum(row[gold] for gold, row in self.confusion.items())
+
+        per_service = {}
+        for gold, row in sorted(self.confusion.items()):
+            support = sum(row.values())
+            per_service[gold] = {
+                "support": support,
+                "recall": round(row[gold] / support, 4),
+                "precision": round(row[gold] / predicted[gold], 4) if predicted[gold] else 0.0,
+            }
+        return {
+            "labeled": total,
+            "accuracy": round(correct / total, 4),
+            "per_service": per_service,
+            "confusion": {gold: dict(row) for gold, row in sorted(self.confusion.items())},
+        }
+
+
+async def _run_cli(args) -> dict:
+    from service_page_agent import AzureOpenAiClient
+    from utils.response_cache import ResponseCache
+    from config import PAGES_CACHE
+
+    with open(args.input, "r", encoding="utf-8") as file:
+        items = parse_jsonl(file)
+
+    agent = AzureOpenAiClient(cache=ResponseCache(max_entries=PAGES_CACHE["MAX_ENTRIES"], ttl=PAGES_CACHE["TTL"]))
+    runner = BatchRunner(agent, concurrency=args.concurrency)
+    report = BatchReport()
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        async for result in runner.run(items):
+            report.record(result)
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        await agent.aclose()
+    return report.snapshot()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", "-I", type=str, required=True, help="JSONL of queries")
+    parser.add_argument("--output", "-O", type=str, default=None, help="JSONL results (default stdout)")
+    parser.add_argument("--report", "-R", type=str, default=None, help="write the summary JSON here as well")
+    parser.add_argument("--concurrency", "-C", type=int, default=PAGES_BATCH["CONCURRENCY"])
+    args = parser.parse_args()
+
+    summary = asyncio.run(_run_cli(args))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(summary, file, ensure_ascii=False, indent=2)
+    print(json.dumps(summary, ensure_ascii=False, indent=2), file=sys.stderr)
@@ -0,0 +1,296 @@
+"""
+Build the services catalog from the services workbook in one pass.
+
+Every sheet of the workbook is read once; cells are cleaned one by one (NaN, invisible bidi marks,
+whitespace, "nan" strings), keywords / example questions are split and de-duplicated by their normalized
+Hebrew form, and duplicate service codes keep their last row. The tool then writes:
+
+* the markdown prompt file (utils/output.md format),
+* the JSON catalog artifact loaded by the service (utils/catalog.json), optionally a parquet table,
+* optionally the prebuilt retrieval / fast-path indexes next to the artifact (utils/catalog.index.json),
+* optionally the embedding index of the catalog's phrases (utils/catalog.embeddings.npy, see utils/embedding_index.py),
+* optionally the clarifications of the ambiguous service clusters (utils/catalog.clarifications.json,
+  see utils/clarification.py),
+
+and prints a report of the lookup phrases (phrases shared by several services never hit the fast path).
+Outputs are replaced atomically and left untouched when their content did not change, so re-running the
+tool is idempotent and does not trigger a catalog reload.
+
+Usage (from the repo root):
+    python -m utils.build_catalog --path utils/services.xlsx --markdown utils/output.md --json utils/catalog.json \
+        --index --clarifications --embeddings utils/catalog.embeddings.npy
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import unicodedata
+
+import pandas as pd
+
+from config import PAGES_CLARIFICATION, PAGES_EMBEDDINGS
+from utils.catalog import (EMPTY_VALUES, SECTION_HEADERS, ServicePage, catalog_version,
+                           write_catalog_artifact)
+from utils.catalog_store import INDEX_FORMAT, index_path, write_catalog_index
+from utils.clarification import CLARIFICATIONS_FORMAT, default_clarifications_path, write_clarifications
+from utils.embedding_index import build_embedding_index, index_paths
+from utils.hebrew_text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# header titles of the workbook columns, with the positions parse_xlsx_to_md used as a fallback
+COLUMNS = {
+    "code": ("actionKey", 0),
+    "name": ("Desc", 1),
+    "keywords": ("מילות מפתח", 3),
+    "description": ("תיאור מסך", 4),
+    "examples": ("נוסחים שלפיהם נפתח את המסך", 5),
+}
+LIST_FIELDS = ("keywords", "examples")
+# bidi / zero-width marks that Excel keeps around Hebrew text
+INVISIBLE = re.compile(r"[\u200b-\u200f\u202a-\u202e\u2066-\u2069\ufeff]+")
+SPACES = re.compile(r"[ \t\u00a0]+")
+STRUCTURAL_LINE = (r"(?m)^(?:# \*\*Service page:\*\*|(?:"
+                   + "|".join(re.escape(title) for title in SECTION_HEADERS) + r")$)")
+
+
+def _find_header_row(raw: pd.DataFrame):
+    titles = raw.apply(lambda column: column.str.strip())
+    hits = titles.eq(COLUMNS["code"][0]).any(axis=1)
+    return int(hits.values.argmax()) if hits.any() else None
+
+
+def _select_columns(raw: pd.DataFrame, header_row: int) -> pd.DataFrame:
+    titles = raw.iloc[header_row].fillna("").str.strip().tolist()
+    positions = {}
+    for field, (title, fallback) in COLUMNS.items():
+        # the sheet repeats some titles (a second "תיאור מסך " column) - the first one is the real one
+        positions[field] = titles.index(title) if title in titles else fallback
+    frame = raw.iloc[header_row + 1:, list(positions.values())]
+    frame.columns = list(positions)
+    return frame
+
+
+def read_workbook(path: str, header: int = None) -> pd.DataFrame:
+    """All sheets of the workbook as one frame of raw string cells, plus the sheet each row came from."""
+    sheets = pd.read_excel(path, sheet_name=None, header=None, dtype=str)
+    frames = []
+    for sheet, raw in sheets.items():
+        header_row = header if header is not None else _find_header_row(raw)
+        if header_row is None:
+            logger.warning("Sheet %s has no '%s' header row, skipped", sheet, COLUMNS["code"][0])
+            continue
+        frames.append(_select_columns(raw, header_row).assign(sheet=sheet))
+    if not frames:
+        raise ValueError(f"No services sheet found in {path}")
+    return pd.concat(frames, ignore_index=True)
+
+
+def _clean_cell(value) -> str:
+    """NaN -> "", unicode/bidi/whitespace normalization, "nan"/"none" and blank lines dropped."""
+    if not isinstance(value, str):
+        return "" if pd.isna(value) else str(value)
+    text = INVISIBLE.sub("", unicodedata.normalize("NFC", value))
+    if "\t" in text or "\u00a0" in text or "  " in text:  # single spaces are the common case, nothing to collapse
+        text = SPACES.sub(" ", text)
+    lines = (line.strip(" ") for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"))
+    return "\n".join(line for line in lines if line.lower() not in EMPTY_VALUES).strip()
+
+
+def _clean(column: pd.Series) -> pd.Series:
+    # one pass of plain string methods per cell - chained .str.replace passes cost a regex scan each
+    return column.map(_clean_cell, na_action=None)
+
+
+def _normalized(column: pd.Series) -> pd.Series:
+    """normalize_text over a column, computed once per distinct value (phrases repeat a lot across services)."""
+    distinct = column.unique()
+    return column.map(dict(zip(distinct, map(normalize_text, distinct))))
+
+
+def _unique_lines(column: pd.Series) -> list:
+    """Per-service list of a cleaned column's lines, de-duplicated by normalized Hebrew text (first spelling kept)."""
+    keys = {}
+    grouped = []
+    for cell in column:
+        seen, lines = set(), []
+        for line in cell.split("\n") if cell else ():
+            key = keys.get(line)
+            if key is None:
+                key = keys[line] = normalize_text(line)
+            if key and key not in seen:
+                seen.add(key)
+                lines.append(line)
+        grouped.append(lines)
+    return grouped
+
+
+def normalize_services(raw: pd.DataFrame) -> pd.DataFrame:
+    frame = raw.copy()
+    for field in COLUMNS:
+        frame[field] = _clean(frame[field])
+    frame["code"] = frame["code"].str.replace(r"\.0$", "", regex=True)
+    frame["name"] = frame["name"].str.replace("\n", " ", regex=False)
+    frame = frame[frame["code"].ne("")]
+
+    duplicated = frame["code"].duplicated(keep="last")
+    if duplicated.any():
+        logger.warning("Duplicate service codes, keeping the last row: %s",
+                       sorted(frame.loc[duplicated, "code"].unique()))
+    frame = frame[~duplicated].reset_index(drop=True)
+
+    # a cell line that looks like a block / section header would split the service when the markdown is parsed
+    structural = frame[["description", *LIST_FIELDS]].apply(lambda column: column.str.contains(STRUCTURAL_LINE))
+    if structural.values.any():
+        codes = sorted(frame.loc[structural.any(axis=1), "code"])
+        raise ValueError(f"Markdown header lines inside the cells of services {codes}")
+
+    for field in LIST_FIELDS:
+        frame[field] = _unique_lines(frame[field])
+    return frame
+
+
+def render_markdown(frame: pd.DataFrame) -> pd.Series:
+    """One markdown block per service, in the format parse_services_markdown reads."""
+    return ("# **Service page:** **code:** " + frame["code"] + ", **name:** " + frame["name"]
+            + "\n## The service description:\n" + frame["description"]
+            + "\n## Key words:\n" + frame["keywords"].str.join("\n")
+            + "\n## Examples of questions that can relate to this service:\n" + frame["examples"].str.join("\n")
+            + "\n")
+
+
+def lookup_report(frame: pd.DataFrame) -> dict:
+    """Phrase table stats of the fast-path lookup (names, keywords and examples by normalized text)."""
+    phrases = pd.concat([
+        frame[["code", "name"]].rename(columns={"name": "phrase"}),
+        frame[["code", "keywords"]].explode("keywords").rename(columns={"keywords": "phrase"}),
+        frame[["code", "examples"]].explode("examples").rename(columns={"examples": "phrase"}),
+    ]).dropna()
+    phrases["key"] = _normalized(phrases["phrase"])
+    codes_per_phrase = phrases[phrases["key"].ne("")].groupby("key")["code"].nunique()
+    return {
+        "phrases": int(len(codes_per_phrase)),
+        "ambiguous_phrases": int((codes_per_phrase > 1).sum()),
+        "services_without_examples": sorted(frame.loc[frame["examples"].str.len().eq(0), "code"]),
+    }
+
+
+def _write_if_changed(path: str, content: str) -> bool:
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as file:
+            if file.read() == content:
+                return False
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".catalog-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+def _artifact_version(path: str):
+    """Version recorded in an existing artifact (not re-verified - a corrupt file is simply rewritten)."""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file).get("version")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _built_from(path: str, format: int):
+    """Catalog version an existing index / clarifications file was built from, None for another format."""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            document = json.load(file)
+        return document.get("catalog_version") if document.get("format") == format else None
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _index_version(path: str):
+    try:
+        with open(index_paths(path)[1], "r", encoding="utf-8") as file:
+            return json.load(file).get("catalog_version")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def build_catalog(path: str, markdown: str = None, json_path: str = None, parquet: str = None,
+                  header: int = None, embeddings: str = None, dim: int = 512, index: bool = False,
+                  clarifications: bool = False) -> dict:
+    started = time.perf_counter()
+    raw = read_workbook(path, header)
+    read_seconds = time.perf_counter() - started
+
+    frame = normalize_services(raw)
+    blocks = render_markdown(frame)
+    pages = [
+        ServicePage(code=code, name=name, description=description, keywords=keywords, examples=examples,
+                    markdown=block.strip() + "\n")
+        for code, name, description, keywords, examples, block in zip(
+            frame["code"], frame["name"], frame["description"], frame["keywords"], frame["examples"], blocks)
+    ]
+    markdown_text = "".join(blocks)
+    version = catalog_version(pages)
+
+    written = []
+    if markdown and _write_if_changed(markdown, markdown_text):
+        written.append(markdown)
+    # before the artifact: the watcher's reload of a new catalog then finds indexes of its version
+    if index and json_path and _built_from(index_path(json_path), INDEX_FORMAT) != version:
+        write_catalog_index(pages, index_path(json_path), version)
+        written.append(index_path(json_path))
+    clarifications_path = json_path and default_clarifications_path(json_path)
+    if clarifications and json_path and _built_from(clarifications_path, CLARIFICATIONS_FORMAT) != version:
+        write_clarifications(pages, clarifications_path, version, PAGES_CLARIFICATION["MAX_OPTIONS"])
+        written.append(clarifications_path)
+    if embeddings and _index_version(embeddings) != version:
+        build_embedding_index(pages, embeddings, version, dim)
+        written.append(embeddings)
+    if json_path and _artifact_version(json_path) != version:
+        write_catalog_artifact(pages, json_path, version)
+        written.append(json_path)
+    if parquet:
+        frame.drop(columns=["sheet"]).to_parquet(parquet, index=False)
+        written.append(parquet)
+
+    return {
+        "version": version,
+        "rows": int(len(raw)),
+        "services": len(pages),
+        "sheets": raw["sheet"].value_counts(sort=False).to_dict(),
+        **lookup_report(frame),
+        "written": written,
+        "read_seconds": round(read_seconds, 3),
+        "build_seconds": round(time.perf_counter() - started - read_seconds, 3),
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", "-P", type=str, required=True, help="services workbook (.xlsx)")
+    parser.add_argument("--markdown", "-M", type=str, default=None, help="markdown prompt file to write")
+    parser.add_argument("--json", "-J", type=str, default=None, help="JSON catalog artifact to write")
+    parser.add_argument("--parquet", type=str, default=None, help="also write the catalog table (needs pyarrow)")
+    parser.add_argument("--index", action="store_true", help="prebuild the search indexes next to the JSON artifact")
+    parser.add_argument("--clarifications", action="store_true",
+                        help="precompute the ambiguous clusters' clarifications next to the JSON artifact")
+    parser.add_argument("--embeddings", "-E", type=str, default=None, help="embedding index (.npy) to write")
+    parser.add_argument("--dim", type=int, default=PAGES_EMBEDDINGS["DIM"], help="embedding index dimensions")
+    parser.add_argument("--header", "-H", type=int, default=None,
+                        help="0-based header row, detected from the 'actionKey' title by default")
+    args = parser.parse_args()
+
+    report = build_catalog(args.path, args.markdown, args.json, args.parquet, args.header, args.embeddings,
+                           args.dim, args.index, args.clarifications)
+    for key, value in report.items():
+        print(f"{key}: {value}")
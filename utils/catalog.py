@@ -0,0 +1,134 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+
+SERVICE_HEADER = re.compile(r"^# \*\*Service page:\*\* \*\*code:\*\* (?P<code>[^,]+), \*\*name:\*\*\s*(?P<name>.*?)\s*$")
+SECTION_HEADERS = {
+    "## The service description:": "description",
+    "## Key words:": "keywords",
+    "## Examples of questions that can relate to this service:": "examples",
+}
+# pandas NaN cells that leaked into the generated markdown
+EMPTY_VALUES = {"", "nan", "none"}
+ARTIFACT_FORMAT = 1
+
+
+@dataclass
+class ServicePage:
+    code: str
+    name: str
+    description: str = ""
+    keywords: list = field(default_factory=list)
+    examples: list = field(default_factory=list)
+    markdown: str = ""
+
+
+def _clean_lines(lines: list) -> list:
+    return [line.strip() for line in lines if line.strip().lower() not in EMPTY_VALUES]
+
+
+def parse_services_markdown(text: str) -> list:
+    """
+    Split the services markdown (utils/output.md) into one ServicePage per '# **Service page:**' block.
+
+    The markdown is produced by appending, so a code may appear more than once - the last block wins.
+    Lines between the header and the first section belong to the (multi-line) service name.
+    """
+    pages = {}
+    current, section, sections, raw = None, None, {}, []
+
+    def flush():
+        if current is None:
+            return
+        current.description = "\n".join(_clean_lines(sections.get("description", [])))
+        current.keywords = _clean_lines(sections.get("keywords", []))
+        current.examples = _clean_lines(sections.get("examples", []))
+        current.markdown = "\n".join(raw).strip() + "\n"
+        pages[current.code] = current
+
+    for line in text.splitlines():
+        header = SERVICE_HEADER.match(line.strip())
+        if header:
+            flush()
+            current = ServicePage(code=header.group("code").strip(), name=header.group("name").strip())
+            section, sections, raw = None, {}, [line]
+            continue
+        if current is None:
+            continue
+        raw.append(line)
+        if line.strip() in SECTION_HEADERS:
+            section = SECTION_HEADERS[line.strip()]
+            sections[section] = []
+        elif section:
+            sections[section].append(line)
+        elif line.strip():
+            current.name = f"{current.name} {line.strip()}".strip()
+    flush()
+    return list(pages.values())
+
+
+def catalog_version(pages: list) -> str:
+    """Content hash of the structured catalog - identical services give the same version whatever the source file."""
+    canonical = json.dumps([vars(page) for page in pages], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def write_catalog_artifact(pages: list, path: str, version: str = None) -> str:
+    """
+    Write the JSON catalog artifact atomically (temp file + rename), so a watcher never sees a partial file.
+    Returns the catalog version.
+    """
+    version = version or catalog_version(pages)
+    # one service per line: diffable, and each line goes through the C JSON encoder
+    services = ",\n".join(json.dumps(vars(page), ensure_ascii=False) for page in pages)
+    header = json.dumps({"format": ARTIFACT_FORMAT, "version": version})[:-1]
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".catalog-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(f'{header}, "services": [\n{services}\n]}}\n')
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return version
+
+
+def read_catalog_artifact(path: str) -> tuple:
+    """(version, pages) of a JSON catalog artifact. Raises ValueError when the content does not match its hash."""
+    with open(path, "r", encoding="utf-8") as file:
+        artifact = json.load(file)
+    if artifact.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported catalog artifact format: {artifact.get('format')}")
+    pages = [ServicePage(**service) for service in artifact["services"]]
+    version = catalog_version(pages)
+    if version != artifact.get("version"):
+        raise ValueError(f"Catalog artifact {path} is corrupt: version {artifact.get('version')}, content {version}")
+    return version, pages
+
+
+def load_catalog(path: str) -> tuple:
+    """(version, pages) from a JSON artifact, or from the services markdown for any other extension."""
+    if path.endswith(".json"):
+        return read_catalog_artifact(path)
+    with open(path, "r", encoding="utf-8") as file:
+        pages = parse_services_markdown(file.read())
+    return catalog_version(pages), pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the services markdown into the JSON catalog artifact")
+    parser.add_argument("--input", "-I", type=str, default="utils/output.md")
+    parser.add_argument("--output", "-O", type=str, default="utils/catalog.json")
+    args = parser.parse_args()
+
+    _, services = load_catalog(args.input)
+    print(f"{len(services)} services, version {write_catalog_artifact(services, args.output)} -> {args.output}")
+
+#python -m utils.catalog --input utils/output.md --output utils/catalog.json
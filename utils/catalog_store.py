@@ -0,0 +1,222 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property
+
+from config import PAGES_CLARIFICATION, PAGES_EMBEDDINGS, PAGES_FAST_PATH
+from utils.answer_schema import build_response_format
+from utils.catalog import load_catalog
+from utils.clarification import (ClarificationIndex, build_clusters, default_clarifications_path,
+                                  read_clarifications)
+from utils.fast_path import FastPathClassifier
+from utils.retrieval import ServiceRetriever
+
+# bump when ServiceRetriever / FastPathClassifier change the data of their to_data()
+INDEX_FORMAT = 2
+
+
+def index_path(catalog_path: str) -> str:
+    return os.path.splitext(catalog_path)[0] + ".index.json"
+
+
+def build_indexes(services: list) -> tuple:
+    """(retriever, fast path) of a catalog - about 60ms for the current catalog, hence the prebuilt artifact."""
+    return ServiceRetriever(services), FastPathClassifier(
+        services,
+        threshold=PAGES_FAST_PATH["THRESHOLD"],
+        margin=PAGES_FAST_PATH["MARGIN"],
+        min_fuzzy_length=PAGES_FAST_PATH["MIN_FUZZY_LENGTH"]
+    )
+
+
+def write_catalog_index(services: list, path: str, version: str) -> None:
+    """
+    Write the data of the catalog's indexes (postings, idf, length norms, phrase and trigram tables) next to
+    it as JSON, atomically (temp file + rename). The pages themselves stay in the catalog.
+    """
+    retriever, fast_path = build_indexes(services)
+    index = {"format": INDEX_FORMAT, "catalog_version": version, "codes": [service.code for service in services],
+             "retriever": retriever.to_data(), "fast_path": fast_path.to_data()}
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".catalog-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(index, file, ensure_ascii=False, separators=(",", ":"))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_catalog_index(path: str, version: str, services: list) -> tuple:
+    """
+    (retriever, fast path) of `services` rebuilt from a prebuilt index's data. The file is plain JSON, so
+    loading it (from the watcher or /admin/catalog/reload) runs no code from it.
+    Raises ValueError when it was built from another catalog version, index format or service order.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        index = json.load(file)
+    if index.get("format") != INDEX_FORMAT or index.get("catalog_version") != version:
+        raise ValueError(f"index format {index.get('format')} of catalog {index.get('catalog_version')}")
+    if index["codes"] != [service.code for service in services]:
+        raise ValueError("index built for another service order")
+    # match-time settings come from the config, not from the build
+    return ServiceRetriever.from_data(services, index["retriever"]), FastPathClassifier.from_data(
+        services,
+        index["fast_path"],
+        threshold=PAGES_FAST_PATH["THRESHOLD"],
+        margin=PAGES_FAST_PATH["MARGIN"],
+        min_fuzzy_length=PAGES_FAST_PATH["MIN_FUZZY_LENGTH"]
+    )
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """One immutable catalog version with everything derived from it (indexes, clarifications, prompt prefix, schema)."""
+    version: str
+    source: str
+    services: list
+    services_by_code: dict
+    retriever: ServiceRetriever
+    fast_path: FastPathClassifier
+    clarifications: ClarificationIndex
+    prompt_prefix: str
+    response_format: dict
+    loaded_at: float
+
+    @cached_property
+    def embeddings(self):
+        """
+        The EmbeddingIndex of this version, created on first use - numpy is only imported when a request
+        gets past the fast path (or main.preload maps it in a preloading master).
+        """
+        from utils.embedding_index import EmbeddingIndex, default_index_path
+
+        return EmbeddingIndex(
+            PAGES_EMBEDDINGS["PATH"] or default_index_path(self.source),
+            self.version,
+            threshold=PAGES_EMBEDDINGS["THRESHOLD"],
+            margin=PAGES_EMBEDDINGS["MARGIN"]
+        )
+
+
+class CatalogStore:
+    """
+    Holds the current CatalogSnapshot and swaps it when the catalog file changes.
+
+    A new snapshot is fully built (parsed, hash-checked, indexed) before it replaces the current one with a
+    single reference assignment, so readers never see a half-built catalog. Request code should read
+    `store.current` once and use that snapshot for the whole request. A failed reload keeps serving the
+    previous snapshot.
+
+    Changes are picked up by `start_watching()` (a background thread polling the file's mtime) or by
+    calling `reload()` directly, e.g. from the admin endpoint.
+    """
+
+    def __init__(self, path: str, build_prefix, check_seconds: float = 5) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.build_prefix = build_prefix
+        self.check_seconds = check_seconds
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._mtime = os.stat(path).st_mtime
+        self.current = self._build()
+
+    def add_listener(self, callback) -> None:
+        """callback(previous, current) is called after every swap."""
+        self.listeners.append(callback)
+
+    def _build(self) -> CatalogSnapshot:
+        version, services = load_catalog(self.path)
+        try:
+            retriever, fast_path = read_catalog_index(index_path(self.path), version, services)
+            indexes = "prebuilt"
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.info("Catalog %s indexes built in process (%s)", version, e)
+            retriever, fast_path = build_indexes(services)
+            indexes = "built"
+        try:
+            clusters = read_clarifications(
+                PAGES_CLARIFICATION["PATH"] or default_clarifications_path(self.path), version)
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.info("Catalog %s clarifications clustered in process (%s)", version, e)
+            clusters = build_clusters(services, PAGES_CLARIFICATION["MAX_OPTIONS"])
+        services_by_code = {service.code: service for service in services}
+        snapshot = CatalogSnapshot(
+            version=version,
+            source=self.path,
+            services=services,
+            services_by_code=services_by_code,
+            retriever=retriever,
+            fast_path=fast_path,
+            clarifications=ClarificationIndex(clusters, services_by_code, PAGES_CLARIFICATION["MAX_EXTRA_TOKENS"]),
+            prompt_prefix=self.build_prefix(services),
+            response_format=build_response_format(services),
+            loaded_at=time.time()
+        )
+        self.logger.info("Catalog %s built from %s: %s services, %s indexes", version, self.path, len(services),
+                         indexes)
+        return snapshot
+
+    def reload(self, force: bool = False) -> tuple:
+        """
+        Rebuild from the file when it changed (or always, with force). Returns (changed, current snapshot).
+        Raises when the file cannot be loaded - the current snapshot stays in place.
+        """
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime
+            if not force and mtime == self._mtime:
+                return False, self.current
+            snapshot = self._build()
+            self._mtime = mtime
+            previous = self.current
+            if not force and snapshot.version == previous.version:
+                return False, previous
+            self.current = snapshot
+
+        self.logger.info("Catalog swapped %s -> %s", previous.version, snapshot.version)
+        for callback in self.listeners:
+            try:
+                callback(previous, snapshot)
+            except Exception as e:
+                self.logger.error("Catalog change listener failed: %s", e)
+        return True, snapshot
+
+    def start_watching(self) -> None:
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.check_seconds + 1)
+            self._watcher = None
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.check_seconds):
+            try:
+                self.reload()
+            except Exception as e:
+                self.logger.error("Keeping catalog %s, reload of %s failed: %s", self.current.version, self.path, e)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prebuild the indexes of a catalog artifact")
+    parser.add_argument("--catalog", "-C", type=str, default="utils/catalog.json")
+    args = parser.parse_args()
+
+    catalog_version, pages = load_catalog(args.catalog)
+    write_catalog_index(pages, index_path(args.catalog), catalog_version)
+    print(f"{index_path(args.catalog)}: catalog {catalog_version}, {len(pages)} services")
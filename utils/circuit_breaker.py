@@ -0,0 +1,69 @@
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures (slow calls count as failures),
+    open -> half-open after `reset_timeout` seconds, half-open -> closed on the first successful probe.
+
+    While open, callers skip the protected dependency entirely instead of waiting on its timeouts. Half-open
+    admits a single probe and rejects everyone else until it reports back; a probe that never reports (its
+    request was cancelled) is replaced after another `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, slow_call_seconds: float = 0.25, reset_timeout: float = 10.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            if self.state == self.HALF_OPEN and now - self._probe_started < self.reset_timeout:
+                self.rejected += 1
+                return False
+            # let a single probe through
+            self.state = self.HALF_OPEN
+            self._probe_started = now
+            return True
+
+    def record_success(self, elapsed: float) -> None:
+        if elapsed > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            if self.state == self.OPEN:
+                # a call admitted before the breaker opened - only the half-open probe closes it (a call from
+                # before that is still running at half-open has taken reset_timeout, and counts as slow)
+                return
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_started = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_started = None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "rejected": self.rejected}
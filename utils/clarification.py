@@ -0,0 +1,220 @@
+"""
+Precomputed clarifications for ambiguous queries, and local resolution of the user's pick.
+
+A catalog phrase (service name, key word or example question) listed under more than one service makes a
+query ambiguous - the model answers it with options and a clarification question, and the user's pick
+costs a second call. Offline, the services are clustered by the phrases they share: every distinct set of
+services sharing a phrase is a cluster, triggered by those phrases, with its option list and question
+computed once (`python -m utils.clarification`, or `build_catalog --clarifications`). The artifact is JSON
+next to the catalog, so the questions can be reviewed and edited (a rebuild keeps them); a missing or stale
+one is rebuilt in process with the default questions.
+
+A query that is a trigger phrase, or contains a multi-word one with at most MAX_EXTRA_TOKENS other words
+(and no longer phrase of a single service), gets the cluster's answer in the same JSON the model answers with. A follow-up that picks one of the
+options of the previous answer - by code or by name - is resolved from the session (`resolve_selection`),
+before any other tier: they only see the query, and a fragment of an option's name can match another service.
+
+Usage (from the repo root):
+    python -m utils.clarification --catalog utils/catalog.json
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from utils.conversation import CODE_PATTERN
+from utils.hebrew_text import normalize_text
+
+CLARIFICATIONS_FORMAT = 1
+# shorter picks must be an option's code or its whole name
+MIN_PARTIAL_NAME = 3
+QUESTION = 'מצאתי כמה שירותים שמתאימים ל"{phrase}". לאיזה מהם התכוונת?'
+# clusters shared through example questions only - quoting a whole question reads badly
+GENERIC_QUESTION = "מצאתי כמה שירותים שמתאימים לבקשה. לאיזה מהם התכוונת?"
+
+
+def default_clarifications_path(catalog_path: str) -> str:
+    return os.path.splitext(catalog_path)[0] + ".clarifications.json"
+
+
+def build_clusters(pages: list, max_options: int = 5) -> list:
+    """
+    [{"codes", "phrases", "question"}] - one cluster per set of services sharing a phrase, options in catalog
+    order. Sets larger than max_options are left to the model.
+    """
+    phrase_codes, display = {}, {}
+    for page in pages:
+        for position, phrase in enumerate([page.name, *page.keywords, *page.examples]):
+            normalized = normalize_text(phrase)
+            if normalized:
+                phrase_codes.setdefault(normalized, []).append(page.code)
+                # names and key words are shown in the question, example questions are not
+                if position <= len(page.keywords):
+                    display.setdefault(normalized, " ".join(phrase.split()))
+
+    clusters = {}
+    for phrase, codes in phrase_codes.items():
+        codes = list(dict.fromkeys(codes))
+        if 1 < len(codes) <= max_options:
+            clusters.setdefault(tuple(codes), []).append(phrase)
+
+    def question(phrases: list) -> str:
+        # the shortest key word is the most general wording of what the services have in common
+        shown = [phrase for phrase in phrases if phrase in display]
+        return QUESTION.format(phrase=display[min(shown, key=len)]) if shown else GENERIC_QUESTION
+
+    return [{"codes": list(codes), "phrases": phrases, "question": question(phrases)}
+            for codes, phrases in clusters.items()]
+
+
+def _edited_questions(path: str) -> dict:
+    """Questions of an existing artifact by their option codes, whatever catalog version it was built from."""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return {tuple(cluster["codes"]): cluster["question"] for cluster in json.load(file)["clusters"]}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def write_clarifications(pages: list, path: str, version: str, max_options: int = 5) -> list:
+    """
+    Write the clusters of a catalog atomically (temp file + rename). Returns them. A cluster with the same
+    options as one in the file being replaced keeps that one's (possibly edited) question.
+    """
+    edited = _edited_questions(path)
+    clusters = build_clusters(pages, max_options)
+    for cluster in clusters:
+        cluster["question"] = edited.get(tuple(cluster["codes"]), cluster["question"])
+    document = {"format": CLARIFICATIONS_FORMAT, "catalog_version": version, "clusters": clusters}
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".clarifications-",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(document, file, ensure_ascii=False, indent=1)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return clusters
+
+
+def read_clarifications(path: str, version: str) -> list:
+    """The clusters of a prebuilt artifact. Raises ValueError when it was built from another catalog version."""
+    with open(path, "r", encoding="utf-8") as file:
+        document = json.load(file)
+    if document.get("format") != CLARIFICATIONS_FORMAT or document.get("catalog_version") != version:
+        raise ValueError(f"clarifications format {document.get('format')} of catalog {document.get('catalog_version')}")
+    return document["clusters"]
+
+
+class ClarificationIndex:
+    """Lookup of a query's cluster and the answer it gets."""
+
+    def __init__(self, clusters: list, pages_by_code: dict, max_extra_tokens: int = 2) -> None:
+        self.max_extra_tokens = max_extra_tokens
+        # clusters naming a service the catalog no longer has (a hand-edited artifact) are dropped
+        self.clusters = [cluster for cluster in clusters if all(code in pages_by_code for code in cluster["codes"])]
+        self.answers = [
+            json.dumps({"options": [{"code": code, "name": pages_by_code[code].name} for code in cluster["codes"]],
+                        "clarification_question": cluster["question"]}, ensure_ascii=False)
+            for cluster in self.clusters
+        ]
+        self.exact = {}
+        for cluster_id, cluster in enumerate(self.clusters):
+            for phrase in cluster["phrases"]:
+                self.exact[phrase] = cluster_id
+        # every multi-word catalog phrase, so that a query containing a longer phrase of a single service
+        # (None) is not taken for the cluster of a shared phrase it also contains
+        phrases = {normalize_text(phrase) for page in pages_by_code.values()
+                   for phrase in [page.name, *page.keywords, *page.examples]}
+        self.contained = [(frozenset(phrase.split()), len(phrase.split()), self.exact.get(phrase))
+                          for phrase in phrases if len(phrase.split()) > 1]
+        # what a pick of any service looks like to resolve_selection: a code, or a part of a name
+        self.codes = frozenset(pages_by_code)
+        self.names = "\n".join(normalize_text(page.name) for page in pages_by_code.values())
+
+    def may_select(self, query: str) -> bool:
+        """
+        False when `query` cannot pick an option of a previous answer whatever the session holds - it has no
+        service code as a word and is not a part of a service's name - so the session is not needed first.
+        """
+        normalized = normalize_text(query)
+        return bool(normalized) and (not self.codes.isdisjoint(normalized.split()) or normalized in self.names)
+
+    def match(self, query: str):
+        """The options answer (JSON) of the query's cluster, or None."""
+        normalized = normalize_text(query)
+        if not normalized:
+            return None
+        cluster_id = self.exact.get(normalized)
+        if cluster_id is not None:
+            return self.answers[cluster_id]
+
+        tokens = set(normalized.split())
+        best, best_length = set(), 0
+        for trigger, length, cluster_id in self.contained:
+            if len(tokens) - length > self.max_extra_tokens or length < best_length or not trigger <= tokens:
+                continue
+            if length > best_length:
+                best, best_length = set(), length
+            best.add(cluster_id)
+        # the longest phrase decides; a single service's phrase, or shared phrases of the same length in
+        # different clusters, leave it to the other tiers
+        cluster_id = best.pop() if len(best) == 1 else None
+        return self.answers[cluster_id] if cluster_id is not None else None
+
+
+def offered_codes(messages: list) -> list:
+    """Codes of the options in the last assistant message (full or compact), [] when it offered none."""
+    for message in reversed(messages):
+        if message.get("role") != "assistant":
+            continue
+        content = str(message.get("content", ""))
+        return CODE_PATTERN.findall(content) if '"options"' in content else []
+    return []
+
+
+def resolve_selection(query: str, messages: list, pages_by_code: dict):
+    """
+    The ServicePage the user picked from the options of the previous answer, or None when the query does not
+    name exactly one of them: its code as a word of the query, its name as the whole query, or else the
+    single option whose name contains the query (MIN_PARTIAL_NAME characters or more). A longer query that
+    mentions an option's name is a new question, left to the other tiers.
+    """
+    codes = [code for code in dict.fromkeys(offered_codes(messages)) if code in pages_by_code]
+    if not codes:
+        return None
+    normalized = normalize_text(query)
+    if not normalized:
+        return None
+
+    words = set(normalized.split())
+    picked = [code for code in codes if code in words]
+    if len(picked) == 1:
+        return pages_by_code[picked[0]]
+
+    names = {code: normalize_text(pages_by_code[code].name) for code in codes}
+    picked = [code for code in codes if names[code] == normalized]
+    if not picked and len(normalized) >= MIN_PARTIAL_NAME:
+        picked = [code for code in codes if normalized in names[code]]
+    return pages_by_code[picked[0]] if len(picked) == 1 else None
+
+
+if __name__ == "__main__":
+    from config import PAGES_CLARIFICATION
+    from utils.catalog import load_catalog
+
+    parser = argparse.ArgumentParser(description="Cluster the catalog's services by shared phrases and "
+                                                 "precompute their clarification questions")
+    parser.add_argument("--catalog", "-C", type=str, default="utils/catalog.json")
+    parser.add_argument("--output", "-O", type=str, default=None, help="defaults to <catalog>.clarifications.json")
+    parser.add_argument("--max-options", type=int, default=PAGES_CLARIFICATION["MAX_OPTIONS"])
+    args = parser.parse_args()
+
+    version, services = load_catalog(args.catalog)
+    output = args.output or default_clarifications_path(args.catalog)
+    clusters = write_clarifications(services, output, version, args.max_options)
+    print(f"{output}: catalog {version}, {len(clusters)} clusters of "
+          f"{len({code for cluster in clusters for code in cluster['codes']})} services")
@@ -0,0 +1,109 @@
+"""
+Compact conversation state for the session store and the prompt.
+
+An assistant answer carries the full option list (codes and names) and the clarification text, and the
+memory window used to re-send it verbatim on every later turn. Later turns only need what was offered:
+a compact assistant turn keeps the service code(s) and a shortened question or message, in the same JSON
+shape the model answers with. Turns older than the MEMORY_K window are not sent as messages at all; the
+codes they offered collapse into one summary line, so a follow-up can still refer back to them. Finally
+the history is held to HISTORY_TOKENS by moving its oldest turns into the summary.
+
+Compaction is idempotent, so sessions stored before it (full answers) are compacted when they are read.
+"""
+import json
+import re
+from dataclasses import dataclass
+
+from config import PAGES_CONVERSATION, PAGES_GATEWAY
+
+CODE_PATTERN = re.compile(r'"code"\s*:\s*"?(\w+)')
+
+
+@dataclass(frozen=True)
+class Conversation:
+    """The session history as it goes into a prompt."""
+    messages: list  # recent user / compact assistant messages, oldest first
+    summary_codes: list  # codes offered in older turns, most recent last
+
+    @property
+    def codes(self) -> list:
+        """Every service code under discussion, the most recent first."""
+        recent = [code for message in reversed(self.messages) if message["role"] == "assistant"
+                  for code in CODE_PATTERN.findall(message["content"])]
+        return list(dict.fromkeys(recent + self.summary_codes[::-1]))
+
+    def prompt_messages(self) -> list:
+        """The summary (as a developer message, when there is one) followed by the recent messages."""
+        if not self.summary_codes:
+            return list(self.messages)
+        summary = "**Earlier in this conversation:** services offered - " + ", ".join(self.summary_codes)
+        return [{"role": "developer", "content": summary}, *self.messages]
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / PAGES_GATEWAY["CHARS_PER_TOKEN"]) + 1
+
+
+def _shorten(text, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def compact_answer(answer: str) -> str:
+    """The part of an assistant answer later turns need: its code(s) and a shortened question or message."""
+    limit = PAGES_CONVERSATION["TEXT_CHARS"]
+    try:
+        parsed = json.loads(answer, strict=False)  # streamed answers may carry raw newlines
+    except (TypeError, ValueError):
+        return _shorten(answer, limit)  # greetings and other free-text answers
+    if not isinstance(parsed, dict):
+        return _shorten(answer, limit)
+
+    if "code" in parsed:
+        compact = {"code": str(parsed["code"])}
+    elif isinstance(parsed.get("options"), list):
+        compact = {"options": [{"code": str(option["code"])} for option in parsed["options"]
+                               if isinstance(option, dict) and option.get("code")]}
+        if parsed.get("clarification_question"):
+            compact["clarification_question"] = _shorten(parsed["clarification_question"], limit)
+    elif "error_message" in parsed:
+        compact = {"error_message": _shorten(parsed["error_message"], limit)}
+    else:
+        return _shorten(answer, limit)
+    return json.dumps(compact, ensure_ascii=False)
+
+
+def compact_turn(user_input: str, answer: str) -> list:
+    return [
+        {"role": "user", "content": user_input},
+        {"role": "assistant", "content": compact_answer(answer)}
+    ]
+
+
+def build_conversation(messages: list, window: int) -> Conversation:
+    """
+    The last `window` messages, compacted, within the HISTORY_TOKENS budget; the codes offered in the
+    messages before them (at most SUMMARY_CODES, the most recent ones) become the summary.
+    """
+    messages = [
+        {"role": message["role"],
+         "content": compact_answer(str(message["content"])) if message["role"] == "assistant"
+         else _shorten(message["content"], PAGES_CONVERSATION["USER_CHARS"])}
+        for message in messages if message["role"] in ("user", "assistant")
+    ]
+    recent = messages[-window:] if window else []
+    older = messages[:len(messages) - len(recent)]
+
+    budget = PAGES_CONVERSATION["HISTORY_TOKENS"]
+    tokens = [estimate_tokens(message["content"]) for message in recent]
+    while recent and sum(tokens) > budget:
+        older.append(recent.pop(0))
+        tokens.pop(0)
+    # never start the window with an answer whose question was summarized away
+    if recent and recent[0]["role"] == "assistant":
+        older.append(recent.pop(0))
+
+    codes = [code for message in older if message["role"] == "assistant"
+             for code in CODE_PATTERN.findall(message["content"])]
+    codes = list(dict.fromkeys(reversed(codes)))[:PAGES_CONVERSATION["SUMMARY_CODES"]][::-1]
+    return Conversation(recent, codes)
@@ -0,0 +1,235 @@
+"""
+Nearest-neighbour tier over the catalog's example questions, key words and service names.
+
+The phrases are embedded offline (`python -m utils.embedding_index`, or `build_catalog --embeddings`) into a
+float32 matrix saved as .npy next to the catalog artifact, plus a JSON sidecar with the catalog version it
+was built from, the row range of every service and the embedder's IDF weights. Workers memory-map the
+matrix on the first search, so startup does not pay for it and forked workers share the page cache.
+
+Vectors are hashed TF-IDF bags of word stems and character n-grams, L2-normalized. They are computed
+locally, so a query is embedded and searched without a network call. Search is brute force - one
+matrix-vector product and a per-service max, tens of microseconds for the ~1000 catalog phrases; an IVF
+index only pays off at far larger catalogs.
+
+Usage (from the repo root):
+    python -m utils.embedding_index --catalog utils/catalog.json
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from utils.hebrew_text import normalize_text, strip_prefixes
+
+INDEX_FORMAT = 1
+NGRAMS = (3, 4)
+
+
+def index_paths(path: str) -> tuple:
+    """(matrix .npy, metadata .json) of an index path given with or without its .npy extension."""
+    base = path[:-4] if path.endswith(".npy") else path
+    return base + ".npy", base + ".json"
+
+
+def default_index_path(catalog_path: str) -> str:
+    return os.path.splitext(catalog_path)[0] + ".embeddings.npy"
+
+
+@lru_cache(maxsize=65536)
+def _token_buckets(token: str, dim: int) -> tuple:
+    """
+    (columns, signs) arrays of the hashed features of a normalized token: the token, its prefix-stripped stems and
+    its character n-grams. Cached, since queries reuse a small vocabulary. crc32 is stable across processes,
+    unlike hash().
+    """
+    features = ["w:" + token, *("w:" + stem for stem in strip_prefixes(token))]
+    padded = f" {token} "
+    for n in NGRAMS:
+        features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    digests = np.array([zlib.crc32(feature.encode("utf-8")) for feature in features], dtype=np.uint64)
+    return digests % dim, np.where(digests & 0x80000000, 1.0, -1.0)
+
+
+class HashingEmbedder:
+    """Hashed TF-IDF vectors: sublinear (log1p) signed bucket counts, times the bucket's IDF."""
+
+    def __init__(self, dim: int, idf=None) -> None:
+        self.dim = dim
+        self.idf = np.ones(dim, dtype=np.float32) if idf is None else np.asarray(idf, dtype=np.float32)
+
+    def _counts(self, text: str) -> np.ndarray:
+        """Signed feature counts per bucket."""
+        buckets = [_token_buckets(token, self.dim) for token in normalize_text(text).split()]
+        if not buckets:
+            return np.zeros(self.dim)
+        columns, signs = zip(*buckets)
+        return np.bincount(np.concatenate(columns), np.concatenate(signs), minlength=self.dim)
+
+    def fit(self, texts: list) -> "HashingEmbedder":
+        document_frequency = np.zeros(self.dim)
+        for text in texts:
+            document_frequency += self._counts(text) != 0
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self
+
+    def embed(self, text: str) -> np.ndarray:
+        counts = self._counts(text)
+        vector = (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32) * self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_many(self, texts: list) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self.embed(text)
+        return matrix
+
+
+def _phrases(page) -> list:
+    """The page's lookup phrases, de-duplicated by their normalized text."""
+    unique = {}
+    for phrase in [page.name, *page.keywords, *page.examples]:
+        normalized = normalize_text(phrase)
+        if normalized:
+            unique.setdefault(normalized, phrase)
+    return list(unique.values())
+
+
+def _replace(path: str, write) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".embeddings-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            write(file)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def build_embedding_index(pages: list, path: str, version: str, dim: int = 512) -> dict:
+    """
+    Embed every page's phrases and write the index atomically (matrix first, then the metadata that points
+    at it), so a worker never pairs a new matrix with old row ranges. Returns the metadata.
+    """
+    codes, offsets, texts = [], [], []
+    for page in pages:
+        phrases = _phrases(page)
+        if phrases:
+            codes.append(page.code)
+            offsets.append(len(texts))
+            texts.extend(phrases)
+
+    embedder = HashingEmbedder(dim).fit(texts)
+    matrix = embedder.embed_many(texts)
+    meta = {
+        "format": INDEX_FORMAT,
+        "catalog_version": version,
+        "dim": dim,
+        "rows": len(texts),
+        "codes": codes,
+        "offsets": offsets,
+        "idf": [round(float(weight), 6) for weight in embedder.idf],
+    }
+    matrix_path, meta_path = index_paths(path)
+    _replace(matrix_path, lambda file: np.save(file, matrix))
+    _replace(meta_path, lambda file: file.write(json.dumps(meta).encode("utf-8")))
+    return meta
+
+
+class EmbeddingIndex:
+    """
+    The memory-mapped index of one catalog snapshot, loaded on the first search.
+
+    An index that is missing, unreadable or built from another catalog version is logged once and
+    searches return nothing, so requests fall through to the model.
+    """
+
+    def __init__(self, path: str, catalog_version: str, threshold: float = 0.8, margin: float = 0.15) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.catalog_version = catalog_version
+        self.threshold = threshold
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.matrix = None
+        self.embedder = None
+        self.codes = []
+        self.offsets = None
+
+    def load(self) -> bool:
+        """Map the index (once). Returns whether it can be searched."""
+        if self._loaded:
+            return self.matrix is not None
+        with self._lock:
+            if not self._loaded:
+                try:
+                    self._load()
+                except (OSError, ValueError, KeyError) as e:
+                    self.logger.warning("Embedding index %s not used: %s", self.path, e)
+                self._loaded = True
+        return self.matrix is not None
+
+    def _load(self) -> None:
+        matrix_path, meta_path = index_paths(self.path)
+        with open(meta_path, "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        if meta.get("format") != INDEX_FORMAT:
+            raise ValueError(f"unsupported index format {meta.get('format')}")
+        if meta["catalog_version"] != self.catalog_version:
+            raise ValueError(f"built for catalog {meta['catalog_version']}, serving {self.catalog_version}")
+        matrix = np.load(matrix_path, mmap_mode="r")
+        if matrix.dtype != np.float32 or matrix.shape != (meta["rows"], meta["dim"]):
+            raise ValueError(f"matrix {matrix.dtype} {matrix.shape} does not match its metadata")
+        self.embedder = HashingEmbedder(meta["dim"], meta["idf"])
+        self.codes = meta["codes"]
+        self.offsets = np.asarray(meta["offsets"], dtype=np.intp)
+        # a plain ndarray view of the mapping - np.memmap wraps every result and costs more than the search
+        self.matrix = np.asarray(matrix)
+        self.logger.info("Embedding index %s mapped: %s phrases of %s services", matrix_path, meta["rows"],
+                         len(self.codes))
+
+    def search(self, query: str, k: int) -> list:
+        """Up to k (code, cosine similarity of the service's closest phrase) pairs, best first."""
+        if not self.load():
+            return []
+        vector = self.embedder.embed(query)
+        if not vector.any():
+            return []
+        scores = np.maximum.reduceat(self.matrix @ vector, self.offsets)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.codes[i], float(scores[i])) for i in top]
+
+    def decisive(self, candidates: list) -> bool:
+        """Whether the top candidate clears the threshold and leads the runner-up by the margin."""
+        if not candidates:
+            return False
+        runner_up = candidates[1][1] if len(candidates) > 1 else 0.0
+        return candidates[0][1] >= self.threshold and candidates[0][1] - runner_up >= self.margin
+
+
+if __name__ == "__main__":
+    from config import PAGES_EMBEDDINGS
+    from utils.catalog import load_catalog
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Embed the catalog's phrases into the nearest-neighbour index")
+    parser.add_argument("--catalog", "-C", type=str, default="utils/catalog.json")
+    parser.add_argument("--output", "-O", type=str, default=None, help="defaults to <catalog>.embeddings.npy")
+    parser.add_argument("--dim", type=int, default=PAGES_EMBEDDINGS["DIM"])
+    args = parser.parse_args()
+
+    version, services = load_catalog(args.catalog)
+    output = args.output or default_index_path(args.catalog)
+    meta = build_embedding_index(services, output, version, args.dim)
+    print(f"{output}: catalog {version}, {meta['rows']} phrases of {len(meta['codes'])} services, dim {meta['dim']}")
@@ -0,0 +1,8 @@
+"""
+Exceptions the app maps to responses. Kept apart from the modules that raise them, which import the client
+libraries (openai) - main imports this module at startup, the clients only on first use.
+"""
+
+
+class GatewayOverloaded(Exception):
+    """No slot became free within the queue timeout - the request is shed instead of waiting longer."""
@@ -0,0 +1,135 @@
+import threading
+from collections import Counter, defaultdict
+
+from utils.hebrew_text import normalize_text
+
+
+def _trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FastPathClassifier:
+    """
+    Deterministic lookup of the catalog's example questions, key words and service names.
+
+    A query is answered without the model when its normalized text equals a catalog phrase that belongs
+    to exactly one service, or when it is a near-exact (character trigram Dice) match of such a phrase
+    that clears `threshold` and beats the best phrase of any other service by at least `margin`.
+    """
+
+    def __init__(self, pages: list, threshold: float = 0.9, margin: float = 0.1, min_fuzzy_length: int = 6) -> None:
+        self.threshold = threshold
+        self.margin = margin
+        self.min_fuzzy_length = min_fuzzy_length
+        self.pages_by_code = {page.code: page for page in pages}
+
+        phrase_codes = defaultdict(set)
+        for page in pages:
+            for phrase in [page.name, *page.keywords, *page.examples]:
+                normalized = normalize_text(phrase)
+                if normalized:
+                    phrase_codes[normalized].add(page.code)
+        self.exact = dict(phrase_codes)
+
+        self.phrases = list(self.exact)
+        self.gram_index = defaultdict(list)
+        self.gram_counts = []
+        for phrase_id, phrase in enumerate(self.phrases):
+            grams = _trigrams(phrase)
+            self.gram_counts.append(len(grams))
+            for gram in grams:
+                self.gram_index[gram].append(phrase_id)
+
+    def to_data(self) -> dict:
+        """The phrase and trigram tables as plain data (no pages) - the prebuilt artifact of utils/catalog_store.py."""
+        return {"exact": {phrase: sorted(codes) for phrase, codes in self.exact.items()},
+                "gram_index": self.gram_index, "gram_counts": self.gram_counts}
+
+    @classmethod
+    def from_data(cls, pages: list, data: dict, threshold: float = 0.9, margin: float = 0.1,
+                  min_fuzzy_length: int = 6) -> "FastPathClassifier":
+        """The classifier of `pages` from the to_data() of the same pages."""
+        classifier = cls.__new__(cls)
+        classifier.threshold = threshold
+        classifier.margin = margin
+        classifier.min_fuzzy_length = min_fuzzy_length
+        classifier.pages_by_code = {page.code: page for page in pages}
+        classifier.exact = {phrase: set(codes) for phrase, codes in data["exact"].items()}
+        if any(code not in classifier.pages_by_code for codes in classifier.exact.values() for code in codes):
+            raise ValueError("fast path index names services the catalog does not have")
+        classifier.phrases = list(classifier.exact)
+        classifier.gram_index = data["gram_index"]
+        classifier.gram_counts = data["gram_counts"]
+        return classifier
+
+    def match(self, query: str):
+        """Return (ServicePage, score) for a confident single-service hit, otherwise None."""
+        normalized = normalize_text(query)
+        if not normalized:
+            return None
+
+        codes = self.exact.get(normalized)
+        if codes is not None:
+            return (self.pages_by_code[next(iter(codes))], 1.0) if len(codes) == 1 else None
+
+        if len(normalized) < self.min_fuzzy_length:
+            return None
+
+        grams = _trigrams(normalized)
+        overlaps = Counter()
+        for gram in grams:
+            overlaps.update(self.gram_index.get(gram, ()))
+        # Only phrases that could reach (threshold - margin) matter for the decision: Dice >= t implies
+        # overlap >= t * |query| / (2 - t), which prunes most of the template-like example questions.
+        floor = self.threshold - self.margin
+        min_overlap = floor * len(grams) / (2 - floor)
+        best = {}
+        for phrase_id, overlap in overlaps.items():
+            if overlap < min_overlap:
+                continue
+            score = 2 * overlap / (len(grams) + self.gram_counts[phrase_id])
+            for code in self.exact[self.phrases[phrase_id]]:
+                best[code] = max(score, best.get(code, 0.0))
+        if not best:
+            return None
+
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        code, score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        if score >= self.threshold and score - runner_up >= self.margin:
+            return self.pages_by_code[code], score
+        return None
+
+
+class FastPathStats:
+    """Per source_system hit rate and latency of the fast path."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {"requests": 0, "hits": 0, "lookup_seconds": 0.0, "hit_response_seconds": 0.0})
+
+    def record_lookup(self, source_system: int, hit: bool, seconds: float) -> None:
+        with self._lock:
+            stats = self._stats[source_system]
+            stats["requests"] += 1
+            stats["hits"] += int(hit)
+            stats["lookup_seconds"] += seconds
+
+    def record_hit_response(self, source_system: int, seconds: float) -> None:
+        with self._lock:
+            self._stats[source_system]["hit_response_seconds"] += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                str(source_system): {
+                    "requests": stats["requests"],
+                    "hits": stats["hits"],
+                    "hit_rate": stats["hits"] / stats["requests"] if stats["requests"] else 0.0,
+                    "avg_lookup_ms": stats["lookup_seconds"] / stats["requests"] * 1000 if stats["requests"] else 0.0,
+                    "avg_hit_response_ms": stats["hit_response_seconds"] / stats["hits"] * 1000 if stats["hits"] else 0.0,
+                }
+                for source_system, stats in self._stats.items()
+            }
+
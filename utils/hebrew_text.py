@@ -0,0 +1,48 @@
+import re
+import unicodedata
+
+# Cantillation marks and niqqud (U+0591-U+05C7), excluding the maqaf / sof pasuq punctuation handled below
+_NIQQUD = re.compile("[\u0591-\u05BD\u05BF\u05C1\u05C2\u05C4\u05C5\u05C7]")
+_FINAL_LETTERS = str.maketrans({"ך": "כ", "ם": "מ", "ן": "נ", "ף": "פ", "ץ": "צ"})
+_NON_WORD = re.compile(r"[^\w]+")
+# Ktiv male / haser spelling variants ("התחייבות" vs "התחיבות") collapse to a single letter
+_DOUBLED_LETTERS = re.compile(r"([וי])\1+")
+
+# One-letter proclitics (ו, ה, ב, כ, ל, מ, ש) and their common two-letter combinations
+PREFIXES = ("וכש", "ושה", "וה", "וב", "ול", "ומ", "וש", "וכ", "שה", "שב", "של", "שמ", "כש", "לכ", "מה", "בה", "לה", "כה",
+            "ו", "ה", "ב", "כ", "ל", "מ", "ש")
+MIN_STEM_LENGTH = 2
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case, strip niqqud and punctuation, unify final letters and collapse whitespace."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    text = _NIQQUD.sub("", text)
+    text = text.translate(_FINAL_LETTERS)
+    text = _DOUBLED_LETTERS.sub(r"\1", text)
+    text = _NON_WORD.sub(" ", text).replace("_", " ")
+    return " ".join(text.split())
+
+
+def tokenize(text: str) -> list:
+    return normalize_text(text).split()
+
+
+def strip_prefixes(token: str) -> list:
+    """Return the candidate stems of a token after removing Hebrew proclitics (longest prefix first)."""
+    stems = []
+    for prefix in PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= MIN_STEM_LENGTH:
+            stems.append(token[len(prefix):])
+    return stems
+
+
+def index_terms(text: str) -> list:
+    """Tokens of text plus their prefix-stripped variants, used both for indexing and querying."""
+    terms = []
+    for token in tokenize(text):
+        terms.append(token)
+        terms.extend(strip_prefixes(token))
+    return terms
@@ -0,0 +1,311 @@
+"""
+Admission control in front of Azure OpenAI for the async path.
+
+Every model call of a worker goes through one LLMGateway, which decides when it may be sent:
+
+* budget - a call is admitted once a deployment has budget for it: token buckets for each deployment's
+  requests and tokens per minute (kept by the router, charged to the deployment a call is sent to), so
+  bursts are smoothed out locally instead of being turned into 429s by Azure;
+* concurrency - an AIMD cap on calls in flight: +1 per window of successful calls, halved on a 429,
+  cut gently when calls get slower than LATENCY_TARGET;
+* priority - waiting calls are admitted by source_system priority, then in arrival order;
+* single-flight - identical deterministic requests in flight at the same time share one call.
+
+429s are retried here (never by the SDK): the caller releases its slot, every caller pauses for the
+Retry-After the service asked for, and the request queues again. A request that cannot get a slot within
+QUEUE_TIMEOUT is shed with GatewayOverloaded rather than queued for ever.
+"""
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter
+
+import openai
+
+from config import PAGES_GATEWAY
+from utils import metrics
+from utils.errors import GatewayOverloaded
+
+# errors worth another attempt - anything else (bad request, auth, content filter) fails immediately
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError,
+                    openai.InternalServerError)
+
+
+def retry_after(error: Exception):
+    """Seconds the service asked us to wait, from the Retry-After(-ms) headers of a rate-limit response."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        if "retry-after-ms" in response.headers:
+            return float(response.headers["retry-after-ms"]) / 1000
+        if "retry-after" in response.headers:
+            return float(response.headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def worker_count() -> int:
+    """Processes serving the app side by side - gunicorn_conf.py exports its worker count as WEB_CONCURRENCY."""
+    return max(int(os.getenv("WEB_CONCURRENCY") or 1), 1)
+
+
+def budget_buckets(rpm: float = None, tpm: float = None) -> tuple:
+    """
+    (requests, tokens) buckets of this worker's share of a deployment's quota - every worker keeps its own,
+    so each gets 1/worker_count() of it. None for a budget that is not set.
+    """
+    rpm = rpm if rpm is not None else PAGES_GATEWAY["RPM"]
+    tpm = tpm if tpm is not None else PAGES_GATEWAY["TPM"]
+    workers = worker_count()
+    return (TokenBucket(rpm / workers, PAGES_GATEWAY["BURST_SECONDS"]) if rpm else None,
+            TokenBucket(tpm / workers, PAGES_GATEWAY["BURST_SECONDS"]) if tpm else None)
+
+
+def estimate_call_tokens(params: dict) -> int:
+    """Tokens a chat-completion call is budgeted for before its usage is known: prompt estimate + max_tokens."""
+    chars = sum(len(message.get("content") or "") for message in params.get("messages", []))
+    return int(chars / PAGES_GATEWAY["CHARS_PER_TOKEN"]) + (params.get("max_tokens") or 0)
+
+
+class TokenBucket:
+    """`per_minute` units per minute, of which at most `burst_seconds` worth can be spent at once."""
+
+    def __init__(self, per_minute: float, burst_seconds: float) -> None:
+        self.rate = per_minute / 60
+        self.capacity = self.rate * burst_seconds
+        self.available = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float, reserved: float = 0) -> float:
+        """Seconds until `amount` can be taken, 0 when it can be taken now - after `reserved`, promised already."""
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+        # a request larger than the burst would never fit - it only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        available = self.available - reserved
+        return 0.0 if available >= amount else (amount - available) / self.rate
+
+    def take(self, amount: float) -> None:
+        # may go negative when a response used more than was reserved - later requests pay the debt
+        self.available = min(self.capacity, self.available - amount)
+
+
+class AdaptiveLimit:
+    """Additive-increase / multiplicative-decrease cap on the calls in flight."""
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float,
+                 throttle_backoff: float, latency_backoff: float, cooldown: float) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.throttle_backoff = throttle_backoff
+        self.latency_backoff = latency_backoff
+        self.cooldown = cooldown
+        self._decreased_at = 0.0
+
+    @property
+    def slots(self) -> int:
+        return max(int(self.limit), self.minimum)
+
+    def on_success(self, latency: float, now: float) -> None:
+        if self.latency_target and latency > self.latency_target:
+            self._decrease(self.latency_backoff, now)
+        else:
+            # +1 after `limit` successes, i.e. about one step per round of full concurrency
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_throttled(self, now: float) -> None:
+        self._decrease(self.throttle_backoff, now)
+
+    def _decrease(self, factor: float, now: float) -> None:
+        # the calls in flight when the service pushed back all report it - cut once per congestion event
+        if now - self._decreased_at < self.cooldown:
+            return
+        self.limit = max(self.minimum, self.limit * factor)
+        self._decreased_at = now
+
+
+class LLMGateway:
+    """
+    Admits chat-completion calls under a rate budget, an adaptive concurrency cap and per-source priority.
+
+    Must be created and used on the event loop of the worker that owns it (one gateway per worker).
+    `budget` (the router) tells how long a call has to wait for a deployment with budget for it; the
+    deployment the call is sent to is charged when it is sent, so calls admitted together are counted
+    together. Streaming calls are admitted the same way but hold their slot only until the stream is opened,
+    so for them the cap limits stream starts and the latency signal is the time to the first byte.
+    """
+
+    def __init__(self, budget=None) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.budget = budget
+        self.limit = AdaptiveLimit(
+            initial=PAGES_GATEWAY["INITIAL_CONCURRENCY"],
+            minimum=PAGES_GATEWAY["MIN_CONCURRENCY"],
+            maximum=PAGES_GATEWAY["MAX_CONCURRENCY"],
+            latency_target=PAGES_GATEWAY["LATENCY_TARGET"],
+            throttle_backoff=PAGES_GATEWAY["THROTTLE_BACKOFF"],
+            latency_backoff=PAGES_GATEWAY["LATENCY_BACKOFF"],
+            cooldown=PAGES_GATEWAY["DECREASE_COOLDOWN"]
+        )
+        self.in_flight = 0
+        self.stats = Counter()
+        self._waiting = []  # heap of [priority, arrival, tokens, future]
+        self._arrivals = itertools.count()
+        self._paused_until = 0.0
+        self._wakeup = None
+        self._flights = {}
+        # admitted calls not sent yet - the budget is charged when they are, until then they are counted here
+        self._unsent = 0
+        self._unsent_tokens = 0
+
+    def priority(self, source_system) -> int:
+        return PAGES_GATEWAY["PRIORITIES"].get(source_system, PAGES_GATEWAY["DEFAULT_PRIORITY"])
+
+    async def complete(self, create, params: dict, source_system=None):
+        """`await create(**params)` (a chat.completions.create) once the gateway admits it."""
+        key = self._flight_key(params)
+        if key is None:
+            return await self._call(create, params, source_system)
+
+        flight = self._flights.get(key)
+        if flight is None:
+            # the call runs in its own task so a disconnecting leader does not cancel it for the others
+            flight = asyncio.ensure_future(self._call(create, params, source_system))
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._land(key, done))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(flight)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "concurrency_limit": round(self.limit.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": sum(not entry[3].done() for entry in self._waiting),
+            "paused_seconds": round(max(self._paused_until - now, 0.0), 3),
+            **{event: self.stats[event] for event in ("calls", "throttled", "retried", "coalesced", "shed")},
+        }
+
+    def _flight_key(self, params: dict):
+        if not PAGES_GATEWAY["SINGLE_FLIGHT"] or params.get("stream") or params.get("temperature", 1) > 0:
+            return None
+        canonical = json.dumps(params, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _land(self, key: str, flight: asyncio.Future) -> None:
+        self._flights.pop(key, None)
+        if not flight.cancelled():
+            flight.exception()  # retrieved here, so an error nobody waits for any more is not reported as lost
+
+    async def _call(self, create, params: dict, source_system):
+        priority = self.priority(source_system)
+        estimate = estimate_call_tokens(params)
+        attempts = PAGES_GATEWAY["MAX_ATTEMPTS"]
+        for attempt in range(1, attempts + 1):
+            await self._acquire(priority, estimate)
+            self._sent(estimate)
+            self.stats["calls"] += 1
+            started = time.monotonic()
+            try:
+                response = await create(**params)
+            except RETRYABLE_ERRORS as e:
+                self._release()
+                if isinstance(e, openai.RateLimitError):
+                    self._throttled(e)
+                if attempt == attempts:
+                    raise
+                self.stats["retried"] += 1
+                self.logger.warning("Model call attempt %s failed (%s), retrying", attempt, type(e).__name__)
+                if not isinstance(e, openai.RateLimitError):
+                    await asyncio.sleep(random.uniform(0, min(PAGES_GATEWAY["BACKOFF_MAX"],
+                                                              PAGES_GATEWAY["BACKOFF_BASE"] * 2 ** (attempt - 1))))
+                continue
+            except BaseException:
+                self._release()
+                raise
+
+            self._release(time.monotonic() - started)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                metrics.record_usage(usage)
+            return response
+
+    async def _acquire(self, priority: int, tokens: int) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, [priority, next(self._arrivals), tokens, future])
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, PAGES_GATEWAY["QUEUE_TIMEOUT"])
+        except asyncio.TimeoutError:
+            self.stats["shed"] += 1
+            raise GatewayOverloaded(f"no model call slot within {PAGES_GATEWAY['QUEUE_TIMEOUT']}s")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._sent(tokens)
+                self._release()  # admitted just as the caller went away
+            raise
+
+    def _sent(self, tokens: int) -> None:
+        self._unsent -= 1
+        self._unsent_tokens -= tokens
+
+    def _release(self, latency: float = None) -> None:
+        self.in_flight -= 1
+        if latency is not None:
+            self.limit.on_success(latency, time.monotonic())
+        self._dispatch()
+
+    def _throttled(self, error: Exception) -> None:
+        now = time.monotonic()
+        self.stats["throttled"] += 1
+        self.limit.on_throttled(now)
+        pause = retry_after(error)
+        if pause is None:
+            pause = PAGES_GATEWAY["RETRY_PAUSE"]
+        self._paused_until = max(self._paused_until, now + pause)
+        self.logger.warning("Azure OpenAI rate limited, concurrency cap %.1f, pausing %.2fs",
+                            self.limit.limit, self._paused_until - now)
+
+    def _dispatch(self) -> None:
+        """Admit waiting calls, best priority first, while slots and budget allow."""
+        now = time.monotonic()
+        while self._waiting and self.in_flight < self.limit.slots:
+            _, _, tokens, future = self._waiting[0]
+            if future.done():  # timed out or cancelled while waiting
+                heapq.heappop(self._waiting)
+                continue
+            wait = max(self._paused_until - now,
+                       self.budget.wait_time(tokens, now, self._unsent, self._unsent_tokens)
+                       if self.budget is not None else 0.0)
+            if wait > 0:
+                self._wake_in(wait)
+                return
+            heapq.heappop(self._waiting)
+            self._unsent += 1
+            self._unsent_tokens += tokens
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _wake_in(self, seconds: float) -> None:
+        loop = asyncio.get_running_loop()
+        when = loop.time() + seconds
+        if self._wakeup is not None:
+            if self._wakeup.when() <= when:
+                return
+            self._wakeup.cancel()
+        self._wakeup = loop.call_at(when, self._wake)
+
+    def _wake(self) -> None:
+        self._wakeup = None
+        self._dispatch()
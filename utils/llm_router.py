@@ -0,0 +1,227 @@
+"""
+Routing of model calls over several Azure OpenAI deployments (e.g. the same model in two regions).
+
+Each deployment keeps a latency EWMA, an error-rate EWMA and the calls it has in flight. A call goes to
+the deployment with the lowest score, latency EWMA x (in flight + 1) x (1 + ERROR_PENALTY x error rate),
+so a region that slows down or fails loses traffic within a few calls. FAILURES_TO_EJECT consecutive
+failures, or a 429, take a deployment out of rotation for a while; an idle deployment is probed again
+after PROBE_SECONDS so a recovered region wins its traffic back.
+
+Failover is explicit instead of the SDK's blind retries against the same endpoint: a retryable error
+moves the call to the next deployment at once. With hedging on, a call still unanswered after the
+primary's recent p95 latency is duplicated to the next deployment and the first valid answer wins;
+at most HEDGE_BUDGET of the calls are hedged. Streams fail over but are never hedged.
+
+With the gateway on, every deployment has its own rate budget (this worker's share of its quota) and every
+call sent - primary, hedge or failover - is charged to the deployment it goes to. Deployments out of budget
+rank after the others, and a hedge is only sent to a deployment with budget left.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from collections import Counter, deque
+
+import openai
+
+from config import PAGES_ROUTER
+from utils import metrics
+from utils.llm_gateway import RETRYABLE_ERRORS, estimate_call_tokens, retry_after
+
+
+class InvalidAnswer(Exception):
+    """A 200 response without answer content (e.g. filtered) - another deployment may still answer."""
+
+
+class Upstream:
+    """One Azure OpenAI deployment: its client, deployment name, health and (optional) rate budget."""
+
+    def __init__(self, name: str, client, model: str, budget: tuple = (None, None)) -> None:
+        self.name = name
+        self.client = client
+        self.model = model
+        self.requests, self.tokens = budget
+        self.latency = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.last_used = 0.0
+        self.recent = deque(maxlen=PAGES_ROUTER["LATENCY_WINDOW"])
+        self.stats = Counter()
+
+    def score(self, now: float) -> float:
+        if self.latency is None or now - self.last_used > PAGES_ROUTER["PROBE_SECONDS"]:
+            return 0.0
+        return self.latency * (self.in_flight + 1) * (1 + PAGES_ROUTER["ERROR_PENALTY"] * self.error_rate)
+
+    def wait_time(self, tokens: int, now: float, reserved: int = 0, reserved_tokens: int = 0) -> float:
+        """Seconds until this deployment's budget covers a call of `tokens`, after the `reserved` calls / tokens."""
+        return max(self.requests.wait_time(1, now, reserved) if self.requests else 0.0,
+                   self.tokens.wait_time(tokens, now, reserved_tokens) if self.tokens else 0.0)
+
+    def charge(self, tokens: int) -> None:
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+    def latency_quantile(self, q: float):
+        if len(self.recent) < PAGES_ROUTER["MIN_SAMPLES"]:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+    def record_success(self, latency: float) -> None:
+        alpha = PAGES_ROUTER["EWMA_ALPHA"]
+        self.latency = latency if self.latency is None else alpha * latency + (1 - alpha) * self.latency
+        self.error_rate *= 1 - alpha
+        self.recent.append(latency)
+        self.failures = 0
+        self.stats["ok"] += 1
+
+    def record_failure(self, error: Exception, now: float) -> None:
+        alpha = PAGES_ROUTER["EWMA_ALPHA"]
+        self.error_rate = alpha + (1 - alpha) * self.error_rate
+        self.failures += 1
+        self.stats["failed"] += 1
+        if isinstance(error, openai.RateLimitError):
+            # this deployment's quota is spent - the others may still have some
+            pause = retry_after(error)
+            self.ejected_until = max(self.ejected_until, now + (pause if pause is not None else 1.0))
+        elif self.failures >= PAGES_ROUTER["FAILURES_TO_EJECT"]:
+            self.ejected_until = now + PAGES_ROUTER["EJECT_SECONDS"]
+
+    def snapshot(self, now: float) -> dict:
+        p95 = self.latency_quantile(0.95)
+        return {
+            "model": self.model,
+            "latency_ewma_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 4),
+            "in_flight": self.in_flight,
+            "requests_available": round(self.requests.available, 1) if self.requests else None,
+            "tokens_available": round(self.tokens.available) if self.tokens else None,
+            "ejected_seconds": round(max(self.ejected_until - now, 0.0), 3),
+            **self.stats,
+        }
+
+
+class LLMRouter:
+    """Sends chat-completion calls to the healthiest deployment, with failover and optional hedging."""
+
+    def __init__(self, upstreams: list, hedge: bool = None) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.upstreams = upstreams
+        self.hedge = PAGES_ROUTER["HEDGE"] if hedge is None else hedge
+        self.stats = Counter()
+
+    def ranked(self, tokens: int = 0) -> list:
+        """
+        Deployments in order of preference: those with budget for a call of `tokens` first, then those out of
+        budget; ejected ones last, soonest back first, as a last resort.
+        """
+        now = time.monotonic()
+        healthy = [upstream for upstream in self.upstreams if upstream.ejected_until <= now]
+        ejected = [upstream for upstream in self.upstreams if upstream.ejected_until > now]
+        return (sorted(healthy, key=lambda upstream: (upstream.wait_time(tokens, now) > 0, upstream.score(now)))
+                + sorted(ejected, key=lambda upstream: upstream.ejected_until))
+
+    def wait_time(self, tokens: int, now: float, reserved: int = 0, reserved_tokens: int = 0) -> float:
+        """
+        Seconds until a deployment in rotation has budget for a call of `tokens`, after the `reserved` calls /
+        tokens admitted by the gateway but not sent yet (they may go to any of them).
+        """
+        healthy = [upstream for upstream in self.upstreams if upstream.ejected_until <= now] or self.upstreams
+        return min(upstream.wait_time(tokens, now, reserved, reserved_tokens) for upstream in healthy)
+
+    async def create(self, **params):
+        """chat.completions.create over the deployments (`model` is set per deployment)."""
+        self.stats["calls"] += 1
+        estimate = estimate_call_tokens(params)
+        ranked = self.ranked(estimate)
+        candidates = iter(ranked)
+        hedge_after = self._hedge_delay(params, ranked[0])
+        hedged = False
+        calls = {}
+        last_error = None
+        try:
+            primary = next(candidates)
+            calls[self._start(primary, params, estimate)] = primary
+            while calls:
+                done, _ = await asyncio.wait(calls, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # the primary is slower than usual - race it against the next deployment, if it has budget
+                    hedge_after = None
+                    upstream = next(candidates, None)
+                    if upstream is not None and upstream.wait_time(estimate, time.monotonic()) == 0:
+                        hedged = True
+                        self.stats["hedged"] += 1
+                        calls[self._start(upstream, params, estimate, hedge=True)] = upstream
+                    elif upstream is not None:
+                        candidates = itertools.chain([upstream], candidates)  # kept for a failover
+                    continue
+                for call in done:
+                    upstream = calls.pop(call)
+                    error = call.exception()
+                    if error is None:
+                        if upstream is not primary:
+                            self.stats["hedge_won" if hedged else "failed_over"] += 1
+                        return call.result()
+                    if not isinstance(error, (*RETRYABLE_ERRORS, InvalidAnswer)):
+                        raise error
+                    last_error = error
+                    self.logger.warning("Deployment %s failed (%s)", upstream.name, type(error).__name__)
+                if not calls:
+                    upstream = next(candidates, None)
+                    if upstream is not None:
+                        calls[self._start(upstream, params, estimate)] = upstream
+            raise last_error
+        finally:
+            for call in calls:
+                call.cancel()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "hedge": self.hedge,
+            **self.stats,
+            "deployments": {upstream.name: upstream.snapshot(now) for upstream in self.upstreams},
+        }
+
+    def _hedge_delay(self, params: dict, primary: Upstream):
+        if not self.hedge or params.get("stream") or len(self.upstreams) < 2:
+            return None
+        if self.stats["hedged"] >= PAGES_ROUTER["HEDGE_BUDGET"] * self.stats["calls"]:
+            return None
+        delay = primary.latency_quantile(PAGES_ROUTER["HEDGE_QUANTILE"])
+        if delay is None:
+            delay = PAGES_ROUTER["HEDGE_DELAY"]
+        return max(delay, PAGES_ROUTER["HEDGE_MIN_DELAY"])
+
+    def _start(self, upstream: Upstream, params: dict, estimate: int, hedge: bool = False) -> asyncio.Task:
+        upstream.in_flight += 1
+        upstream.last_used = time.monotonic()
+        upstream.charge(estimate)
+        return asyncio.ensure_future(self._send(upstream, params, estimate, hedge))
+
+    async def _send(self, upstream: Upstream, params: dict, estimate: int, hedge: bool = False):
+        if hedge:
+            metrics.count_llm_hedge()
+        started = time.monotonic()
+        try:
+            response = await upstream.client.chat.completions.create(**{**params, "model": upstream.model})
+            if not params.get("stream") and not (response.choices and response.choices[0].message.content):
+                raise InvalidAnswer(f"deployment {upstream.name} returned no answer content")
+        except (*RETRYABLE_ERRORS, InvalidAnswer) as e:
+            upstream.record_failure(e, time.monotonic())
+            raise
+        finally:
+            upstream.in_flight -= 1
+        usage = getattr(response, "usage", None)
+        if usage is not None and upstream.tokens is not None:
+            # may go negative when the call used more than was reserved
+            upstream.tokens.take(usage.total_tokens - estimate)
+        # a stream is timed to its first byte
+        upstream.record_success(time.monotonic() - started)
+        return response
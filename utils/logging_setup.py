@@ -0,0 +1,143 @@
+"""
+Non-blocking logging for the service.
+
+Request code only builds LogRecords and puts them on a bounded queue (QueueHandler); a background
+QueueListener thread does the formatting of the final line, redaction, truncation and the write.
+Payload logs (histories, answers) are tagged with `extra=SAMPLED` and only a PAGES_LOGGING["PAYLOAD_SAMPLE_RATE"]
+fraction of them is kept. Loggers must use lazy %-style arguments, so records below the level cost nothing.
+"""
+import copy
+import hashlib
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+
+from config import PAGES_LOGGING
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# masked customer identifiers from the request headers, however they end up in a message
+# (x-cust-mask-id: ..., 'login_mask_id': '...', cust_mask_id=...)
+REDACTED_FIELDS = re.compile(
+    r"""((?:x-)?(?:login|cust)[-_]mask[-_]id|(?:x-)?dr[-_]license)(['"]?\s*[:=]\s*['"]?)([^'"\s,}&]+)""",
+    re.IGNORECASE
+)
+
+# logger.info("History: %s", history, extra=SAMPLED) - kept only for a sampled fraction of records
+SAMPLED = {"sampled": True}
+
+_listener = None
+
+
+def redact_id(value) -> str:
+    """Stable, non-reversible short form of an identifier, for correlating log lines without logging the id."""
+    if not value:
+        return "-"
+    return hashlib.sha256(str(value).encode("utf-8")).hexdigest()[:10]
+
+
+class PayloadSampler(logging.Filter):
+    """Drops all but `rate` of the records tagged with SAMPLED. Untagged records always pass."""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class SafeFormatter(logging.Formatter):
+    """Redacts masked ids and truncates oversized messages. Runs on the listener thread."""
+
+    def __init__(self, fmt: str, max_chars: int) -> None:
+        super().__init__(fmt)
+        self.max_chars = max_chars
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        message = REDACTED_FIELDS.sub(r"\1\2***", record.message)
+        if self.max_chars and len(message) > self.max_chars:
+            message = f"{message[:self.max_chars]}... [truncated, {len(message)} chars]"
+        record.message = message
+        return super().formatMessage(record)
+
+
+# arguments a queued record can carry as they are - they cannot change before the listener formats it
+PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler over a bounded queue that drops (and counts) records instead of blocking when it is full.
+
+    Records are queued unformatted, so the message is built on the listener thread. Arguments other than plain
+    values are turned into strings first (a history list may change after the call); records with exception
+    info are formatted here, since their traceback refers to live frames.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info or not isinstance(record.args, tuple):
+            return super().prepare(record)
+        record = copy.copy(record)
+        record.args = tuple(arg if isinstance(arg, PLAIN_TYPES) else str(arg) for arg in record.args)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def configure_logging(level=None, stream=None) -> logging.handlers.QueueListener:
+    """
+    Route the root logger through a queue to a background writer. Idempotent - the running listener is reused.
+    Call stop_logging() on shutdown to flush what is still queued.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(SafeFormatter(LOG_FORMAT, PAGES_LOGGING["MAX_MESSAGE_CHARS"]))
+
+    handler = DroppingQueueHandler(queue.Queue(PAGES_LOGGING["QUEUE_SIZE"]))
+    handler.addFilter(PayloadSampler(PAGES_LOGGING["PAYLOAD_SAMPLE_RATE"]))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level or PAGES_LOGGING["LEVEL"])
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_after_fork() -> None:
+    # the writer thread does not survive fork (and the queue may be mid-operation): a forked server worker
+    # gets its own queue and listener, the parent keeps draining what it had queued
+    global _listener
+    if _listener is None:
+        return
+    stream = _listener.handlers[0].stream
+    _listener = None
+    configure_logging(logging.getLogger().level, stream)
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,228 @@
+"""
+Request pipeline metrics: per-stage latency, LLM token usage and retries, exposed for Prometheus at /metrics.
+
+Stages are timed with `stage(name)`. When PAGES_METRICS["OTEL"] is on and opentelemetry is installed,
+each stage is also an OpenTelemetry span (exported by whatever tracer provider the deployment configures).
+
+LLM retries happen inside the openai SDK (sync client) or the LLM gateway (async client), so they are counted
+at the HTTP level: every request sent passes through the `count_llm_attempt` httpx hook, and `llm_call()`
+attributes the attempts made in its context to one logical call. The router's hedged duplicates are not
+retries - they are counted apart (`count_llm_hedge`).
+
+Under gunicorn (gunicorn_conf.py sets PROMETHEUS_MULTIPROC_DIR) the counters and histograms are written to
+per-process files and /metrics aggregates every worker's. The service's own stats (response cache, fast path,
+Redis breaker, logging queue, LLM gateway and router) are kept in memory per worker, so those families are the answering
+worker's - scrape each worker, or read them as a sample.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from config import PAGES_METRICS
+from utils.logging_setup import DroppingQueueHandler
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+STAGE_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram(
+    "pages_stage_seconds", "Time spent in each stage of the request pipeline", ["stage"], buckets=STAGE_BUCKETS
+)
+STAGE_ERRORS = Counter("pages_stage_errors_total", "Stages that raised", ["stage"])
+REQUESTS = Counter("pages_requests_total", "Answered requests by endpoint and answer source", ["endpoint", "source"])
+LLM_TOKENS = Counter("pages_llm_tokens_total", "Tokens reported in response.usage", ["kind"])
+LLM_ATTEMPTS = Counter("pages_llm_http_attempts_total", "HTTP requests sent to Azure OpenAI, retries included")
+LLM_RETRIES = Histogram("pages_llm_retries", "SDK retries per model call", buckets=(0, 1, 2, 3, 5, 10))
+LLM_HEDGES = Counter("pages_llm_hedges_total", "Duplicate model calls the router sent to a second deployment")
+LOOP_LAG = Histogram("pages_event_loop_lag_seconds", "How late the worker's event loop ran a timer",
+                     buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+
+_tracer = trace.get_tracer("service_page_agent") if trace is not None and PAGES_METRICS["OTEL"] else None
+_llm_attempts = contextvars.ContextVar("llm_attempts", default=None)
+_stats_collector = None
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage (and trace it as a span when OpenTelemetry is enabled)."""
+    if not PAGES_METRICS["ENABLED"]:
+        yield
+        return
+    span = _tracer.start_as_current_span(name) if _tracer is not None else None
+    if span is not None:
+        span.__enter__()
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+        if span is not None:
+            span.__exit__(None, None, None)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    """Record a stage timed by the caller, for spans that cannot be a `with` block (e.g. across yields)."""
+    if PAGES_METRICS["ENABLED"]:
+        STAGE_SECONDS.labels(name).observe(seconds)
+
+
+async def monitor_event_loop(interval: float) -> None:
+    """Sleep `interval` seconds in a loop and record how late each wakeup was - time the loop spent blocked."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(loop.time() - started - interval, 0.0))
+
+
+@contextmanager
+def llm_call():
+    """Attribute the HTTP attempts made inside this block to one model call and record its retries."""
+    attempts = [0]
+    token = _llm_attempts.set(attempts)
+    try:
+        yield
+    finally:
+        _llm_attempts.reset(token)
+        if attempts[0]:
+            LLM_RETRIES.observe(attempts[0] - 1)
+
+
+def count_llm_hedge() -> None:
+    """
+    Called in the task of a hedged duplicate call: counts the hedge, and keeps its HTTP attempts out of the
+    retries of the call it duplicates (the task runs in a copy of the caller's context).
+    """
+    LLM_HEDGES.inc()
+    _llm_attempts.set(None)
+
+
+def count_llm_attempt(request) -> None:
+    """httpx request hook for the sync Azure OpenAI client."""
+    LLM_ATTEMPTS.inc()
+    attempts = _llm_attempts.get()
+    if attempts is not None:
+        attempts[0] += 1
+
+
+async def acount_llm_attempt(request) -> None:
+    """httpx request hook for the async Azure OpenAI client."""
+    count_llm_attempt(request)
+
+
+def record_usage(usage) -> None:
+    """Token counts of a completion (response.usage), cached prompt tokens included when Azure reports them."""
+    if usage is None:
+        return
+    LLM_TOKENS.labels("prompt").inc(usage.prompt_tokens or 0)
+    LLM_TOKENS.labels("completion").inc(usage.completion_tokens or 0)
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is not None and getattr(details, "cached_tokens", None):
+        LLM_TOKENS.labels("cached_prompt").inc(details.cached_tokens)
+
+
+def record_request(endpoint: str, source: str) -> None:
+    REQUESTS.labels(endpoint, source).inc()
+
+
+class StatsCollector:
+    """
+    Publishes the counters the service already keeps (response cache, fast path, Redis breaker, logging queue)
+    at scrape time, so /metrics and the JSON stats endpoints never disagree.
+    """
+
+    def __init__(self, response_cache, fast_path_stats, redis_manager, gateway=None, router=None) -> None:
+        self.response_cache = response_cache
+        self.fast_path_stats = fast_path_stats
+        self.redis_manager = redis_manager
+        self.gateway = gateway
+        self.router = router
+
+    def collect(self):
+        snapshot = self.response_cache.snapshot()
+        cache = CounterMetricFamily("pages_response_cache", "Response cache events", labels=["event"])
+        for event, value in snapshot.items():
+            if event not in ("local_entries", "hit_rate"):
+                cache.add_metric([event], value)
+        yield cache
+        yield GaugeMetricFamily("pages_response_cache_entries", "Entries in the local cache tier",
+                                value=snapshot["local_entries"])
+
+        requests = CounterMetricFamily("pages_fast_path_requests", "Fast path lookups", labels=["source_system"])
+        hits = CounterMetricFamily("pages_fast_path_hits", "Fast path hits", labels=["source_system"])
+        for source_system, stats in self.fast_path_stats.snapshot().items():
+            requests.add_metric([source_system], stats["requests"])
+            hits.add_metric([source_system], stats["hits"])
+        yield requests
+        yield hits
+
+        breaker = self.redis_manager.breaker.snapshot()
+        state = GaugeMetricFamily("pages_redis_breaker_open", "1 while the Redis circuit breaker is not closed")
+        state.add_metric([], 0 if breaker["state"] == "closed" else 1)
+        yield state
+        yield CounterMetricFamily("pages_redis_breaker_rejected", "Redis calls short-circuited by the breaker",
+                                  value=breaker["rejected"])
+        yield CounterMetricFamily("pages_log_records_dropped", "Log records dropped on a full logging queue",
+                                  value=DroppingQueueHandler.dropped)
+
+        if self.gateway is not None:
+            gateway = self.gateway.snapshot()
+            yield GaugeMetricFamily("pages_llm_concurrency_limit", "Adaptive cap on model calls in flight",
+                                    value=gateway["concurrency_limit"])
+            yield GaugeMetricFamily("pages_llm_in_flight", "Model calls in flight", value=gateway["in_flight"])
+            yield GaugeMetricFamily("pages_llm_waiting", "Model calls queued in the gateway", value=gateway["waiting"])
+            events = CounterMetricFamily("pages_llm_gateway", "LLM gateway events", labels=["event"])
+            for event in ("calls", "throttled", "retried", "coalesced", "shed"):
+                events.add_metric([event], gateway[event])
+            yield events
+
+        if self.router is not None:
+            router = self.router.snapshot()
+            events = CounterMetricFamily("pages_llm_router", "Router calls, hedges and failovers", labels=["event"])
+            for event in ("calls", "hedged", "hedge_won", "failed_over"):
+                events.add_metric([event], router.get(event, 0))
+            yield events
+            latency = GaugeMetricFamily("pages_llm_deployment_latency_ewma_seconds", "Latency EWMA per deployment",
+                                        labels=["deployment"])
+            calls = CounterMetricFamily("pages_llm_deployment_calls", "Calls per deployment and outcome",
+                                        labels=["deployment", "outcome"])
+            for name, deployment in router["deployments"].items():
+                if deployment["latency_ewma_ms"] is not None:
+                    latency.add_metric([name], deployment["latency_ewma_ms"] / 1000)
+                for outcome in ("ok", "failed"):
+                    calls.add_metric([name, outcome], deployment.get(outcome, 0))
+            yield latency
+            yield calls
+
+
+def register_stats(response_cache, fast_path_stats, redis_manager, gateway=None, router=None) -> None:
+    """Export the stats of these objects, replacing the ones registered before (e.g. by a previous app startup)."""
+    global _stats_collector
+    if _stats_collector is not None:
+        REGISTRY.unregister(_stats_collector)
+    _stats_collector = StatsCollector(response_cache, fast_path_stats, redis_manager, gateway, router)
+    REGISTRY.register(_stats_collector)
+
+
+def render() -> tuple:
+    """The Prometheus exposition body and its content type."""
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    if _stats_collector is not None:
+        registry.register(_stats_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
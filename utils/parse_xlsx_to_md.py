@@ -1,22 +1,25 @@
-import pandas as pd
 import argparse
+import logging
 import os
+import sys
 
+# run as `python parse_xlsx_to_md.py` from utils/ too: the catalog modules import from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.build_catalog import build_catalog  # noqa: E402
+
+# Kept for the old command line - the markdown is now rebuilt (not appended to) by utils/build_catalog.py,
+# which can also write the JSON catalog artifact the service loads.
 parser = argparse.ArgumentParser()
 parser.add_argument("--path","-P",type=str, required=True)
 parser.add_argument("--name","-N",type=str, default="services_from_xl.md")
-parser.add_argument("--header","-H",type=int, default=2)
+parser.add_argument("--header","-H",type=int, default=None)
+parser.add_argument("--json","-J",type=str, default=None)
 args = parser.parse_args()
 
-xl_df = pd.read_excel(args.path, header=args.header)
-
-with open(args.name, "a", encoding='utf-8') as file:
-    for _, row in xl_df.iterrows():
-
-        content = f"# **Service page:** **code:** {row.iloc[0]}, **name:** {row.iloc[1]}\n## The service description:\n{row.iloc[4] if row.iloc[4]!=None else '' }\n## Key words:\n {row.iloc[3] if row.iloc[3]!=None else ''}\n## Examples of questions that can relate to this service:\n{row.iloc[5] if row.iloc[5]!=None else ''}"
-        metadata_code = row.iloc[0]
-        metadata_name = row.iloc[1]
-
-        file.write(content + "\n")
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+report = build_catalog(args.path, markdown=args.name, json_path=args.json, header=args.header)
+print(f"{report['services']} services written to {args.name} (version {report['version']})")
 
-#python parse_xlsx_to_md.py --path services.xlsx --name output.md --header 1
+#python -m utils.parse_xlsx_to_md --path utils/services.xlsx --name utils/output.md --json utils/catalog.json
+#python parse_xlsx_to_md.py --path services.xlsx --name output.md   (from utils/)
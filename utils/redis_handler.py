@@ -1,14 +1,53 @@
 import redis
+import redis.asyncio as aioredis
 import json
 import os
+import time
 import logging
 from dotenv import load_dotenv
+from config import PAGES_REDIS
+from utils.circuit_breaker import CircuitBreaker
+
+
+def legacy_history_messages(data) -> list:
+    """
+    Messages of a session stored by the old JSON-blob format.
+
+    Each append stored the whole updated history (previous blob nested as its first item), so the turns of
+    a session are the top-level role/content messages of every appended item, in order.
+    """
+    messages = []
+    for item in data if isinstance(data, list) else [data]:
+        if isinstance(item, dict) and "role" in item:
+            messages.append(item)
+        elif isinstance(item, list):
+            messages.extend(m for m in item if isinstance(m, dict) and "role" in m)
+    return messages
 
 
 class RedisSessionManager:
-    def __init__(self):
+    """
+    Session history is stored as a Redis list with one JSON message per item. Each turn is written
+    with a single pipelined RPUSH + LTRIM + EXPIRE, so the stored value never grows past `max_len` messages
+    and reads fetch only the window the model needs.
+
+    Connections come from a bounded, health-checked pool with socket timeouts. The hot-path operations
+    (history and cache reads/writes) go through a circuit breaker: when Redis fails or is slow they are
+    skipped, and the caller degrades to stateless classification instead of queueing behind timeouts.
+    """
+
+    def __init__(self, redis_client=None):
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
+        self.breaker = CircuitBreaker(
+            failure_threshold=PAGES_REDIS["BREAKER_FAILURES"],
+            slow_call_seconds=PAGES_REDIS["BREAKER_SLOW_SECONDS"],
+            reset_timeout=PAGES_REDIS["BREAKER_RESET_SECONDS"]
+        )
+
+        if redis_client is not None:
+            self.redis_client = redis_client
+            return
 
         load_dotenv()
 
@@ -18,40 +57,56 @@ class RedisSessionManager:
         self.port = os.getenv(f"REDIS_PORT_{env.upper()}")
         self.db = os.getenv(f"REDIS_DB_{env.upper()}")
         self.password = os.getenv(f"REDIS_PASSWORD_{env.upper()}")
+        # TLS unless explicitly turned off, e.g. for a local Redis in load tests
+        self.ssl = os.getenv(f"REDIS_SSL_{env.upper()}", "true").lower() != "false"
 
-        self.logger.info(f"ENV: {env} {self.host} {self.port} {self.db}")
+        self.logger.info("ENV: %s %s %s %s", env, self.host, self.port, self.db)
 
         if not all([self.host, self.port, self.db, self.password]):
-            self.logger.error(f"Missing required environment variables for Redis connection: {env}")
+            self.logger.error("Missing required environment variables for Redis connection: %s", env)
             raise ValueError("Missing required Redis environment variables")
 
-        self.redis_client = redis.Redis(
+        self.redis_client = self._create_client()
+
+    def _pool_kwargs(self) -> dict:
+        return dict(
             host=self.host,
-            port=self.port,
-            db=self.db,
+            port=int(self.port),
+            db=int(self.db),
+            password=self.password,
             decode_responses=True,
-            ssl=True,
-            password=self.password
+            max_connections=PAGES_REDIS["MAX_CONNECTIONS"],
+            timeout=PAGES_REDIS["POOL_TIMEOUT"],
+            socket_timeout=PAGES_REDIS["SOCKET_TIMEOUT"],
+            socket_connect_timeout=PAGES_REDIS["SOCKET_CONNECT_TIMEOUT"],
+            socket_keepalive=True,
+            health_check_interval=PAGES_REDIS["HEALTH_CHECK_INTERVAL"]
         )
 
+    def _create_client(self):
+        connection_class = redis.SSLConnection if self.ssl else redis.Connection
+        pool = redis.BlockingConnectionPool(connection_class=connection_class, **self._pool_kwargs())
+        return redis.Redis(connection_pool=pool)
+
     def save_session(self, session_id, data):
         try:
             json_data = json.dumps(data, ensure_ascii=False)
             self.redis_client.set(session_id, json_data)
-            self.logger.info(f"Data written to Redis for session {session_id}")
+            self.logger.info("Data written to Redis for session %s", session_id)
         except Exception as e:
-            self.logger.error(f"Error writing to Redis: {e}")
+            self.logger.error("Error writing to Redis: %s", e)
 
     def get_session(self, session_id):
         try:
             data = self.redis_client.get(session_id)
-            self.logger.info(f"Data read from Redis for session {session_id}")
-            if data:
-                self.logger.info(f"data: {json.loads(data)}")
-                return json.loads(data)
-            return None
+            self.logger.info("Data read from Redis for session %s", session_id)
+            if not data:
+                return None
+            session = json.loads(data)
+            self.logger.debug("data: %s", session)
+            return session
         except Exception as e:
-            self.logger.error(f"Error reading from Redis: {e}")
+            self.logger.error("Error reading from Redis: %s", e)
             return None
 
     def append_to_session(self, session_id, new_data):
@@ -63,23 +118,242 @@ class RedisSessionManager:
 
             existing_data.append(new_data)
             self.save_session(session_id, existing_data)
-            self.logger.info(f"Session {session_id} updated with new data")
+            self.logger.info("Session %s updated with new data", session_id)
         except Exception as e:
-            self.logger.error(f"Error appending data to session {session_id}: {e}")
+            self.logger.error("Error appending data to session %s: %s", session_id, e)
 
     def delete_session(self, session_id):
         try:
             self.redis_client.delete(session_id)
-            self.logger.info(f"Session {session_id} deleted from Redis")
+            self.logger.info("Session %s deleted from Redis", session_id)
+        except Exception as e:
+            self.logger.error("Error deleting session %s from Redis: %s", session_id, e)
+
+    def get_history(self, session_id, window):
+        """Last `window` messages of the session, migrating a legacy JSON blob to the list format on first read."""
+        if not self.breaker.allow():
+            self.logger.warning("Redis circuit open, history of session %s not read", session_id)
+            return []
+        start = time.perf_counter()
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.type(session_id)
+            pipe.lrange(session_id, -window, -1)
+            key_type, items = pipe.execute(raise_on_error=False)
+            self.breaker.record_success(time.perf_counter() - start)
+            if key_type == "string":
+                return self._migrate_legacy_session(session_id, window)
+            self.logger.info("History read from Redis for session %s", session_id)
+            return [json.loads(item) for item in items]
+        except Exception as e:
+            self.breaker.record_failure()
+            self.logger.error("Error reading history from Redis: %s", e)
+            return []
+
+    def append_turns(self, session_id, messages, max_len, ttl):
+        """Atomically append messages, trim the list to the last `max_len` and refresh the TTL - one round trip."""
+        if not self.breaker.allow():
+            self.logger.warning("Redis circuit open, turn of session %s not stored", session_id)
+            return
+        start = time.perf_counter()
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.rpush(session_id, *[json.dumps(message, ensure_ascii=False) for message in messages])
+            pipe.ltrim(session_id, -max_len, -1)
+            pipe.expire(session_id, ttl)
+            pipe.execute()
+            self.breaker.record_success(time.perf_counter() - start)
+            self.logger.info("Session %s updated with %s messages", session_id, len(messages))
+        except Exception as e:
+            self.breaker.record_failure()
+            self.logger.error("Error appending turns to session %s: %s", session_id, e)
+
+    def _migrate_legacy_session(self, session_id, window):
+        messages = legacy_history_messages(json.loads(self.redis_client.get(session_id)))[-window:]
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.delete(session_id)
+        if messages:
+            pipe.rpush(session_id, *[json.dumps(message, ensure_ascii=False) for message in messages])
+        pipe.execute()
+        self.logger.info("Session %s migrated from JSON blob to list (%s messages)", session_id, len(messages))
+        return messages
+
+    def get_value(self, key):
+        if not self.breaker.allow():
+            self.logger.warning("Redis circuit open, key %s not read", key)
+            return None
+        start = time.perf_counter()
+        try:
+            value = self.redis_client.get(key)
+            self.breaker.record_success(time.perf_counter() - start)
+            return value
+        except Exception as e:
+            self.breaker.record_failure()
+            self.logger.error("Error reading key %s from Redis: %s", key, e)
+            return None
+
+    def set_value(self, key, value, ttl=None):
+        if not self.breaker.allow():
+            self.logger.warning("Redis circuit open, key %s not written", key)
+            return
+        start = time.perf_counter()
+        try:
+            self.redis_client.set(key, value, ex=ttl)
+            self.breaker.record_success(time.perf_counter() - start)
+        except Exception as e:
+            self.breaker.record_failure()
+            self.logger.error("Error writing key %s to Redis: %s", key, e)
+
+    def ping(self) -> bool:
+        try:
+            return bool(self.redis_client.ping())
         except Exception as e:
-            self.logger.error(f"Error deleting session {session_id} from Redis: {e}")
+            self.logger.error("Redis health check failed: %s", e)
+            return False
 
     def close_connection(self):
         try:
             self.redis_client.close()
             self.logger.info("Redis connection closed")
         except Exception as e:
-            self.logger.error(f"Error closing Redis connection: {e}")
+            self.logger.error("Error closing Redis connection: %s", e)
+
+class AsyncRedisSessionManager(RedisSessionManager):
+    """Same session API as RedisSessionManager, backed by redis.asyncio so the endpoint never blocks the event loop."""
+
+    def _create_client(self):
+        connection_class = aioredis.SSLConnection if self.ssl else aioredis.Connection
+        pool = aioredis.BlockingConnectionPool(connection_class=connection_class, **self._pool_kwargs())
+        return aioredis.Redis(connection_pool=pool)
+
+    async def save_session(self, session_id, data):
+        try:
+            json_data = json.dumps(data, ensure_ascii=False)
+            await self.redis_client.set(session_id, json_data)
+            self.logger.info("Data written to Redis for session %s", session_id)
+        except Exception as e:
+            self.logger.error("Error writing to Redis: %s", e)
+
+    async def get_session(self, session_id):
+        try:
+            data = await self.redis_client.get(session_id)
+            self.logger.info("Data read from Redis for session %s", session_id)
+            if not data:
+                return None
+            session = json.loads(data)
+            self.logger.debug("data: %s", session)
+            return session
+        except Exception as e:
+            self.logger.error("Error reading from Redis: %s", e)
+            return None
+
+    async def append_to_session(self, session_id, new_data):
+        try:
+            existing_data = await self.get_session(session_id)
+
+            if not isinstance(existing_data, list):
+                existing_data = [existing_data] if existing_data else []
+
+            existing_data.append(new_data)
+            await self.save_session(session_id, existing_data)
+            self.logger.info("Session %s updated with new data", session_id)
+        except Exception as e:
+            self.logger.error("Error appending data to session %s: %s", session_id, e)
+
+    async def delete_session(self, session_id):
+        try:
+            await self.redis_client.delete(session_id)
+            self.logger.info("Session %s deleted from Redis", session_id)
+        except Exception as e:
+            self.logger.error("Error deleting session %s from Redis: %s", session_id, e)
+
+    async def get_history(self, session_id, window):
+        if not self.breaker.allow():
+            self.logger.warning("Redis circuit open, history of session %s not read", session_id)
+            return []
+        start = time.perf_counter()
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.type(session_id)
+            pipe.lrange(session_id, -window, -1)
+            key_type, items = await pipe.execute(raise_on_error=False)
+            self.breaker.record_success(time.perf_counter() - start)
+            if key_type == "string":
+                return await self._migrate_legacy_session(session_id, window)
+            self.logger.info("History read from Redis for session %s", session_id)
+            return [json.loads(item) for item in items]
+        except Exception as e:
+            self.breaker.record_failure()
+            self.logger.error("Error reading history from Redis: %s", e)
+            return []
+
+    async def append_turns(self, session_id, messages, max_len, ttl):
+        if not self.breaker.allow():
+            self.logger.warning("Redis circuit open, turn of session %s not stored", session_id)
+            return
+        start = time.perf_counter()
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.rpush(session_id, *[json.dumps(message, ensure_ascii=False) for message in messages])
+            pipe.ltrim(session_id, -max_len, -1)
+            pipe.expire(session_id, ttl)
+            await pipe.execute()
+            self.breaker.record_success(time.perf_counter() - start)
+            self.logger.info("Session %s updated with %s messages", session_id, len(messages))
+        except Exception as e:
+            self.breaker.record_failure()
+            self.logger.error("Error appending turns to session %s: %s", session_id, e)
+
+    async def _migrate_legacy_session(self, session_id, window):
+        messages = legacy_history_messages(json.loads(await self.redis_client.get(session_id)))[-window:]
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.delete(session_id)
+        if messages:
+            pipe.rpush(session_id, *[json.dumps(message, ensure_ascii=False) for message in messages])
+        await pipe.execute()
+        self.logger.info("Session %s migrated from JSON blob to list (%s messages)", session_id, len(messages))
+        return messages
+
+    async def get_value(self, key):
+        if not self.breaker.allow():
+            self.logger.warning("Redis circuit open, key %s not read", key)
+            return None
+        start = time.perf_counter()
+        try:
+            value = await self.redis_client.get(key)
+            self.breaker.record_success(time.perf_counter() - start)
+            return value
+        except Exception as e:
+            self.breaker.record_failure()
+            self.logger.error("Error reading key %s from Redis: %s", key, e)
+            return None
+
+    async def set_value(self, key, value, ttl=None):
+        if not self.breaker.allow():
+            self.logger.warning("Redis circuit open, key %s not written", key)
+            return
+        start = time.perf_counter()
+        try:
+            await self.redis_client.set(key, value, ex=ttl)
+            self.breaker.record_success(time.perf_counter() - start)
+        except Exception as e:
+            self.breaker.record_failure()
+            self.logger.error("Error writing key %s to Redis: %s", key, e)
+
+    async def ping(self) -> bool:
+        try:
+            return bool(await self.redis_client.ping())
+        except Exception as e:
+            self.logger.error("Redis health check failed: %s", e)
+            return False
+
+    async def close_connection(self):
+        try:
+            await self.redis_client.aclose()
+            self.logger.info("Redis connection closed")
+        except Exception as e:
+            self.logger.error("Error closing Redis connection: %s", e)
+
 
 # if __name__ == "__main__":
 #     redis_manager = RedisSessionManager()
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from utils.hebrew_text import normalize_text
+
+
+class ResponseCache:
+    """
+    Two-tier cache of model answers.
+
+    The local tier is an in-process LRU bounded by `max_entries` with a per-entry TTL. The optional shared
+    tier is Redis (through an AsyncRedisSessionManager) so workers reuse each other's answers; its entries
+    expire by TTL. Keys embed the catalog version, so a catalog change makes every old entry unreachable.
+    """
+
+    def __init__(self, redis_manager=None, max_entries: int = 10000, ttl: int = 3600,
+                 namespace: str = "response-cache") -> None:
+        self.logger = logging.getLogger(__name__)
+        self.redis_manager = redis_manager
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.namespace = namespace
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def make_key(self, user_input: str, history: list, catalog_version: str) -> str:
+        history_hash = hashlib.sha256(
+            json.dumps(history, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        query_hash = hashlib.sha256(normalize_text(user_input).encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{catalog_version}:{query_hash[:32]}:{history_hash[:32]}"
+
+    def get(self, key: str):
+        """Local tier lookup. Counts a local hit, but not a miss - callers may still try the shared tier."""
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._local[key]
+                self._counters["expired"] += 1
+                return None
+            self._local.move_to_end(key)
+            self._counters["local_hits"] += 1
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    async def aget(self, key: str):
+        value = self.get(key)
+        if value is not None:
+            return value
+        if self.redis_manager is not None:
+            value = await self.redis_manager.get_value(key)
+            if value is not None:
+                self._counters["shared_hits"] += 1
+                self.put(key, value)
+                return value
+        self._counters["misses"] += 1
+        return None
+
+    async def aput(self, key: str, value: str) -> None:
+        self.put(key, value)
+        if self.redis_manager is not None:
+            await self.redis_manager.set_value(key, value, self.ttl)
+
+    def record_miss(self) -> None:
+        self._counters["misses"] += 1
+
+    def record_bypass(self) -> None:
+        self._counters["bypass"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._local.clear()
+            self._counters["clears"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._local)
+        hits = counters.get("local_hits", 0) + counters.get("shared_hits", 0)
+        lookups = hits + counters.get("misses", 0)
+        return {**counters, "local_entries": size, "hit_rate": hits / lookups if lookups else 0.0}
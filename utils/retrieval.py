@@ -0,0 +1,78 @@
+import math
+from collections import Counter, defaultdict
+
+from utils.hebrew_text import index_terms
+
+# How many times each field of a service page counts towards its BM25 document
+FIELD_WEIGHTS = {"name": 3, "keywords": 2, "examples": 1, "description": 1}
+
+
+class ServiceRetriever:
+    """
+    In-memory BM25 index over the service catalog.
+
+    Every service page is one document built from its name, keywords, example questions and
+    description (weighted by FIELD_WEIGHTS). Terms are normalized Hebrew tokens plus their
+    prefix-stripped variants, so "להתחייבות" still matches "התחייבות".
+    """
+
+    def __init__(self, pages: list, k1: float = 1.2, b: float = 0.75) -> None:
+        self.pages = list(pages)
+        self.k1 = k1
+        self.b = b
+
+        doc_lengths = []
+        self.postings = defaultdict(list)
+        for doc_id, page in enumerate(self.pages):
+            counts = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                value = getattr(page, field)
+                text = "\n".join(value) if isinstance(value, list) else value
+                for term in index_terms(text):
+                    counts[term] += weight
+            for term, tf in counts.items():
+                self.postings[term].append((doc_id, tf))
+            doc_lengths.append(sum(counts.values()))
+
+        avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 1.0
+        self.length_norm = [k1 * (1 - b + b * length / avg_length) for length in doc_lengths]
+        n_docs = len(self.pages)
+        self.idf = {
+            term: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def to_data(self) -> dict:
+        """The index as plain data (no pages) - the prebuilt artifact of utils/catalog_store.py."""
+        return {"k1": self.k1, "b": self.b, "postings": self.postings, "length_norm": self.length_norm,
+                "idf": self.idf}
+
+    @classmethod
+    def from_data(cls, pages: list, data: dict) -> "ServiceRetriever":
+        """The retriever of `pages` from the to_data() of the same pages, in the same order."""
+        retriever = cls.__new__(cls)
+        retriever.pages = list(pages)
+        retriever.k1 = data["k1"]
+        retriever.b = data["b"]
+        retriever.postings = defaultdict(list, {term: [tuple(posting) for posting in postings]
+                                                for term, postings in data["postings"].items()})
+        retriever.length_norm = data["length_norm"]
+        retriever.idf = data["idf"]
+        if len(retriever.length_norm) != len(retriever.pages):
+            raise ValueError(f"index of {len(retriever.length_norm)} services for {len(retriever.pages)}")
+        return retriever
+
+    def scores(self, query: str) -> dict:
+        scores = defaultdict(float)
+        for term in set(index_terms(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.length_norm[doc_id])
+        return scores
+
+    def search(self, query: str, k: int) -> list:
+        """Return up to k (ServicePage, score) pairs, best first. Services with no overlapping term are skipped."""
+        ranked = sorted(self.scores(query).items(), key=lambda item: item[1], reverse=True)
+        return [(self.pages[doc_id], score) for doc_id, score in ranked[:k]]
@@ -0,0 +1,122 @@
+import json
+
+STREAMED_TEXT_KEYS = ("clarification_question", "error_message")
+
+
+def _decodable_prefix(raw: str) -> str:
+    """Longest prefix of a raw JSON string body that does not end inside an escape sequence."""
+    cut = raw.rfind("\\")
+    if cut == -1:
+        return raw
+    # count the run of backslashes ending at `cut` - an even run is escaped backslashes only
+    run = len(raw[:cut + 1]) - len(raw[:cut + 1].rstrip("\\"))
+    tail = raw[cut + 1:]
+    if run % 2 == 0:
+        return raw
+    if tail == "" or (tail[0] == "u" and len(tail) < 5):
+        return raw[:cut]
+    return raw
+
+
+class AnswerStreamParser:
+    """
+    Incremental parser of the model's answer while it is being generated.
+
+    Feed it text deltas; it returns events as soon as they can be known:
+      {"event": "card_type", "card_type": "json" | "error" | "text"}  - after the first key (or first non-JSON char)
+      {"event": "option", "option": {...}}                             - each completed item of "options"
+      {"event": "text", "delta": "..."}                                - clarification question / error / plain text
+    The complete answer is still parsed by the caller at the end, so events are a preview, not the contract.
+    """
+
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.pos = 0
+        self.mode = None  # None until the first non-whitespace char, then "json" or "text"
+        self.stack = []  # one [container, expect_key] entry per open '{' / '['
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.string_is_key = False
+        self.root_key = None  # last key seen on the top-level object
+        self.option_start = None
+        self.streamed_text = ""
+
+    def feed(self, delta: str) -> list:
+        self.buffer += delta
+        events = []
+        if self.mode is None:
+            stripped = self.buffer.lstrip()
+            if not stripped:
+                return events
+            self.mode = "json" if stripped[0] == "{" else "text"
+            if self.mode == "text":
+                events.append({"event": "card_type", "card_type": "text"})
+                events.append({"event": "text", "delta": self.buffer})
+                return events
+        elif self.mode == "text":
+            return [{"event": "text", "delta": delta}] if delta else []
+
+        for i in range(self.pos, len(self.buffer)):
+            self._consume(i, events)
+        self.pos = len(self.buffer)
+        if self.in_string and not self.string_is_key and self._streaming_value():
+            self._emit_text(self.buffer[self.string_start + 1:], events)
+        return events
+
+    def _streaming_value(self) -> bool:
+        return len(self.stack) == 1 and self.root_key in STREAMED_TEXT_KEYS
+
+    def _emit_text(self, raw: str, events: list) -> None:
+        # strict=False: a free-form answer may carry raw newlines / tabs inside its strings
+        decoded = json.loads('"' + _decodable_prefix(raw) + '"', strict=False)
+        if len(decoded) > len(self.streamed_text):
+            events.append({"event": "text", "delta": decoded[len(self.streamed_text):]})
+            self.streamed_text = decoded
+
+    def _consume(self, i: int, events: list) -> None:
+        char = self.buffer[i]
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif char == "\\":
+                self.escape = True
+            elif char == '"':
+                self.in_string = False
+                self._string_closed(i, events)
+            return
+
+        if char == '"':
+            self.in_string = True
+            self.string_start = i
+            self.string_is_key = bool(self.stack) and self.stack[-1][0] == "{" and self.stack[-1][1]
+        elif char in "{[":
+            if char == "{" and len(self.stack) == 2 and self.stack[1][0] == "[" and self.root_key == "options":
+                self.option_start = i
+            self.stack.append([char, char == "{"])
+        elif char in "}]":
+            if self.stack:
+                self.stack.pop()
+            if char == "}" and self.option_start is not None and len(self.stack) == 2:
+                try:
+                    option = json.loads(self.buffer[self.option_start:i + 1], strict=False)
+                    events.append({"event": "option", "option": option})
+                except json.JSONDecodeError:
+                    pass
+                self.option_start = None
+        elif char == ":" and self.stack:
+            self.stack[-1][1] = False
+        elif char == "," and self.stack and self.stack[-1][0] == "{":
+            self.stack[-1][1] = True
+
+    def _string_closed(self, i: int, events: list) -> None:
+        if not (self.string_is_key and len(self.stack) == 1):
+            if self._streaming_value() and not self.string_is_key:
+                self._emit_text(self.buffer[self.string_start + 1:i], events)
+            return
+        key = json.loads(self.buffer[self.string_start:i + 1], strict=False)
+        if self.root_key is None:
+            card_type = "error" if key == "error_message" else "json"
+            events.append({"event": "card_type", "card_type": card_type})
+        self.root_key = key
+        self.streamed_text = ""